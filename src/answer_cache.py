@@ -0,0 +1,204 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from sharded_store import PRIMARY_SHARD
+
+# Varsayılan ayarlar; ortam değişkenleriyle değiştirilebilir.
+ANSWER_CACHE_SIZE = int(os.getenv("VEX_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("VEX_ANSWER_CACHE_TTL", "21600"))  # 6 saat
+ANSWER_CACHE_SIMILARITY = float(os.getenv("VEX_ANSWER_CACHE_SIMILARITY", "0.93"))
+
+# Kural ID'leri ve sayılar: "R25" ile "R26" gömme uzayında çok yakındır ama
+# cevapları farklıdır, bu yüzden anlamsal eşleşmede birebir aynı olmalılar.
+_IDENTIFIER_PATTERN = re.compile(r'\b(?:[^\W\d_]{1,5}\d+|\d+(?:[.,]\d+)?)\b')
+
+
+def normalize_query(query):
+    """
+    Sorguyu birebir eşleşme anahtarı için normalize eder.
+
+    Türkçe büyük harfleri doğru küçültür, noktalama işaretlerini atar ve
+    boşlukları tekilleştirir: "Robot ağırlık sınırı nedir?" ile
+    "robot  ağırlık sınırı nedir" aynı anahtarı üretir.
+    """
+    query = query.replace('İ', 'i').replace('I', 'ı').lower()
+    query = re.sub(r'[^\w\s]', ' ', query)
+    return ' '.join(query.split())
+
+
+def _identifiers(normalized_query):
+    return frozenset(_IDENTIFIER_PATTERN.findall(normalized_query))
+
+
+def version_components(version):
+    """
+    Sürüm anahtarını bileşenlerine ayırır.
+
+    Bölümlü aramaların anahtarı "push_back:v4+vrc_2024:v2" biçimindedir;
+    tek indeksin sürümü (int) ana bölümün sürümüdür, böylece iki biçimdeki
+    kayıtlar aynı bileşen üzerinden karşılaştırılır.
+
+    Returns:
+        dict: Bölüm adı -> sürüm.
+    """
+    if isinstance(version, str) and ':v' in version:
+        components = {}
+        for part in version.split('+'):
+            name, _, number = part.rpartition(':v')
+            components[name] = number
+        return components
+    return {PRIMARY_SHARD: str(version)}
+
+
+def is_stale(entry_version, version):
+    """Kaydın sürümündeki bölümlerden biri yeni sürümde başka bir sürümdeyse True."""
+    current = version_components(version)
+    return any(name in current and current[name] != number
+               for name, number in version_components(entry_version).items())
+
+
+class AnswerCache:
+    """
+    Tekrarlanan ve neredeyse aynı sorular için cevap önbelleği.
+
+    Önce normalize edilmiş sorguyla birebir eşleşme aranır, sonra sorgu
+    vektörünün kosinüs benzerliği eşiği geçen bir kayıt aranır. Kayıtlar
+    indeks sürümüne bağlıdır; kılavuz güncellenip sürüm değişince eski
+    cevaplar kullanılmaz ve silinir. Farklı bölüm seçimlerinin kayıtları
+    bir arada tutulur; yalnızca bölümlerinden biri güncellenen kayıtlar
+    eskimiş sayılır. TTL ve LRU ile sınırlandırılır.
+
+    İsabet oranı soru başınadır: her soru önce birebir aramadan geçer,
+    ıskalarsa anlamsal aramaya gidebilir.
+
+    Args:
+        max_entries (int): En fazla kayıt sayısı.
+        ttl_seconds (float): Bir kaydın geçerlilik süresi.
+        similarity_threshold (float): Anlamsal eşleşme için en düşük kosinüs benzerliği.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Anlamsal arama için (anahtarlar, matris) önbelleği; kayıtlar değişince geçersizleşir
+        self._matrix = None
+        self.exact_hits = 0
+        self.exact_misses = 0
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry['created_at'] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def lookup_exact(self, query, version):
+        """
+        Normalize edilmiş sorguyla birebir eşleşen cevabı döndürür.
+
+        Returns:
+            str: Önbellekteki cevap, yoksa None.
+        """
+        key = (version, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry['created_at'] > self.ttl_seconds:
+                self.exact_misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry['answer']
+
+    def lookup_similar(self, query, embedding, version):
+        """
+        Sorgu vektörüne en benzer kaydın cevabını, benzerlik eşiği geçiyorsa döndürür.
+
+        Kural ID'leri veya sayılar farklıysa kayıt eşleşmez. Sorgu vektörü
+        yoksa (embedding başarısız) doğrudan ıskalama sayılır.
+
+        Returns:
+            str: Önbellekteki cevap, yoksa None (ıskalama olarak sayılır).
+        """
+        vector = np.asarray(embedding if embedding is not None else [], dtype='float32')
+        norm = np.linalg.norm(vector) if vector.size else 0.0
+        identifiers = _identifiers(normalize_query(query))
+        with self._lock:
+            self._expire(time.time())
+            if norm > 0:
+                if self._matrix is None:
+                    keys = [key for key, entry in self._entries.items() if entry['embedding'] is not None]
+                    matrix = (np.stack([self._entries[key]['embedding'] for key in keys])
+                              if keys else np.zeros((0, vector.shape[0]), dtype='float32'))
+                    self._matrix = (keys, matrix)
+                keys, matrix = self._matrix
+                if keys and matrix.shape[1] == vector.shape[0]:
+                    scores = matrix @ (vector / norm)
+                    for i in np.argsort(-scores):
+                        if scores[i] < self.similarity_threshold:
+                            break
+                        entry = self._entries.get(keys[i])
+                        if entry is None or keys[i][0] != version or entry['identifiers'] != identifiers:
+                            continue
+                        self._entries.move_to_end(keys[i])
+                        self.semantic_hits += 1
+                        return entry['answer']
+            self.semantic_misses += 1
+            return None
+
+    def put(self, query, version, answer, embedding=None):
+        """Üretilen cevabı önbelleğe ekler; bölümleri güncellenmiş kayıtları temizler."""
+        normalized = normalize_query(query)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype='float32')
+            norm = np.linalg.norm(embedding)
+            embedding = embedding / norm if norm > 0 else None
+        with self._lock:
+            stale = [key for key in self._entries if key[0] != version and is_stale(key[0], version)]
+            for key in stale:
+                del self._entries[key]
+            self._entries[(version, normalized)] = {
+                'answer': answer,
+                'embedding': embedding,
+                'identifiers': _identifiers(normalized),
+                'created_at': time.time(),
+            }
+            self._entries.move_to_end((version, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """
+        İsabet/ıskalama sayaçlarını döndürür.
+
+        'misses' hiçbir aramada cevap bulunamayan soru sayısıdır; birebir
+        arama yapılmadıysa anlamsal aramalar soru sayılır.
+        """
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            questions = self.exact_hits + self.exact_misses or self.semantic_hits + self.semantic_misses
+            return {
+                'entries': len(self._entries),
+                'exact_hits': self.exact_hits,
+                'exact_misses': self.exact_misses,
+                'semantic_hits': self.semantic_hits,
+                'semantic_misses': self.semantic_misses,
+                'misses': max(questions - hits, 0),
+                'hit_rate': hits / questions if questions else 0.0,
+            }
@@ -0,0 +1,398 @@
+import os
+import time
+import random
+import asyncio
+import threading
+
+from telemetry import event
+
+# API başına saniyedeki istek sayısı ve anlık patlama kapasitesi (token kovası).
+EMBED_RATE = float(os.getenv("VEX_EMBED_RATE", "20"))
+EMBED_BURST = int(os.getenv("VEX_EMBED_BURST", "40"))
+GENERATE_RATE = float(os.getenv("VEX_GENERATE_RATE", "4"))
+GENERATE_BURST = int(os.getenv("VEX_GENERATE_BURST", "8"))
+# Kovadan token beklemenin üst sınırı; daha uzun beklenecekse istek reddedilir.
+RATE_LIMIT_MAX_WAIT = float(os.getenv("VEX_RATE_LIMIT_MAX_WAIT", "10"))
+
+# Jitter'lı üstel bekleme: deneme n için [0, min(BACKOFF_MAX, BACKOFF_BASE * 2^n)] aralığında rastgele.
+BACKOFF_BASE = float(os.getenv("VEX_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("VEX_BACKOFF_MAX", "16.0"))
+
+# Art arda bu kadar hata devre kesiciyi açar; açık devre bu süre sonra tek bir deneme isteğine izin verir.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("VEX_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("VEX_BREAKER_RESET_TIMEOUT", "30"))
+
+
+class CircuitOpenError(Exception):
+    """Devre kesici açıkken yapılan çağrılar API'ye gitmeden bu hatayla reddedilir."""
+
+
+class RateLimitExceeded(Exception):
+    """Token kovasında RATE_LIMIT_MAX_WAIT içinde yer açılmayacaksa fırlatılır."""
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """
+    Yeniden deneme öncesi beklenecek süre ("full jitter").
+
+    Aynı anda hata alan istemciler aynı anda tekrar denemesin diye süre
+    üstel üst sınır içinde rastgele seçilir.
+
+    Args:
+        attempt (int): 0'dan başlayan deneme numarası.
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    Süreç genelinde paylaşılan token kovası hız sınırlayıcısı.
+
+    Kova saniyede `rate` token dolar, en fazla `capacity` token tutar; her
+    istek bir token harcar. Token yoksa istek sıradaki token'ın zamanını
+    ayırır ve o ana kadar bekler, böylece bekleyenler sırayla geçer.
+
+    Args:
+        rate (float): Saniyedeki istek sayısı; 0 veya negatifse sınırsız.
+        capacity (int): Anlık patlama kapasitesi.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, max_wait):
+        """Bir token ayırır ve beklenmesi gereken süreyi döndürür."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                raise RateLimitExceeded(f"hız sınırı: {wait:.1f} sn beklemek gerekiyor")
+            # Token borç olarak düşülür; sonraki istekler kendi sıralarını bekler.
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        wait = self._reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        wait = self._reserve(max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Art arda hatalarda API çağrılarını geçici olarak durduran devre kesici.
+
+    Kapalı: çağrılar geçer. `failure_threshold` ardışık hatadan sonra açılır
+    ve `reset_timeout` boyunca çağrılar hemen reddedilir. Süre dolunca
+    yarı açık duruma geçer ve tek bir deneme çağrısına izin verir; başarılı
+    olursa kapanır, başarısız olursa yeniden açılır.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Çağrı yapılabilirse True; yarı açık durumda yalnızca ilk çağıran True alır."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"✅ {self.name} devre kesicisi kapandı")
+            self.state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"🚧 {self.name} devre kesicisi açıldı ({self._failures} ardışık hata)")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release(self):
+        """İzin alınıp API'ye gidilmediyse (ör. hız sınırı) yarı açık deneme hakkını geri verir."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def status(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self._failures}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamFlight:
+    """Tek bir akışın parçalarını birden fazla aboneye dağıtır."""
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.condition = asyncio.Condition()
+
+    async def run(self, source):
+        try:
+            async for part in source:
+                async with self.condition:
+                    self.parts.append(part)
+                    self.condition.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            await self.finish()
+
+    async def finish(self, error=None):
+        """Akışı bitirir; hata verilirse abonelere iletilir."""
+        async with self.condition:
+            if error is not None:
+                self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: position < len(self.parts) or self.done)
+                new_parts = self.parts[position:]
+                position = len(self.parts)
+                finished = self.done and position == len(self.parts)
+            for part in new_parts:
+                yield part
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class ApiGuard:
+    """
+    Bir API (embed veya generate) için paylaşılan istemci katmanı.
+
+    Her çağrı sırasıyla devre kesiciden, tek uçuş (single-flight)
+    birleştirmesinden ve token kovasından geçer: aynı anahtarlı eşzamanlı
+    istekler tek bir API çağrısını paylaşır, yalnızca gerçekten API'ye
+    giden çağrı token harcar. Devre açıksa CircuitOpenError hemen döner;
+    çağıranlar yeniden denemek yerine yedek yola (anahtar kelime araması,
+    create_fallback_response) geçmelidir.
+
+    Args:
+        name (str): API adı (metrik etiketi).
+        rate (float): Saniyedeki istek sayısı.
+        burst (int): Token kovası kapasitesi.
+    """
+
+    def __init__(self, name, rate, burst, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self._calls = {}
+        self._async_calls = {}
+        self._streams = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            event('circuit_open', api=self.name)
+            raise CircuitOpenError(f"{self.name} API devre kesicisi açık")
+
+    def _acquire(self):
+        try:
+            wait = self.bucket.acquire()
+        except RateLimitExceeded:
+            self.breaker.release()
+            event('rate_limited', api=self.name, rejected=True)
+            raise
+        if wait > 0:
+            event('rate_limited', api=self.name, wait_seconds=round(wait, 3))
+
+    async def _acquire_async(self):
+        try:
+            wait = await self.bucket.acquire_async()
+        except RateLimitExceeded:
+            self.breaker.release()
+            event('rate_limited', api=self.name, rejected=True)
+            raise
+        if wait > 0:
+            event('rate_limited', api=self.name, wait_seconds=round(wait, 3))
+
+    def call(self, fn, key=None):
+        """
+        fn()'i korumalı olarak çalıştırır.
+
+        Args:
+            fn (callable): API çağrısı.
+            key (hashable): Aynı anahtarlı eşzamanlı çağrılar birleştirilir; None ise birleştirme yok.
+        """
+        if key is None:
+            return self._invoke(fn)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            event('coalesced', api=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._invoke(fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _invoke(self, fn):
+        self._check_breaker()
+        self._acquire()
+        try:
+            result = fn()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def call_async(self, coro_fn, key=None):
+        """call'ın asenkron karşılığı; coro_fn() bir coroutine döndürmelidir."""
+        if key is None:
+            return await self._invoke_async(coro_fn)
+        flight_key = (id(asyncio.get_running_loop()), key)
+        future = self._async_calls.get(flight_key)
+        if future is not None:
+            event('coalesced', api=self.name)
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[flight_key] = future
+        try:
+            result = await self._invoke_async(coro_fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Bekleyen takipçi yoksa "exception was never retrieved" uyarısını önler.
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[flight_key]
+
+    async def _invoke_async(self, coro_fn):
+        self._check_breaker()
+        await self._acquire_async()
+        try:
+            result = await coro_fn()
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def stream(self, source_fn, key=None):
+        """
+        Akışlı API çağrısını korumalı olarak çalıştırır ve parçaları döndürür.
+
+        Aynı anahtarlı eşzamanlı akışlar tek bir API akışını paylaşır; sonradan
+        katılan abone o ana kadar gelen parçaları da alır. Akış, ilk abone
+        bağlantıyı kesse bile diğerleri için sonuna kadar okunur. Akış,
+        devre kesici ve token beklenmeden önce kaydedilir; hız sınırında
+        bekleyen akışa katılanlar da aynı API çağrısını paylaşır. Devre açık
+        veya hız sınırı aşıldıysa hata tüm abonelere iletilir.
+
+        Args:
+            source_fn (callable): Parça üreten async üreteç döndürür.
+            key (hashable): Birleştirme anahtarı; None ise birleştirme yok.
+
+        Yields:
+            Akıştan gelen parçalar.
+        """
+        flight_key = (id(asyncio.get_running_loop()), key)
+        flight = self._streams.get(flight_key) if key is not None else None
+        if flight is None:
+            flight = _StreamFlight()
+            if key is not None:
+                self._streams[flight_key] = flight
+
+            async def run():
+                try:
+                    try:
+                        self._check_breaker()
+                        await self._acquire_async()
+                    except Exception as e:
+                        # API'ye gidilmedi; devre kesiciye hata sayılmaz.
+                        await flight.finish(e)
+                        return
+                    await flight.run(source_fn())
+                    if flight.error is None:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                finally:
+                    if key is not None and self._streams.get(flight_key) is flight:
+                        del self._streams[flight_key]
+
+            # Görev referansı tutulur; aksi halde çöp toplayıcı yarıda silebilir.
+            task = asyncio.get_running_loop().create_task(run())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            event('coalesced', api=self.name)
+
+        async for part in flight.subscribe():
+            yield part
+
+    def status(self):
+        return {'breaker': self.breaker.status(), 'in_flight': len(self._calls) + len(self._async_calls) + len(self._streams)}
+
+
+embed_guard = ApiGuard("embed", EMBED_RATE, EMBED_BURST)
+generate_guard = ApiGuard("generate", GENERATE_RATE, GENERATE_BURST)
@@ -0,0 +1,373 @@
+"""
+Toplu soru cevaplama.
+
+Turnuva öncesi bilinen soruların cevaplarını önceden üretmek (ve
+önbellekleri ısıtmak) ya da kılavuz değiştiğinde arama regresyonunu
+kontrol etmek için. Sorular JSONL ya da CSV dosyasından okunur; sorgu
+vektörleri tek seferde partiler halinde üretilir, FAISS aramaları toplu
+yapılır, cevaplar sınırlı eşzamanlılıkla üretilir. Her sonuç geldikçe
+JSONL çıktısına eklenir; yarıda kalan koşu aynı komutla kaldığı yerden sürer.
+
+Kullanım:
+    python src/batch_qa.py sorular.jsonl --output cevaplar.jsonl --concurrency 8
+    python src/batch_qa.py sorular.csv --output cevaplar.jsonl          # kaldığı yerden devam
+    python src/batch_qa.py sorular.jsonl --output arama_v5.jsonl --retrieval-only --baseline arama_v4.jsonl
+
+Girdi satırları: {"id": "...", "question": "...", "expected_rules": ["SG1", "SG2"]}; 'id' ve
+'expected_rules' opsiyoneldir ('query'/'soru' sütun adları da kabul edilir).
+"""
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rag_engine
+import telemetry
+from answer_cache import normalize_query
+from embedding import embed_texts, embedder_for_model
+from embedding_cache import get_embedding_cache
+from retrieval import normalize_rule_id
+from telemetry import traced, current_trace
+
+# Aynı anda üretilen cevap sayısı (hız limiti ayrıca generate_guard ile uygulanır)
+BATCH_CONCURRENCY = int(os.getenv("VEX_BATCH_CONCURRENCY", "8"))
+# Tek embedding + toplu FAISS geçişinde işlenen soru sayısı; bir blok aranırken önceki bloğun cevapları üretilir.
+BATCH_BLOCK_SIZE = int(os.getenv("VEX_BATCH_BLOCK_SIZE", "128"))
+
+# Bu sonuçlarla biten sorular devam ederken yeniden denenir.
+RETRY_OUTCOMES = ('fallback', 'error', 'interrupted')
+
+_QUESTION_FIELDS = ('question', 'query', 'soru')
+
+
+def question_id(question):
+    """Kimliği verilmemiş sorular için normalize metinden türetilen kısa kimlik."""
+    return hashlib.sha1(normalize_query(question).encode('utf-8')).hexdigest()[:12]
+
+
+def _parse_rules(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r'[,;\s]+', value)
+    return [normalize_rule_id(rule) for rule in value if rule and normalize_rule_id(rule)]
+
+
+def read_questions(path):
+    """
+    Soruları JSONL ya da CSV (uzantıya göre) dosyasından okur.
+
+    Boş satırlar ve soru alanı olmayan kayıtlar atlanır; aynı kimlik
+    birden fazla kez geçerse ilki kullanılır.
+
+    Returns:
+        list: {'id', 'question', 'expected_rules'} kayıtları, dosyadaki sırayla.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    questions = []
+    seen = set()
+    for row in rows:
+        question = next((row[field].strip() for field in _QUESTION_FIELDS if (row.get(field) or '').strip()), None)
+        if question is None:
+            continue
+        identifier = str(row.get('id') or '').strip() or question_id(question)
+        if identifier in seen:
+            continue
+        seen.add(identifier)
+        questions.append({'id': identifier, 'question': question,
+                          'expected_rules': _parse_rules(row.get('expected_rules'))})
+    return questions
+
+
+def read_results(path):
+    """Sonuç dosyasındaki kayıtlar (kimlik -> son kayıt); dosya yoksa boş sözlük."""
+    results = {}
+    if not path or not os.path.exists(path):
+        return results
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Koşu yazarken kesildiyse son satır yarım kalmış olabilir.
+                continue
+            results[record['id']] = record
+    return results
+
+
+def _is_done(record, version, retrieval_only):
+    if record is None or record.get('index_version') != version:
+        return False
+    if retrieval_only:
+        return True
+    return 'answer' in record and record.get('outcome') not in RETRY_OUTCOMES
+
+
+class ResultWriter:
+    """Sonuçları JSONL dosyasına satır satır ekler; her satır hemen diske yazılır."""
+
+    def __init__(self, path):
+        self._file = open(path, 'a+', encoding='utf-8')
+        self._lock = threading.Lock()
+        # Önceki koşu satır ortasında kesildiyse yeni kayıt yarım satıra yapışmasın.
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def retrieve_block(items, store):
+    """
+    Bir soru bloğu için parçaları getirir.
+
+    Kural ID'si geçen sorular tablodan cevaplanır. Kalan soruların
+    zenginleştirilmiş metinleri tek bir embed_texts çağrısıyla (Gemini
+    modellerinde kalıcı önbellek üzerinden) vektörleştirilir, FAISS'te tek
+    bir search_many ile aranır ve her soru search_chunks ile yeniden sıralanır.
+
+    Args:
+        items (list): read_questions kayıtları.
+        store (IndexVersion | ShardSnapshot): Soruların aranacağı sürüm.
+
+    Returns:
+        list: Her soru için (parçalar, sorgu vektörü | None, yöntem, zamanlamalar) dörtlüsü.
+    """
+    results = [None] * len(items)
+    pending = []
+    for position, item in enumerate(items):
+        start = time.perf_counter()
+        chunks = rag_engine.lookup_rule_chunks(item['question'], store)
+        if chunks:
+            results[position] = (chunks, None, 'rule_lookup',
+                                 {'retrieval_ms': round((time.perf_counter() - start) * 1000, 3)})
+        else:
+            pending.append(position)
+    if not pending:
+        return results
+
+    enhanced = [rag_engine.translate_query_keywords(items[position]['question']) for position in pending]
+    model = rag_engine.index_embedding_model(store)
+    start = time.perf_counter()
+    try:
+        cache = None if rag_engine._is_local_model(model) else get_embedding_cache()
+        vectors = embed_texts(enhanced, embedder=embedder_for_model(model), task_type="retrieval_query", cache=cache)
+    except Exception as e:
+        print(f"❌ Sorgu vektörleri oluşturulamadı, anahtar kelime aramasına geçiliyor: {e}")
+        for position, query in zip(pending, enhanced):
+            start = time.perf_counter()
+            chunks = rag_engine.keyword_only_search(query, store)
+            results[position] = (chunks, None, 'keyword',
+                                 {'retrieval_ms': round((time.perf_counter() - start) * 1000, 3)})
+        return results
+    # Parti süreleri soru başına paylaştırılarak kaydedilir.
+    embed_ms = (time.perf_counter() - start) * 1000 / len(pending)
+
+    start = time.perf_counter()
+    dense_hits = store.search_many(vectors, rag_engine.RETRIEVAL_DENSE_K)
+    search_ms = (time.perf_counter() - start) * 1000 / len(pending)
+
+    for position, query, vector, hits in zip(pending, enhanced, vectors, dense_hits):
+        start = time.perf_counter()
+        chunks = rag_engine.search_chunks(items[position]['question'], query, vector, store, dense_hits=hits)
+        results[position] = (chunks, vector, 'search', {
+            'embed_ms': round(embed_ms, 3),
+            'search_ms': round(search_ms, 3),
+            'rerank_ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+    return results
+
+
+@traced('batch_answer')
+def _generate(question, chunks, store, query_embedding):
+    answer = rag_engine.generate_answer(question, chunks, store, query_embedding=query_embedding)
+    attributes = current_trace().attributes
+    return answer, attributes.get('outcome', 'unknown'), attributes.get('attempts')
+
+
+def _record(item, store, chunks, method, timings):
+    rule_ids = [normalize_rule_id(chunk['rule_id']) for chunk in chunks]
+    record = {
+        'id': item['id'],
+        'question': item['question'],
+        'index_version': store.version,
+        'method': method,
+        'rule_ids': rule_ids,
+        'pages': [chunk['page_number'] for chunk in chunks],
+        'sources': [{key: chunk[key] for key in ('rule_id', 'page_number', 'shard', 'reference_of') if key in chunk}
+                    for chunk in chunks],
+        'timings': timings,
+    }
+    if item['expected_rules']:
+        record['expected_rules'] = item['expected_rules']
+        record['hit'] = any(rule in rule_ids for rule in item['expected_rules'])
+    return record
+
+
+def answer_one(item, store, chunks, query_embedding, method, timings, writer):
+    """Tek bir sorunun cevabını üretir ve kaydı yazar (iş parçacığı havuzunda çalışır)."""
+    record = _record(item, store, chunks, method, dict(timings))
+    start = time.perf_counter()
+    if not chunks:
+        answer, outcome, attempts = "Üzgünüm, sorgunuzla ilgili bilgi bulunamadı.", 'no_chunks', None
+    else:
+        try:
+            answer, outcome, attempts = _generate(item['question'], chunks, store, query_embedding)
+        except Exception as e:
+            print(f"❌ Cevap üretilemedi ({item['id']}): {e}")
+            answer, outcome, attempts = None, 'error', None
+    record['timings']['generation_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    record.update(answer=answer, outcome=outcome, attempts=attempts)
+    writer.write(record)
+    return record
+
+
+def run_batch(questions, output_path, concurrency=BATCH_CONCURRENCY, block_size=BATCH_BLOCK_SIZE,
+              retrieval_only=False):
+    """
+    Soruları toplu arar, cevaplar ve sonuçları output_path'e ekler.
+
+    Aynı indeks sürümüyle başarıyla tamamlanmış sorular atlanır; yedek
+    cevapla ya da hatayla bitenler yeniden denenir. Sorular seçilen indeks
+    bölümlerine göre gruplanır; her grup bloklar halinde aranır ve cevaplar
+    arama ilerlerken havuzda üretilir.
+
+    Args:
+        questions (list): read_questions kayıtları.
+        output_path (str): Sonuç JSONL dosyası (varsa kaldığı yerden devam edilir).
+        concurrency (int): Aynı anda üretilen cevap sayısı.
+        block_size (int): Tek embedding/FAISS geçişindeki soru sayısı.
+        retrieval_only (bool): Cevap üretme; yalnızca bulunan kuralları kaydet.
+
+    Returns:
+        dict: Özet (soru, atlanan, sonuç sayıları, süre, beklenen kural isabet oranı).
+    """
+    previous = read_results(output_path)
+    groups = {}
+    skipped = 0
+    for item in questions:
+        store = rag_engine.select_store(item['question'])
+        if store is None or not store.chunks:
+            print("HATA: Index veya chunks yüklenemedi!")
+            break
+        if _is_done(previous.get(item['id']), store.version, retrieval_only):
+            skipped += 1
+            continue
+        groups.setdefault(store.version, (store, []))[1].append(item)
+
+    pending = sum(len(items) for _, items in groups.values())
+    print(f"📋 {len(questions)} soru: {skipped} tamamlanmış, {pending} işlenecek"
+          f"{' (yalnızca arama)' if retrieval_only else f', eşzamanlılık {concurrency}'}")
+
+    start = time.perf_counter()
+    writer = ResultWriter(output_path)
+    outcomes = {}
+    records = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = []
+            for store, items in groups.values():
+                for block_start in range(0, len(items), block_size):
+                    block = items[block_start:block_start + block_size]
+                    for item, (chunks, vector, method, timings) in zip(block, retrieve_block(block, store)):
+                        if retrieval_only:
+                            record = _record(item, store, chunks, method, timings)
+                            writer.write(record)
+                            records.append(record)
+                        else:
+                            futures.append(executor.submit(answer_one, item, store, chunks, vector, method,
+                                                           timings, writer))
+                    print(f"🔎 {min(block_start + block_size, len(items))}/{len(items)} soru arandı ({store.version})")
+            for done, future in enumerate(futures, start=1):
+                records.append(future.result())
+                if done == len(futures) or done % max(1, len(futures) // 10) == 0:
+                    print(f"  {done}/{len(futures)} cevap tamamlandı")
+    finally:
+        writer.close()
+
+    for record in records:
+        outcome = record.get('outcome', 'retrieved')
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    seconds = time.perf_counter() - start
+    summary = {'questions': len(questions), 'skipped': skipped, 'processed': len(records),
+               'outcomes': outcomes, 'seconds': round(seconds, 3)}
+    checked = [record for record in records if 'hit' in record]
+    if checked:
+        summary['expected_hit_rate'] = round(sum(record['hit'] for record in checked) / len(checked), 4)
+    rate = f", {len(records) / seconds:.1f} soru/sn" if seconds > 0 and records else ""
+    print(f"✅ {len(records)} soru {seconds:.1f} sn'de işlendi{rate} · " +
+          ", ".join(f"{name}: {value}" for name, value in sorted(outcomes.items())))
+    if checked:
+        print(f"🎯 Beklenen kural isabeti: {summary['expected_hit_rate']:.1%} ({len(checked)} soru)")
+    return summary
+
+
+def compare_results(baseline_path, output_path, limit=20):
+    """
+    İki koşunun bulunan kurallarını karşılaştırır (ör. kılavuz güncellemesinden önce ve sonra).
+
+    Returns:
+        list: Kuralları değişen soruların (kimlik, soru, önceki, şimdiki) kayıtları.
+    """
+    baseline = read_results(baseline_path)
+    current = read_results(output_path)
+    changed = []
+    for identifier, record in current.items():
+        old = baseline.get(identifier)
+        if old is not None and old.get('rule_ids') != record.get('rule_ids'):
+            changed.append((identifier, record['question'], old.get('rule_ids'), record.get('rule_ids')))
+    compared = sum(1 for identifier in current if identifier in baseline)
+    print(f"\nKarşılaştırma: {baseline_path} -> {output_path}: {compared} ortak sorunun {len(changed)} tanesinde "
+          f"bulunan kurallar değişti")
+    for identifier, question, old_rules, new_rules in changed[:limit]:
+        print(f"  [{identifier}] {question[:60]}")
+        print(f"      önce: {', '.join(old_rules or []) or '-'}")
+        print(f"      şimdi: {', '.join(new_rules or []) or '-'}")
+    if len(changed) > limit:
+        print(f"  ... ve {len(changed) - limit} soru daha")
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soruları toplu arar ve cevaplar (JSONL/CSV -> JSONL)")
+    parser.add_argument("questions", help="Soru dosyası (.jsonl veya .csv)")
+    parser.add_argument("--output", required=True, help="Sonuç JSONL dosyası; varsa kaldığı yerden devam edilir")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Aynı anda üretilen cevap sayısı")
+    parser.add_argument("--block-size", type=int, default=BATCH_BLOCK_SIZE,
+                        help="Tek embedding/FAISS geçişindeki soru sayısı")
+    parser.add_argument("--retrieval-only", action="store_true", help="Cevap üretme, yalnızca arama sonuçlarını yaz")
+    parser.add_argument("--baseline", help="Bulunan kuralları önceki bir sonuç dosyasıyla karşılaştır")
+    args = parser.parse_args()
+
+    # Soru başına iz satırları konsolu doldurmasın; ayarlanmadıysa çıktının yanına yazılır.
+    if not telemetry.TRACE_LOG_PATH:
+        telemetry.TRACE_LOG_PATH = args.output + ".traces.jsonl"
+
+    questions = read_questions(args.questions)
+    run_batch(questions, args.output, concurrency=args.concurrency, block_size=args.block_size,
+              retrieval_only=args.retrieval_only)
+    if args.baseline:
+        compare_results(args.baseline, args.output)
+
+
+if __name__ == "__main__":
+    main()
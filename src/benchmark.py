@@ -0,0 +1,626 @@
+"""
+Çevrimdışı performans ölçümleri.
+
+Tüm ölçümler yerel stand-in'lerle çalışır, GOOGLE_API_KEY gerektirmez.
+
+Kullanım:
+    python src/benchmark.py embedding --chunks 500 --latency 0.02
+    python src/benchmark.py keywords --chunks 30
+    python src/benchmark.py index --vectors 10000 --types flat_ip,ivf_flat,hnsw,sq8,ivf_pq
+    python src/benchmark.py index --index-dir data   # aktif sürümün gerçek vektörleri
+    python src/benchmark.py search --vectors 20000 --concurrency 1,8,32 --window-ms 1 --max-batch 32
+    python src/benchmark.py rag --sizes 200,2000,20000 --concurrency 1,8 --output bench.json
+    python src/benchmark.py rag --baseline bench.json   # önceki commit'in sonuçlarıyla karşılaştır
+"""
+import argparse
+import random
+import time
+
+# Sentetik kural metinleri için kelime havuzu
+_WORDS = (
+    "robot size limit expansion inch plastic polycarbonate material custom part motor power "
+    "battery sensor autonomous driver match field goal block score penalty violation alliance "
+    "starting configuration vertical horizontal legal illegal referee tournament team drive "
+    "boyut sınır ağırlık genişleme plastik malzeme parça kural ceza maç oyun kontrol"
+).split()
+
+
+def synthetic_chunks(n, seed=0, words_per_chunk=(30, 120)):
+    """
+    Benchmark'lar için processed_chunks.json formatında sentetik parçalar üretir.
+
+    Args:
+        n (int): Üretilecek parça sayısı.
+        seed (int): Rastgelelik tohumu; aynı tohum aynı korpusu üretir.
+        words_per_chunk (tuple): Parça başına kelime sayısı aralığı.
+
+    Returns:
+        list: {'page_number', 'rule_id', 'content'} sözlüklerinden oluşan liste.
+    """
+    rng = random.Random(seed)
+    prefixes = ["R", "SG", "GG", "SC", "S"]
+    chunks = []
+    for i in range(n):
+        length = rng.randint(*words_per_chunk)
+        content = " ".join(rng.choice(_WORDS) for _ in range(length)) + "."
+        chunks.append({
+            'page_number': i // 4 + 1,
+            'rule_id': f"<{prefixes[i % len(prefixes)]}{i // len(prefixes) + 1}>",
+            'content': content,
+        })
+    return chunks
+
+
+def bench_embedding(args):
+    """Sıralı tekli istekler ile partili/paralel pipeline'ı karşılaştırır."""
+    from embedding import HashEmbedder, embed_texts
+
+    texts = [chunk['content'] for chunk in synthetic_chunks(args.chunks, seed=args.seed)]
+    embedder = HashEmbedder(latency=args.latency)
+
+    runs = []
+    if not args.skip_baseline:
+        runs.append(("sıralı (parti=1, işçi=1)", 1, 1))
+    runs.append((f"partili (parti={args.batch_size}, işçi={args.workers})", args.batch_size, args.workers))
+
+    reference = None
+    for label, batch_size, workers in runs:
+        start = time.perf_counter()
+        vectors = embed_texts(texts, embedder=embedder, batch_size=batch_size, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = vectors
+        elif not (reference == vectors).all():
+            raise SystemExit("❌ Satır hizası bozuk: pipeline çıktıları farklı")
+        print(f"{label}: {elapsed:.2f} sn, {len(texts) / elapsed:.1f} parça/sn")
+
+
+def _legacy_keyword_filter(chunks, keywords):
+    """get_related_chunks'taki eski kelime-başına regex döngüsü (karşılaştırma için)."""
+    import re
+
+    results = []
+    for chunk in chunks:
+        content_lower = chunk['content'].lower()
+        rule_id_lower = chunk['rule_id'].lower()
+        matched_keywords = []
+        for keyword in keywords:
+            if (keyword in content_lower or keyword in rule_id_lower or
+                re.search(r'\b' + re.escape(keyword) + r'\b', content_lower) or
+                re.search(r'\b' + re.escape(keyword) + r'\b', rule_id_lower)):
+                matched_keywords.append(keyword)
+        results.append(matched_keywords)
+    return results
+
+
+def bench_keywords(args):
+    """Derlenmiş kelime eşleştiricisini eski döngüyle karşılaştırır ve çıktıların aynı olduğunu doğrular."""
+    import re
+    from keyword_matcher import get_keyword_matcher
+
+    chunks = synthetic_chunks(args.chunks, seed=args.seed, words_per_chunk=(100, 300))
+    query = "Robot boyut sınırı nedir? robot size limit dimensions R25 plastik kural"
+    keywords = ['boyut', 'size', 'ölçü', 'limit', 'sınır', 'dimension', 'dimensions', 'expansion', 'genişleme',
+                '18', '22', 'inch', 'inç', 'mm', 'volume', 'hacim', 'cubic', 'kübik', 'R25']
+    keywords.extend(re.findall(r'\b\w{2,}\b', query.lower()))
+    keywords.extend(["rule", "kural", "regulation"])
+    keywords = list(set(keywords))
+
+    def matcher_filter(chunks, keywords):
+        matcher = get_keyword_matcher(tuple(keywords))
+        return [matcher.match(chunk['content'].lower(), chunk['rule_id'].lower()) for chunk in chunks]
+
+    if _legacy_keyword_filter(chunks, keywords) != matcher_filter(chunks, keywords):
+        raise SystemExit("❌ matched_keywords çıktıları farklı")
+
+    for label, fn in (("eski döngü", _legacy_keyword_filter), ("derlenmiş eşleştirici", matcher_filter)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn(chunks, keywords)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"{label}: {elapsed * 1000:.2f} ms / istek ({len(chunks)} parça, {len(keywords)} kelime)")
+
+
+def synthetic_vectors(n, dimension, seed=0, clusters=64):
+    """
+    Kümelenmiş sentetik embedding'ler üretir; gerçek metin embedding'leri gibi
+    vektörler konu kümelerinin etrafında toplanır.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype('float32')
+    assignments = rng.integers(0, clusters, size=n)
+    return centers[assignments] + 0.6 * rng.normal(size=(n, dimension)).astype('float32')
+
+
+def _index_vectors(args):
+    """Benchmark vektörlerini ve sorgularını (etiket, vektörler, sorgular) olarak döndürür."""
+    import numpy as np
+
+    if args.index_dir:
+        from index_store import load_index_version
+
+        store = load_index_version(args.index_dir, use_mmap=False)
+        index = store.index.index if hasattr(store.index, 'id_map') else store.index
+        vectors = index.reconstruct_n(0, index.ntotal)
+        label = f"gerçek ({args.index_dir}, sürüm {store.version})"
+    elif args.chunks_file:
+        from embedding import HashEmbedder, _load_chunks, embed_texts
+
+        texts = [chunk['content'] for chunk in _load_chunks(args.chunks_file)]
+        vectors = embed_texts(texts, embedder=HashEmbedder(dimension=args.dim))
+        label = f"gerçek metin, yerel embedder ({args.chunks_file})"
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, seed=args.seed)
+        label = "sentetik"
+
+    # Sorgular: rastgele seçilmiş vektörlerin gürültülü kopyaları (yakın ama birebir aynı değil)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, len(vectors), size=args.queries)
+    scale = float(np.std(vectors)) * 0.3
+    queries = vectors[picks] + scale * rng.normal(size=(args.queries, vectors.shape[1])).astype('float32')
+    return label, np.ascontiguousarray(vectors, dtype='float32'), np.ascontiguousarray(queries, dtype='float32')
+
+
+def bench_index(args):
+    """Yaklaşık/sıkıştırılmış indeks tiplerini kesin flat_ip aramasıyla karşılaştırır."""
+    import faiss
+    import numpy as np
+    from index_factory import build_index, prepare_vectors
+
+    label, vectors, queries = _index_vectors(args)
+    n = len(vectors)
+    ids = np.arange(n, dtype='int64')
+    print(f"Veri: {label}, {n} vektör x {vectors.shape[1]} boyut, {len(queries)} sorgu, k={args.k}")
+
+    exact, exact_metadata = build_index(vectors, ids, 'flat_ip')
+    _, truth = exact.search(prepare_vectors(queries, exact_metadata), args.k)
+
+    print(f"{'tip':<10} {'factory':<18} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'bayt/vektör':>12} {'kurulum sn':>11}")
+    for index_type in args.types.split(','):
+        start = time.perf_counter()
+        index, metadata = build_index(vectors, ids, index_type.strip())
+        build_seconds = time.perf_counter() - start
+
+        prepared = prepare_vectors(queries, metadata)
+        latencies = []
+        found = np.empty_like(truth)
+        for i in range(len(prepared)):
+            query_start = time.perf_counter()
+            _, found[i:i + 1] = index.search(prepared[i:i + 1], args.k)
+            latencies.append(time.perf_counter() - query_start)
+
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / args.k for i in range(len(truth))])
+        bytes_per_vector = len(faiss.serialize_index(index)) / n
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{metadata['index_type']:<10} {metadata['factory']:<18} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f} "
+              f"{bytes_per_vector:>12.1f} {build_seconds:>11.2f}")
+
+
+def _run_load(search_fn, queries, concurrency, requests):
+    """
+    Kapalı döngü yük üreteci: `concurrency` iş parçacığı sırayla istek gönderir.
+
+    Returns:
+        tuple: (saniyedeki istek, gecikmeler listesi - saniye)
+    """
+    import threading
+
+    latencies = []
+    lock = threading.Lock()
+    per_worker = max(1, requests // concurrency)
+
+    def worker(offset):
+        local = []
+        for i in range(per_worker):
+            query = queries[(offset + i * concurrency) % len(queries)]
+            start = time.perf_counter()
+            search_fn(query)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies
+
+
+def bench_search(args):
+    """Eşzamanlı sorgularda istek başına FAISS araması ile mikro-partili zamanlayıcıyı karşılaştırır."""
+    import numpy as np
+    from index_factory import build_index
+    from index_store import IndexVersion
+    from search_scheduler import SearchScheduler
+
+    label, vectors, queries = _index_vectors(args)
+    index, metadata = build_index(vectors, np.arange(len(vectors), dtype='int64'), args.index_type)
+    version = IndexVersion(index, [{'id': i} for i in range(len(vectors))], metadata)
+    print(f"Veri: {label}, {len(vectors)} vektör, indeks {metadata['index_type']}, k={args.k}, "
+          f"pencere {args.window_ms} ms, en fazla parti {args.max_batch}")
+
+    print(f"{'eşzamanlı':>9} {'yol':<10} {'istek/sn':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ort. parti':>10}")
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        scheduler = SearchScheduler(max_batch=args.max_batch, window=args.window_ms / 1000)
+        paths = [
+            ("tekil", lambda query: version.search_many([query], args.k)[0]),
+            ("partili", lambda query: scheduler.search(version, query, args.k)),
+        ]
+        for name, search_fn in paths:
+            throughput, latencies = _run_load(search_fn, queries, concurrency, args.requests)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            stats = scheduler.stats()
+            # Kuyruğa girmeden aranan istekler tek sorguluk parti sayılır.
+            calls = stats['batches'] + stats['direct']
+            batch = f"{(stats['items'] + stats['direct']) / calls if calls else 0.0:.1f}" if name == "partili" else "1.0"
+            print(f"{concurrency:>9} {name:<10} {throughput:>10.0f} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} {batch:>10}")
+
+
+# Yük testinde kullanılan Türkçe/İngilizce sorgu karışımı
+RAG_QUERIES_TR = (
+    "Robot boyut sınırı nedir?",
+    "Robotun ağırlık sınırı ne kadar?",
+    "Plastik parça kullanabilir miyim?",
+    "Otonom periyotta ceza nedir?",
+    "Genişleme limiti kaç inç?",
+    "Maç sırasında hangi parçalar yasak?",
+)
+RAG_QUERIES_EN = (
+    "What is the robot size limit?",
+    "How much plastic is allowed?",
+    "What are the penalties during autonomous?",
+    "What is the expansion limit in inches?",
+    "Can I use custom parts?",
+    "What happens after a match violation?",
+)
+
+
+def rag_queries(count, tr_ratio=0.5, seed=0):
+    """Belirtilen Türkçe oranında karışık sorgu listesi üretir."""
+    rng = random.Random(seed)
+    return [rng.choice(RAG_QUERIES_TR if rng.random() < tr_ratio else RAG_QUERIES_EN) for _ in range(count)]
+
+
+def _rss_mb():
+    """Sürecin anlık bellek kullanımı (MB); /proc yoksa None."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    import os
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def _peak_rss_mb():
+    """Sürecin şimdiye kadarki en yüksek bellek kullanımı (MB)."""
+    import resource
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux KB, macOS bayt döndürür
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _percentiles(values):
+    import numpy as np
+    if not values:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {'count': len(values), 'mean_ms': round(float(np.mean(values)) * 1000, 3),
+            'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3)}
+
+
+def _run_load_async(request_fn, queries, concurrency, requests):
+    """
+    _run_load'un asenkron karşılığı: tek event loop'ta `concurrency` görev.
+
+    Returns:
+        tuple: (saniyedeki istek, gecikmeler listesi - saniye)
+    """
+    import asyncio
+
+    latencies = []
+    per_worker = max(1, requests // concurrency)
+
+    async def worker(offset):
+        for i in range(per_worker):
+            query = queries[(offset + i * concurrency) % len(queries)]
+            start = time.perf_counter()
+            await request_fn(query)
+            latencies.append(time.perf_counter() - start)
+
+    async def run():
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return len(latencies) / (time.perf_counter() - start), latencies
+
+
+def _build_rag_corpus(directory, size, args):
+    """Sentetik (veya --chunks-file'dan) `size` parçalık korpus için indeks sürümü yazar."""
+    import os
+    import json
+    import contextlib
+    import io
+    from embedding import GeminiEmbedder, create_faiss_index
+
+    if args.chunks_file:
+        from embedding import _load_chunks
+        source_chunks = _load_chunks(args.chunks_file)
+        # Gerçek korpus istenen boyuttan küçükse tekrarlanarak büyütülür.
+        chunks = [dict(source_chunks[i % len(source_chunks)]) for i in range(size)]
+    else:
+        chunks = synthetic_chunks(size, seed=args.seed)
+    source = os.path.join(directory, "chunks.json")
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump(chunks, f, ensure_ascii=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        index = create_faiss_index(directory, embedder=GeminiEmbedder(), index_type=args.index_type, source=source)
+    if index is None:
+        raise SystemExit(f"❌ {size} parçalık korpus için indeks oluşturulamadı")
+
+
+def bench_rag(args):
+    """
+    RAG yolunu (get_related_chunks, get_answer_from_gemini, akış) Gemini stand-in'leriyle yük altında ölçer.
+
+    Her korpus boyutu için geçici bir indeks sürümü oluşturulur, rag_engine
+    bu sürüme yönlendirilir ve Türkçe/İngilizce sorgu karışımı eşzamanlı
+    gönderilir. Aşama süreleri telemetry izlerinden toplanır.
+    """
+    import os
+    import json
+    import tempfile
+    import subprocess
+
+    import embedding_cache
+    import rag_engine
+    import telemetry
+    from answer_cache import AnswerCache
+    from api_guard import ApiGuard, EMBED_RATE, EMBED_BURST, GENERATE_RATE, GENERATE_BURST
+    from gemini_stub import StubGenai
+    from prompt_cache import GenerationModels
+    from index_store import VersionedIndexStore
+    from sharded_store import ShardedIndexStore
+    from startup import set_genai
+
+    stub = StubGenai(embed_latency=args.embed_latency, generate_latency=args.generate_latency,
+                     token_latency=args.token_latency, tokens=args.tokens, error_rate=args.error_rate,
+                     seed=args.seed, prefill_latency=args.prefill_latency)
+    set_genai(stub)
+    # Önek modu: remote (Gemini önbelleği), local (system_instruction), off (her istekte tam prompt)
+    prompt_cache_backup = (rag_engine.PROMPT_CACHE, rag_engine.generation_models)
+    rag_engine.PROMPT_CACHE = args.prompt_cache != 'off'
+    rag_engine.generation_models = GenerationModels(rag_engine.GENERATION_MODEL,
+                                                    remote=args.prompt_cache == 'remote')
+
+    traces = []
+    telemetry.add_trace_listener(traces.append)
+    workdir = tempfile.mkdtemp(prefix="vex-bench-")
+    # İz satırları stdout yerine dosyaya yazılır.
+    telemetry.TRACE_LOG_PATH = os.path.join(workdir, "traces.jsonl")
+    # Stand-in vektörleri gerçek data/embedding_cache.sqlite'a (Gemini model adıyla) yazılmamalı;
+    # korpus da geçici dizindeki bir önbellekle oluşturulur.
+    cache_backup = embedding_cache._default_cache
+    embedding_cache._default_cache = embedding_cache.EmbeddingCache(os.path.join(workdir, "embedding_cache.sqlite"))
+
+    async def stream_answer(query):
+        async for _ in rag_engine.stream_answer_from_gemini(query):
+            pass
+
+    modes = {
+        'retrieve': (False, telemetry.traced('retrieve')(lambda query: rag_engine.get_related_chunks(query))),
+        'answer': (False, rag_engine.get_answer_from_gemini),
+        'stream': (True, stream_answer),
+    }
+    queries = rag_queries(max(args.requests, 1), tr_ratio=args.tr_ratio, seed=args.seed)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    results = {
+        'commit': commit,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {key: value for key, value in vars(args).items() if key != 'func'},
+        'runs': [],
+    }
+
+    print(f"Stand-in: embed {args.embed_latency * 1000:.0f} ms, üretim {args.generate_latency * 1000:.0f} ms "
+          f"+ {args.tokens} token x {args.token_latency * 1000:.0f} ms, hata oranı {args.error_rate:.0%}, "
+          f"önek: {args.prompt_cache}")
+    print(f"{'parça':>7} {'mod':<9} {'eşzamanlı':>9} {'istek/sn':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'RSS MB':>8} {'hata':>5}")
+    for size in [int(size) for size in args.sizes.split(',')]:
+        directory = os.path.join(workdir, f"corpus_{size}")
+        os.makedirs(directory)
+        latencies_backup = (stub.embed_latency, stub.error_rate)
+        stub.embed_latency, stub.error_rate = 0.0, 0.0
+        build_start = time.perf_counter()
+        _build_rag_corpus(directory, size, args)
+        build_seconds = time.perf_counter() - build_start
+        stub.embed_latency, stub.error_rate = latencies_backup
+
+        rag_engine.index_store = VersionedIndexStore(directory, auto_watch=False)
+        rag_engine.shard_store = ShardedIndexStore(rag_engine.index_store, directory=os.path.join(directory, "shards"),
+                                                   auto_watch=False)
+        rss_before = _rss_mb()
+        warmup = rag_engine.warmup()
+
+        for mode in args.modes.split(','):
+            is_async, request_fn = modes[mode]
+            for concurrency in [int(c) for c in args.concurrency.split(',')]:
+                # Her koşu temiz önbelleklerle ve (istenmediyse) sınırsız hız limitiyle başlar.
+                embedding_cache._default_cache = embedding_cache.EmbeddingCache(
+                    os.path.join(directory, f"embedding_cache_{mode}_{concurrency}.sqlite"))
+                rag_engine.answer_cache = AnswerCache(ttl_seconds=-1 if not args.answer_cache else 3600)
+                rate_limits = args.rate_limits
+                rag_engine.embed_guard = ApiGuard('embed', EMBED_RATE if rate_limits else 0, EMBED_BURST)
+                rag_engine.generate_guard = ApiGuard('generate', GENERATE_RATE if rate_limits else 0, GENERATE_BURST)
+                calls_before = dict(stub.calls)
+                del traces[:]
+
+                run_load = _run_load_async if is_async else _run_load
+                throughput, latencies = run_load(request_fn, queries, concurrency, args.requests)
+
+                stages = {}
+                outcomes = {}
+                tokens = {'prompt': 0, 'cached': 0}
+                first_token = []
+                for trace in list(traces):
+                    outcome = trace.attributes.get('outcome', 'unknown')
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                    for stage in trace.spans:
+                        stages.setdefault(stage.name, []).append(stage.duration or 0.0)
+                        if stage.name == 'generation':
+                            tokens['prompt'] += stage.attributes.get('prompt_tokens', 0)
+                            tokens['cached'] += stage.attributes.get('cached_tokens', 0)
+                            if 'first_token_ms' in stage.attributes:
+                                first_token.append(stage.attributes['first_token_ms'] / 1000)
+                total = _percentiles(latencies)
+                run = {
+                    'corpus_size': size,
+                    'mode': mode,
+                    'concurrency': concurrency,
+                    'requests': len(latencies),
+                    'throughput_rps': round(throughput, 3),
+                    'latency': total,
+                    'stages': {name: _percentiles(values) for name, values in sorted(stages.items())},
+                    'outcomes': outcomes,
+                    'api_calls': {key: stub.calls[key] - calls_before.get(key, 0) for key in stub.calls},
+                    # Faturalanan girdi: önbellekte olmayan token'lar (önbellekliler indirimli ayrıca sayılır)
+                    'generation_tokens': {**tokens, 'uncached': tokens['prompt'] - tokens['cached']},
+                    'first_token': _percentiles(first_token) if first_token else None,
+                    'rss_mb': _rss_mb(),
+                    'rss_before_mb': rss_before,
+                    'peak_rss_mb': _peak_rss_mb(),
+                    'index_build_seconds': round(build_seconds, 3),
+                    'warmup_seconds': {name: round(step['seconds'], 4) for name, step in warmup.items()},
+                }
+                results['runs'].append(run)
+                rss = f"{run['rss_mb']:.0f}" if run['rss_mb'] is not None else "-"
+                print(f"{size:>7} {mode:<9} {concurrency:>9} {throughput:>9.1f} {total['p50_ms']:>9.1f} "
+                      f"{total['p95_ms']:>9.1f} {total['p99_ms']:>9.1f} {rss:>8} {run['api_calls']['errors']:>5}")
+                if args.verbose:
+                    print(f"{'':>17} girdi token: {tokens['prompt']} (önbellekli {tokens['cached']})"
+                          + (f", ilk token p50 {run['first_token']['p50_ms']:.1f} ms" if first_token else ""))
+                    for name, values in run['stages'].items():
+                        print(f"{'':>17} {name:<16} p50 {values['p50_ms']:>8.2f}  p95 {values['p95_ms']:>8.2f}  "
+                              f"p99 {values['p99_ms']:>8.2f}  (n={values['count']})")
+
+    telemetry.remove_trace_listener(traces.append)
+    rag_engine.PROMPT_CACHE, rag_engine.generation_models = prompt_cache_backup
+    embedding_cache._default_cache = cache_backup
+    set_genai(None)
+
+    output = args.output or os.path.join(workdir, "results.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"📁 Sonuçlar: {output}")
+    if args.baseline:
+        compare_rag_results(args.baseline, results)
+
+
+def compare_rag_results(baseline_path, results):
+    """Önceki bir sonuç dosyasıyla (ör. başka bir commit) istek/sn ve p95 farklarını yazdırır."""
+    import json
+
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(run['corpus_size'], run['mode'], run['concurrency']): run for run in baseline['runs']}
+    print(f"\nKarşılaştırma: {baseline.get('commit') or baseline_path} -> {results.get('commit') or 'şimdiki'}")
+    print(f"{'parça':>7} {'mod':<9} {'eşzamanlı':>9} {'istek/sn':>18} {'p95 ms':>20}")
+    for run in results['runs']:
+        old = previous.get((run['corpus_size'], run['mode'], run['concurrency']))
+        if old is None:
+            continue
+        throughput_change = (run['throughput_rps'] / old['throughput_rps'] - 1) * 100 if old['throughput_rps'] else 0.0
+        p95_change = (run['latency']['p95_ms'] / old['latency']['p95_ms'] - 1) * 100 if old['latency']['p95_ms'] else 0.0
+        print(f"{run['corpus_size']:>7} {run['mode']:<9} {run['concurrency']:>9} "
+              f"{run['throughput_rps']:>9.1f} ({throughput_change:+5.1f}%) {run['latency']['p95_ms']:>10.1f} "
+              f"({p95_change:+5.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VEX chatbot çevrimdışı benchmark'ları")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    embedding_parser = subparsers.add_parser("embedding", help="Embedding pipeline verimi")
+    embedding_parser.add_argument("--chunks", type=int, default=500)
+    embedding_parser.add_argument("--latency", type=float, default=0.02, help="Parti başına simüle gecikme (sn)")
+    embedding_parser.add_argument("--batch-size", type=int, default=100)
+    embedding_parser.add_argument("--workers", type=int, default=4)
+    embedding_parser.add_argument("--seed", type=int, default=0)
+    embedding_parser.add_argument("--skip-baseline", action="store_true")
+    embedding_parser.set_defaults(func=bench_embedding)
+
+    keywords_parser = subparsers.add_parser("keywords", help="Anahtar kelime filtresi mikro benchmark'ı")
+    keywords_parser.add_argument("--chunks", type=int, default=30)
+    keywords_parser.add_argument("--repeat", type=int, default=200)
+    keywords_parser.add_argument("--seed", type=int, default=0)
+    keywords_parser.set_defaults(func=bench_keywords)
+
+    index_parser = subparsers.add_parser("index", help="İndeks tipleri: recall@k, gecikme ve bellek")
+    index_parser.add_argument("--vectors", type=int, default=10000, help="Sentetik vektör sayısı")
+    index_parser.add_argument("--dim", type=int, default=768)
+    index_parser.add_argument("--queries", type=int, default=200)
+    index_parser.add_argument("--k", type=int, default=10)
+    index_parser.add_argument("--types", default="flat_ip,ivf_flat,ivf_sq8,ivf_pq,hnsw,sq8")
+    index_parser.add_argument("--index-dir", help="Aktif sürümün vektörlerini kullan (ör. data)")
+    index_parser.add_argument("--chunks-file", help="Parça dosyasını yerel embedder ile vektörleştir")
+    index_parser.add_argument("--seed", type=int, default=0)
+    index_parser.set_defaults(func=bench_index)
+
+    search_parser = subparsers.add_parser("search", help="Eşzamanlı sorgularda mikro-partili FAISS araması")
+    search_parser.add_argument("--vectors", type=int, default=20000, help="Sentetik vektör sayısı")
+    search_parser.add_argument("--dim", type=int, default=768)
+    search_parser.add_argument("--queries", type=int, default=500, help="Farklı sorgu vektörü sayısı")
+    search_parser.add_argument("--requests", type=int, default=2000, help="Eşzamanlılık düzeyi başına istek sayısı")
+    search_parser.add_argument("--concurrency", default="1,8,32")
+    search_parser.add_argument("--k", type=int, default=30)
+    search_parser.add_argument("--index-type", default="flat_ip")
+    search_parser.add_argument("--window-ms", type=float, default=1.0)
+    search_parser.add_argument("--max-batch", type=int, default=32)
+    search_parser.add_argument("--index-dir", help="Aktif sürümün vektörlerini kullan (ör. data)")
+    search_parser.add_argument("--chunks-file", help="Parça dosyasını yerel embedder ile vektörleştir")
+    search_parser.add_argument("--seed", type=int, default=0)
+    search_parser.set_defaults(func=bench_search)
+
+    rag_parser = subparsers.add_parser("rag", help="RAG yolu yük testi (Gemini stand-in'leriyle)")
+    rag_parser.add_argument("--sizes", default="200,2000,20000", help="Korpus boyutları (parça)")
+    rag_parser.add_argument("--chunks-file", help="Sentetik yerine bu parça dosyasını kullan (gerekirse tekrarlanır)")
+    rag_parser.add_argument("--modes", default="retrieve,answer,stream", help="retrieve, answer, stream")
+    rag_parser.add_argument("--concurrency", default="1,8")
+    rag_parser.add_argument("--requests", type=int, default=200, help="Koşu başına istek sayısı")
+    rag_parser.add_argument("--tr-ratio", type=float, default=0.5, help="Türkçe sorgu oranı")
+    rag_parser.add_argument("--embed-latency", type=float, default=0.05, help="Embedding çağrısı gecikmesi (sn)")
+    rag_parser.add_argument("--generate-latency", type=float, default=0.4, help="İlk token gecikmesi (sn)")
+    rag_parser.add_argument("--token-latency", type=float, default=0.005, help="Token başına akış gecikmesi (sn)")
+    rag_parser.add_argument("--tokens", type=int, default=80, help="Cevap başına token")
+    rag_parser.add_argument("--prefill-latency", type=float, default=0.0,
+                            help="Önbellekte olmayan 1000 girdi token'ı başına ilk token gecikmesi (sn)")
+    rag_parser.add_argument("--prompt-cache", choices=("remote", "local", "off"), default="remote",
+                            help="Sabit önek: Gemini önbelleği, system_instruction ya da her istekte tam prompt")
+    rag_parser.add_argument("--error-rate", type=float, default=0.0, help="API hata oranı (0-1)")
+    rag_parser.add_argument("--rate-limits", action="store_true", help="VEX_*_RATE hız limitlerini uygula")
+    rag_parser.add_argument("--answer-cache", action="store_true", help="Cevap önbelleğini açık bırak")
+    rag_parser.add_argument("--index-type", default="flat_ip")
+    rag_parser.add_argument("--output", help="Sonuç JSON dosyası (varsayılan: geçici dizin)")
+    rag_parser.add_argument("--baseline", help="Karşılaştırılacak önceki sonuç JSON dosyası")
+    rag_parser.add_argument("--verbose", action="store_true", help="Aşama bazında p50/p95/p99 yazdır")
+    rag_parser.add_argument("--seed", type=int, default=0)
+    rag_parser.set_defaults(func=bench_rag)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,64 @@
-import gradio as gr
-from rag_engine import get_answer_from_gemini
+import time
+from startup import timed_import, health
+from telemetry import start_metrics_server, set_health_check
 
-# Sohbet geçmişini tutmak için global bir liste
-history = []
+# Import süreleri açılış raporunda görünür.
+gr = timed_import('gradio')
+timed_import('rag_engine')
+from rag_engine import stream_answer_from_gemini, get_index_status, warmup
+from session_store import SessionStore
 
-def respond(message, chat_history):
+# Aynı anda işlenecek en fazla sohbet isteği. Handler asenkron olduğu için
+# bekleyen API çağrıları iş parçacığı tutmaz.
+MAX_CONCURRENT_CHATS = 64
+
+# Tarayıcı oturumu başına sınırlı sohbet belleği (son turlar + son parçalar)
+sessions = SessionStore()
+
+async def respond(message, chat_history, request: gr.Request):
     """
-    Kullanıcı mesajına RAG motorunu kullanarak cevap verir.
+    Kullanıcı mesajına RAG motorunu kullanarak akışlı cevap verir.
+
+    Geçmiş, Gradio oturumuna (session_hash) bağlı SessionStore'dan gelir;
+    tarayıcıdaki sohbet listesi yalnızca görüntü içindir.
     
     Args:
         message (str): Kullanıcının mesajı.
         chat_history (list): Gradio'nun sohbet geçmişi listesi.
+        request (gr.Request): Oturum anahtarı için Gradio isteği.
         
-    Returns:
-        tuple: Güncellenmiş sohbet geçmişi ve boş bir mesaj kutusu.
+    Yields:
+        tuple: Boş bir mesaj kutusu ve cevap geldikçe güncellenen sohbet geçmişi.
     """
+    chat_history = chat_history or []
+    chat_history.append((message, ""))
+    session = sessions.get(request.session_hash)
+    bot_response = ""
     try:
-        # RAG motorundan cevap alıyoruz.
-        bot_response = get_answer_from_gemini(message)
-        
-        # Gradio sohbet geçmişine ekliyoruz.
-        chat_history.append((message, bot_response))
-        
-        # Güncellenmiş sohbet geçmişini ve boş bir giriş kutusu döndürüyoruz.
-        return "", chat_history
+        # RAG motorundan cevabı token token alıp sohbet geçmişine yansıtıyoruz.
+        async for text in stream_answer_from_gemini(message, session=session):
+            bot_response += text
+            chat_history[-1] = (message, bot_response)
+            yield "", chat_history
     except Exception as e:
         error_message = f"Üzgünüm, cevap oluşturulurken bir hata oluştu: {e}"
-        chat_history.append((message, error_message))
-        return "", chat_history
+        chat_history[-1] = (message, bot_response + error_message)
+        yield "", chat_history
+        return
+    session.add_turn(message, bot_response)
+
+def clear_session(request: gr.Request):
+    """Sohbet ekranını ve oturumun sunucudaki geçmişini temizler."""
+    sessions.clear(request.session_hash)
+    return None
+
+def format_index_status():
+    """Aktif indeks sürümünü arayüzde göstermek için biçimlendirir."""
+    status = get_index_status()
+    if status['version'] is None:
+        return "📚 İndeks henüz yüklenmedi."
+    loaded = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['loaded_at']))
+    return f"📚 İndeks sürümü: {status['version']} · {status['num_chunks']} parça · yüklenme: {loaded}"
 
 # Gradio arayüzünü oluşturma
 with gr.Blocks(theme=gr.themes.Monochrome()) as demo:
@@ -48,8 +79,18 @@ with gr.Blocks(theme=gr.themes.Monochrome()) as demo:
     msg.submit(respond, inputs=[msg, chatbot], outputs=[msg, chatbot])
     
     # Sohbeti temizleme butonu
-    clear_btn.click(lambda: None, None, chatbot, queue=False)
+    clear_btn.click(clear_session, None, chatbot, queue=False)
+
+    # Aktif indeks sürümü; yeni sürüm sayfa yenilendiğinde görünür
+    index_status = gr.Markdown()
+    demo.load(format_index_status, None, index_status)
 
 # Uygulamayı başlatma
 if __name__ == "__main__":
-    demo.launch()
\ No newline at end of file
+    # VEX_METRICS_PORT ayarlıysa /metrics ve /healthz uç noktaları ayrı bir portta sunulur;
+    # /healthz ısınma bitene kadar 503 döner.
+    set_health_check(health)
+    start_metrics_server()
+    # İlk kullanıcı indeks yükleme ve istemci açma maliyetini ödemesin.
+    warmup()
+    demo.queue(default_concurrency_limit=MAX_CONCURRENT_CHATS).launch()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+# Paketlenmiş parça dosyası düzeni (little-endian):
+#   başlık       : sihirli bayt dizisi (8 bayt) + parça sayısı N (uint64)
+#   ids          : int64[N]   satır sırasıyla parça ID'leri
+#   sorted_ids   : int64[N]   artan sırada ID'ler (ID -> satır araması için)
+#   sorted_rows  : int64[N]   sorted_ids'teki her ID'nin satır numarası
+#   offsets      : uint64[N+1] her kaydın payload içindeki başlangıcı
+#   payload      : art arda UTF-8 JSON kayıtları
+# Dosya salt okunur mmap ile açılır; diziler kopyalanmadan okunur ve aynı
+# makinedeki tüm süreçler işletim sisteminin tek sayfa önbelleğini paylaşır.
+PACKED_MAGIC = b'VXCHUNK1'
+_HEADER = struct.Struct('<8sQ')
+
+
+def write_packed_chunks(path, chunks):
+    """
+    Parçaları paketlenmiş ikili formatta yazar.
+
+    Args:
+        path (str): Hedef dosya yolu.
+        chunks (list): 'id' alanı atanmış parça sözlükleri.
+    """
+    records = [json.dumps(chunk, ensure_ascii=False, separators=(',', ':')).encode('utf-8') for chunk in chunks]
+    ids = np.array([chunk['id'] for chunk in chunks], dtype='<i8')
+    sorted_rows = np.argsort(ids, kind='stable').astype('<i8')
+    sorted_ids = ids[sorted_rows]
+    offsets = np.zeros(len(records) + 1, dtype='<u8')
+    if records:
+        offsets[1:] = np.cumsum([len(record) for record in records])
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(PACKED_MAGIC, len(records)))
+        f.write(ids.tobytes())
+        f.write(sorted_ids.tobytes())
+        f.write(sorted_rows.tobytes())
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+
+
+def write_jsonl_chunks(path, chunks):
+    """
+    Parçaları satır başına bir JSON kaydı olarak akış halinde yazar.
+
+    Parçalar bir üreteçten gelebilir; bellekte liste tutulmaz. Dosya önce
+    geçici bir ada yazılır ve bitince tek adımda yerine taşınır, böylece
+    yarıda kalan bir işleme eski dosyayı bozmaz.
+
+    Args:
+        path (str): Hedef .jsonl dosyası.
+        chunks (iterable): Parça sözlükleri.
+
+    Returns:
+        int: Yazılan parça sayısı.
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    count = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False))
+                f.write('\n')
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count
+
+
+def iter_jsonl_chunks(path):
+    """write_jsonl_chunks ile yazılmış dosyadaki parçaları sırayla döndürür."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PackedChunkStore:
+    """
+    Paketlenmiş parça dosyası üzerinde salt okunur, tembel erişim.
+
+    Liste gibi davranır (`len`, indeksleme, iterasyon) ancak bir parça
+    yalnızca istendiğinde çözülür. FAISS'ten gelen ID'ler `row_for_id` ile
+    ikili aramayla satıra çevrilir.
+
+    Args:
+        path (str): write_packed_chunks ile yazılmış dosya.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != PACKED_MAGIC:
+            raise ValueError(f"'{path}' paketlenmiş parça dosyası değil")
+        self._count = count
+
+        position = _HEADER.size
+        self.ids = np.frombuffer(self._mmap, dtype='<i8', count=count, offset=position)
+        position += 8 * count
+        self._sorted_ids = np.frombuffer(self._mmap, dtype='<i8', count=count, offset=position)
+        position += 8 * count
+        self._sorted_rows = np.frombuffer(self._mmap, dtype='<i8', count=count, offset=position)
+        position += 8 * count
+        self._offsets = np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=position)
+        position += 8 * (count + 1)
+        self._payload_start = position
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, row):
+        start = self._payload_start + int(self._offsets[row])
+        end = self._payload_start + int(self._offsets[row + 1])
+        return json.loads(self._mmap[start:end])
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self._record(i) for i in range(*row.indices(self._count))]
+        row = int(row)
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError("parça satırı aralık dışında")
+        return self._record(row)
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self._record(row)
+
+    def row_for_id(self, chunk_id):
+        """Parça ID'sinin satır numarasını döndürür, yoksa None."""
+        position = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if position < self._count and self._sorted_ids[position] == chunk_id:
+            return int(self._sorted_rows[position])
+        return None
+
+    def get_by_id(self, chunk_id):
+        """Parça ID'sine ait parçayı döndürür, yoksa None."""
+        row = self.row_for_id(chunk_id)
+        return None if row is None else self._record(row)
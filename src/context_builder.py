@@ -0,0 +1,250 @@
+import os
+import re
+
+from lexical_index import tokenize
+from telemetry import approx_tokens
+from retrieval import normalize_rule_id
+
+# Prompt'un toplam token bütçesi (sistem talimatı + geçmiş + kaynaklar + soru).
+PROMPT_TOKEN_BUDGET = int(os.getenv("VEX_PROMPT_TOKEN_BUDGET", "3000"))
+# Bütçenin en fazla bu oranı sohbet geçmişine ayrılır; kalan kaynak metinlerindir.
+HISTORY_BUDGET_SHARE = float(os.getenv("VEX_HISTORY_BUDGET_SHARE", "0.25"))
+# Son bu kadar tur aynen, daha eskileri tek satırlık özet olarak eklenir.
+HISTORY_RECENT_TURNS = int(os.getenv("VEX_HISTORY_RECENT_TURNS", "3"))
+# Terim kümelerinin Jaccard benzerliği bu eşiği geçen parçalar tekrar sayılır.
+CHUNK_DEDUPE_SIMILARITY = float(os.getenv("VEX_CHUNK_DEDUPE_SIMILARITY", "0.8"))
+# Bundan az yer kalan parçalar eklenmez; yarım cümlelik kaynak modeli yanıltır.
+MIN_CHUNK_TOKENS = 40
+
+# Özet satırlarında soru/cevap için tutulan en fazla karakter
+SUMMARY_QUESTION_CHARS = 120
+SUMMARY_ANSWER_CHARS = 160
+
+# Cümle sonu: nokta/ünlem/soru işaretinden sonra boşluk ya da satır sonu.
+# Sayılardaki ondalık noktalar ("2.5 inch") bölünmez.
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def split_sentences(text):
+    """Metni boş olmayan cümlelere ayırır."""
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def _truncate(text, max_chars):
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + " …"
+
+
+def dedupe_chunks(chunks, threshold=CHUNK_DEDUPE_SIMILARITY):
+    """
+    Aynı kuralın tekrarlarını ve neredeyse aynı içerikli parçaları eler.
+
+    Parçalar sıralı kabul edilir; bir kopya grubundan yalnızca ilk (en
+    alakalı) parça kalır. Bir parçanın terimleri daha önce seçilmiş bir
+    parçanın içinde büyük ölçüde geçiyorsa (kısmi örtüşme) o da elenir.
+
+    Args:
+        chunks (list): Alakaya göre sıralı parçalar.
+        threshold (float): Jaccard / kapsama benzerlik eşiği.
+
+    Returns:
+        tuple: (seçilen parçalar, elenen parça sayısı)
+    """
+    kept = []
+    kept_terms = []
+    seen_rules = set()
+    for chunk in chunks:
+        rule_key = (chunk.get('shard'), chunk.get('rule_id'), chunk.get('page_number'))
+        if rule_key in seen_rules:
+            continue
+        terms = set(tokenize(chunk['content']))
+        duplicate = False
+        for other in kept_terms:
+            overlap = len(terms & other)
+            if not terms or not other:
+                continue
+            if overlap / len(terms | other) >= threshold or overlap / len(terms) >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        seen_rules.add(rule_key)
+        kept.append(chunk)
+        kept_terms.append(terms)
+    return kept, len(chunks) - len(kept)
+
+
+def trim_to_relevant(content, query_terms, max_tokens):
+    """
+    Parçayı token sınırına sığacak şekilde sorguyla ilgili cümlelere indirir.
+
+    İlk cümle (kuralın kendisi) her zaman tutulur; kalan yer sorgu
+    terimlerini en çok içeren cümlelere verilir. Cümleler orijinal sırasıyla
+    birleştirilir, atlanan bölümler "…" ile gösterilir.
+
+    Args:
+        content (str): Parça metni.
+        query_terms (set): Normalize edilmiş sorgu terimleri.
+        max_tokens (int): Parçaya ayrılan en fazla token.
+
+    Returns:
+        tuple: (metin, kırpıldı mı)
+    """
+    if approx_tokens(content) <= max_tokens:
+        return content, False
+
+    sentences = split_sentences(content)
+    costs = [approx_tokens(sentence) + 1 for sentence in sentences]
+    scores = [len(query_terms.intersection(tokenize(sentence))) for sentence in sentences]
+
+    selected = set()
+    used = 0
+    # Önce ilk cümle, sonra puana (eşitlikte sıraya) göre diğerleri
+    order = [0] + sorted(range(1, len(sentences)), key=lambda i: (-scores[i], i))
+    for i in order:
+        if used + costs[i] > max_tokens:
+            continue
+        if i > 0 and scores[i] == 0 and selected:
+            break
+        selected.add(i)
+        used += costs[i]
+
+    if not selected:
+        # Tek cümle bile sığmıyorsa metin karakter sınırından kesilir.
+        return _truncate(content, max_tokens * 4), True
+
+    parts = []
+    previous = -1
+    for i in sorted(selected):
+        if i != previous + 1:
+            parts.append("…")
+        parts.append(sentences[i])
+        previous = i
+    if previous != len(sentences) - 1:
+        parts.append("…")
+    return " ".join(parts), True
+
+
+def window_history(history, max_tokens, recent_turns=HISTORY_RECENT_TURNS):
+    """
+    Sohbet geçmişini token sınırına sığdırır.
+
+    Son `recent_turns` tur aynen, daha eskileri tek satırlık özet olarak
+    eklenir. Sınır aşılırsa önce en eski özetler, sonra en eski tam turlar
+    çıkarılır.
+
+    Args:
+        history (list): {'user': str, 'model': str} turları, eskiden yeniye.
+        max_tokens (int): Geçmişe ayrılan en fazla token.
+        recent_turns (int): Aynen tutulacak son tur sayısı.
+
+    Returns:
+        tuple: (geçmiş metni, aynen eklenen tur sayısı, özetlenen tur sayısı)
+    """
+    if not history or max_tokens <= 0:
+        return "", 0, 0
+
+    split = max(0, len(history) - recent_turns)
+    summaries = [
+        f"- Kullanıcı: {_truncate(turn['user'], SUMMARY_QUESTION_CHARS)} → "
+        f"Asistan: {_truncate(split_sentences(turn['model'])[0] if turn['model'].strip() else '', SUMMARY_ANSWER_CHARS)}\n"
+        for turn in history[:split]
+    ]
+    recent = [f"\nKullanıcı: {turn['user']}\nAsistan: {turn['model']}\n" for turn in history[split:]]
+
+    header = "\n\nÖNCEKİ KONUŞMA ÖZETİ:\n"
+    total = sum(approx_tokens(text) for text in summaries) + sum(approx_tokens(text) for text in recent)
+    if summaries:
+        total += approx_tokens(header)
+    while summaries and total > max_tokens:
+        total -= approx_tokens(summaries.pop(0))
+        if not summaries:
+            total -= approx_tokens(header)
+    while recent and total > max_tokens:
+        total -= approx_tokens(recent.pop(0))
+
+    parts = []
+    if summaries:
+        parts.append(header)
+        parts.extend(summaries)
+    parts.extend(recent)
+    return "".join(parts), len(recent), len(summaries)
+
+
+def assemble_prompt(system_prompt, query, chunks, history=None, query_terms=None,
+                    token_budget=PROMPT_TOKEN_BUDGET, cached_rules=None):
+    """
+    Sistem talimatı, geçmiş ve kaynak parçalardan bütçeye sığan prompt'u kurar.
+
+    Sistem talimatı ve soru her zaman eklenir. Kalan bütçenin en fazla
+    HISTORY_BUDGET_SHARE kadarı geçmişe, gerisi tekrarları elenmiş
+    parçalara verilir. Her parça kalan bütçenin kalan parça sayısına
+    bölümü kadar yer alır; kısa parçaların bıraktığı yer sonrakilere geçer.
+
+    Args:
+        system_prompt (str): Sabit sistem talimatı.
+        query (str): Kullanıcı sorgusu.
+        chunks (list): Alakaya göre sıralı parçalar.
+        history (list): Sohbet geçmişi (opsiyonel).
+        query_terms (iterable): Cümle seçimi için terimler; verilmezse sorgudan çıkarılır.
+        token_budget (int): Toplam token bütçesi.
+        cached_rules (set): Tam metni önbellekli önekte bulunan (bölüm, kural ID'si)
+            çiftleri; bu kuralların parçaları tekrar eklenmez, yalnızca adlarıyla anılır.
+
+    Returns:
+        tuple: (prompt, kullanım bilgisi sözlüğü)
+    """
+    query_terms = set(query_terms) if query_terms is not None else set(tokenize(query))
+    question = f"\n\nKullanıcı: {query}\nAsistan:"
+    available = token_budget - approx_tokens(system_prompt) - approx_tokens(question)
+
+    history_text, history_turns, summarized_turns = window_history(
+        history, int(max(available, 0) * HISTORY_BUDGET_SHARE))
+    available -= approx_tokens(history_text)
+
+    cached_names = []
+    if cached_rules:
+        remaining = []
+        for chunk in chunks:
+            if (chunk.get('shard'), normalize_rule_id(chunk.get('rule_id', ''))) in cached_rules:
+                if chunk['rule_id'] not in cached_names:
+                    cached_names.append(chunk['rule_id'])
+            else:
+                remaining.append(chunk)
+        chunks = remaining
+
+    unique_chunks, deduped = dedupe_chunks(chunks)
+    context_header = "\n\nKAYNAK METİNLER:\n"
+    if cached_names:
+        context_header += f"(Ayrıca yukarıdaki sık sorulan kurallar: {', '.join(cached_names)})\n"
+    available -= approx_tokens(context_header)
+
+    sources = []
+    trimmed = 0
+    for position, chunk in enumerate(unique_chunks):
+        source = f" ({chunk['shard']})" if chunk.get('shard') else ""
+        heading = f"--- Sayfa {chunk['page_number']}, Kural {chunk['rule_id']}{source}:\n"
+        share = available // (len(unique_chunks) - position) - approx_tokens(heading) - 1
+        if share < MIN_CHUNK_TOKENS:
+            break
+        content, was_trimmed = trim_to_relevant(chunk['content'], query_terms, share)
+        trimmed += was_trimmed
+        entry = f"{heading}{content}\n\n"
+        sources.append(entry)
+        available -= approx_tokens(entry)
+
+    prompt = "".join([system_prompt, history_text, context_header, *sources, question])
+    usage = {
+        'tokens': approx_tokens(prompt),
+        'budget': token_budget,
+        'chunks': len(sources),
+        'chunks_deduped': deduped,
+        'chunks_trimmed': trimmed,
+        'chunks_dropped': len(unique_chunks) - len(sources),
+        'chunks_cached': len(cached_names),
+        'history_turns': history_turns,
+        'history_summarized': summarized_turns,
+    }
+    return prompt, usage
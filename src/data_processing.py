@@ -1,70 +1,202 @@
 import fitz  # PyMuPDF'un diğer adı
+import os
 import re
-import json
+import errno
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-def parse_game_manual(pdf_path):
+from chunk_store import write_jsonl_chunks
+
+# Tüm kural ID'lerini yakalamak için daha genel bir regex deseni.
+# Örnek: <SC1>, <GG1>, <VUR1>, <VAISC1> gibi kalıpları bulur.
+RULE_PATTERN = re.compile(r'<\s*([A-Z]{1,5}\d+)\s*>')
+
+# Paralel modda bir işçiye tek seferde verilen sayfa sayısı
+PAGES_PER_TASK = 8
+# Bir kuralın devamı en fazla bu kadar sonraki sayfadan eklenir; son kuraldan
+# sonra gelen ekler/dizin sayfaları kurala yapışmaz.
+STITCH_MAX_PAGES = 2
+
+# Varsayılan çıktı: satır başına bir parça (JSONL)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+chunks_jsonl_path = os.path.join(script_dir, "..", "data", "processed_chunks.jsonl")
+
+
+def _extract_page_range(task):
+    """
+    Bir sayfa aralığının metnini çıkarır (işçi süreçte çalışır).
+
+    fitz belgeleri süreçler arasında taşınamadığı için her işçi PDF'i
+    kendisi açar.
+
+    Args:
+        task (tuple): (pdf_path, başlangıç, bitiş) - bitiş hariç, 0 tabanlı.
+
+    Returns:
+        list: (sayfa numarası, metin) çiftleri; sayfa numaraları 1'den başlar.
+    """
+    pdf_path, start, end = task
+    with fitz.open(pdf_path) as document:
+        return [(page_num + 1, document.load_page(page_num).get_text("text")) for page_num in range(start, end)]
+
+
+def iter_page_texts(pdf_path, workers=1, pages_per_task=PAGES_PER_TASK):
+    """
+    PDF sayfalarının metnini sayfa sırasıyla döndürür.
+
+    `workers` 1'den büyükse sayfa aralıkları bir süreç havuzunda paralel
+    çıkarılır. Aynı anda en fazla `workers * 2` aralık işlemde tutulur;
+    büyük kılavuzlarda bellek kullanımı sayfa sayısıyla büyümez.
+
+    Args:
+        pdf_path (str): Oyun kılavuzunun PDF dosya yolu.
+        workers (int): İşçi süreç sayısı.
+        pages_per_task (int): Bir işçiye verilen sayfa sayısı.
+
+    Yields:
+        tuple: (sayfa numarası, metin)
+    """
+    # PyMuPDF'un kendi FileNotFoundError'ı yerleşik olandan türemez.
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), pdf_path)
+    with fitz.open(pdf_path) as document:
+        page_count = len(document)
+
+    tasks = [(pdf_path, start, min(start + pages_per_task, page_count))
+             for start in range(0, page_count, pages_per_task)]
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield from _extract_page_range(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            pending.append(executor.submit(_extract_page_range, task))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(executor.submit(_extract_page_range, next_task))
+            yield from pages
+
+
+def iter_rule_chunks(page_texts):
+    """
+    Sayfa metinlerini kural ID'lerine göre parçalara ayırır.
+
+    Bir sayfanın ilk kural ID'sinden önceki metni, önceki sayfada başlayan
+    kuralın devamıdır ve o kurala eklenir; sayfa sonunda bölünen kurallar
+    tek parça olarak döner. Bir kural, bir sonraki kural ID'si görülünce
+    tamamlanmış sayılır ve hemen döndürülür.
+
+    Args:
+        page_texts (iterable): Sayfa sırasıyla (sayfa numarası, metin) çiftleri.
+
+    Yields:
+        dict: {'page_number': int, 'rule_id': str, 'content': str}; sayfa
+              numarası kuralın başladığı sayfadır.
+    """
+    current = None
+
+    def finish(rule):
+        content = "\n".join(part for part in rule['parts'] if part)
+        if content:
+            return {'page_number': rule['page_number'], 'rule_id': rule['rule_id'], 'content': content}
+        return None
+
+    for page_number, text in page_texts:
+        # Kural ID'lerini ayraç olarak kullanıyoruz.
+        chunks = RULE_PATTERN.split(text)
+
+        # İlk parça önceki sayfadaki kuralın devamı olabilir.
+        lead = chunks[0].strip()
+        if current is not None and lead and page_number - current['page_number'] <= STITCH_MAX_PAGES:
+            current['parts'].append(lead)
+
+        for i in range(1, len(chunks), 2):
+            if current is not None:
+                chunk = finish(current)
+                if chunk:
+                    yield chunk
+            current = {
+                'page_number': page_number,
+                'rule_id': f'<{chunks[i]}>',
+                'parts': [chunks[i + 1].strip()],
+            }
+
+    if current is not None:
+        chunk = finish(current)
+        if chunk:
+            yield chunk
+
+
+def iter_game_manual(pdf_path, workers=1):
+    """
+    VEX Game Manual'u akış halinde parçalara ayırır; parçalar sayfalar
+    okundukça döner.
+
+    Args:
+        pdf_path (str): Oyun kılavuzunun PDF dosya yolu.
+        workers (int): Sayfa çıkarımı için işçi süreç sayısı.
+    """
+    return iter_rule_chunks(iter_page_texts(pdf_path, workers=workers))
+
+
+def parse_game_manual(pdf_path, workers=1):
     """
     VEX Game Manual'u okur, metinleri çıkarır ve kural ID'lerine göre parçalara ayırır.
-    
+
     Args:
         pdf_path (str): Oyun kılavuzunun PDF dosya yolu.
-        
+        workers (int): Sayfa çıkarımı için işçi süreç sayısı.
+
     Returns:
         list: Her bir elemanı {'page_number': int, 'rule_id': str, 'content': str}
               formatında olan bir sözlük listesi.
     """
-    
-    document = fitz.open(pdf_path)
-    parsed_chunks = []
-    
-    # Tüm kural ID'lerini yakalamak için daha genel bir regex deseni.
-    # Örnek: <SC1>, <GG1>, <VUR1>, <VAISC1> gibi kalıpları bulur.
-    rule_pattern = re.compile(r'<\s*([A-Z]{1,5}\d+)\s*>')
-    
-    for page_num in range(len(document)):
-        page = document.load_page(page_num)
-        text = page.get_text("text")
-        
-        # Kural ID'lerini ayraç olarak kullanıyoruz.
-        chunks = rule_pattern.split(text)
-        
-        # İlk parça genellikle sayfa başlığı veya kural öncesi metindir.
-        # Eğer bir kural ID'si bulunmuşsa, döngüyü başlatıyoruz.
-        if len(chunks) > 1:
-            for i in range(1, len(chunks), 2):
-                rule_id = chunks[i]
-                content = chunks[i+1].strip()
-                
-                # İçeriğin boş olup olmadığını kontrol et.
-                if content:
-                    chunk = {
-                        'page_number': page_num + 1,  # Sayfa numaraları 1'den başlar
-                        'rule_id': f'<{rule_id}>',
-                        'content': content
-                    }
-                    parsed_chunks.append(chunk)
-                    
-    return parsed_chunks
+    return list(iter_game_manual(pdf_path, workers=workers))
+
+
+def ingest_manuals(pdf_paths, output_path=chunks_jsonl_path, workers=1):
+    """
+    Bir veya birden fazla kılavuzu ayrıştırır ve parçaları doğrudan JSONL
+    parça dosyasına yazar; parçalar bellekte biriktirilmez.
+
+    Args:
+        pdf_paths (list): PDF dosya yolları; parçalar bu sırayla yazılır.
+        output_path (str): Hedef .jsonl dosyası.
+        workers (int): Sayfa çıkarımı için işçi süreç sayısı.
+
+    Returns:
+        int: Yazılan parça sayısı.
+    """
+    def chunks():
+        for pdf_path in pdf_paths:
+            yield from iter_game_manual(pdf_path, workers=workers)
+
+    return write_jsonl_chunks(output_path, chunks())
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Oyun kılavuzlarını kural parçalarına ayırır.")
     # Proje kök dizininden çalıştırıldığını varsayalım.
-    pdf_path = "data/game_manual.pdf"
-    
+    parser.add_argument("pdf_paths", nargs="*", default=["data/game_manual.pdf"])
+    parser.add_argument("--output", default=chunks_jsonl_path, help="Parçaların yazılacağı .jsonl dosyası")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Sayfa çıkarımı için işçi süreç sayısı (1 = sıralı)")
+    args = parser.parse_args()
+
     try:
-        chunks = parse_game_manual(pdf_path)
-        print(f"Toplam {len(chunks)} parça ayrıştırıldı.")
-        if chunks:
-            print("İlk 3 parça:")
-            for chunk in chunks[:3]:
-                print(f"Sayfa: {chunk['page_number']}, Kural: {chunk['rule_id']}")
-                print("-" * 20)
-                
-        # İsteğe bağlı: Ayrıştırılmış parçaları bir JSON dosyasına kaydetmek
-        # with open("data/processed_chunks.json", "w", encoding="utf-8") as f:
-        #     json.dump(chunks, f, ensure_ascii=False, indent=4)
-        # print("\nAyrıştırılmış parçalar 'data/processed_chunks.json' dosyasına kaydedildi.")
-
-    except FileNotFoundError:
-        print(f"Hata: '{pdf_path}' dosyası bulunamadı. Lütfen dosyanın 'data' dizini altında olduğundan emin olun.")
+        count = ingest_manuals(args.pdf_paths, args.output, workers=args.workers)
+        print(f"Toplam {count} parça ayrıştırıldı ve '{args.output}' dosyasına yazıldı.")
+
+    except FileNotFoundError as e:
+        print(f"Hata: '{e.filename}' dosyası bulunamadı. Lütfen dosyanın 'data' dizini altında olduğundan emin olun.")
     except Exception as e:
-        print(f"Bir hata oluştu: {e}")
\ No newline at end of file
+        print(f"Bir hata oluştu: {e}")
@@ -1,80 +1,462 @@
-import google.generativeai as genai
-import faiss
 import numpy as np
 import os
 import json
+import re
+import time
+import random
+import hashlib
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from embedding_cache import get_embedding_cache
+from rule_hierarchy import RuleHierarchy
+from startup import get_genai
+from chunk_store import iter_jsonl_chunks
+from index_factory import INDEX_TYPE, build_index, prepare_vectors, resolve_index_type, supports_remove
+from index_store import (data_dir, read_manifest, write_index_version, load_index_version,
+                         assign_chunk_ids, diff_chunks, to_id_mapped)
 
 # Proje ana dizininden çalıştırıldığını varsayalım.
 script_dir = os.path.dirname(os.path.abspath(__file__))
 chunks_path = os.path.join(script_dir, "..", "data", "processed_chunks.json")
-faiss_index_path = os.path.join(script_dir, "..", "data", "faiss_index.bin")
+# data_processing.py'nin akış halinde yazdığı parça dosyası
+chunks_jsonl_path = os.path.join(script_dir, "..", "data", "processed_chunks.jsonl")
+
+EMBEDDING_MODEL = 'models/text-embedding-004'
+EMBEDDING_DIMENSION = 768
+
+# Toplu embedding ayarları.
+# batchEmbedContents tek istekte en fazla 100 metin kabul ediyor.
+EMBED_BATCH_SIZE = 100
+EMBED_MAX_WORKERS = 4
+EMBED_MAX_RETRIES = 5
+EMBED_RETRY_BASE_DELAY = 1.0
+
+
+class EmbeddingError(Exception):
+    """Bir metin partisi tüm denemelere rağmen vektörleştirilemediğinde fırlatılır."""
+
+
+class Embedder:
+    """
+    Embedding sağlayıcıları için ortak arayüz.
+
+    Alt sınıflar `embed_batch` metodunu uygular. `model_name` ve `dimension`
+    alanları indeks oluşturulurken kullanılan modeli tanımlar.
+    """
+
+    model_name = None
+    dimension = None
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        """
+        Bir metin listesini vektörlere dönüştürür.
+
+        Args:
+            texts (list): Vektörleştirilecek metinler.
+            task_type (str): Gemini görev tipi ("retrieval_document", "retrieval_query").
+
+        Returns:
+            list: Her metin için bir vektör, girdiyle aynı sırada.
+        """
+        raise NotImplementedError
+
+    def embed_query(self, text):
+        """Tek bir sorgu metnini vektörleştirir."""
+        return np.asarray(self.embed_batch([text], task_type="retrieval_query"), dtype='float32')[0]
+
+    async def embed_query_async(self, text):
+        """embed_query'nin event loop'u bloklamayan karşılığı."""
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+class GeminiEmbedder(Embedder):
+    """Google `text-embedding-004` modelini toplu isteklerle kullanan embedder."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        response = get_genai().embed_content(model=self.model_name, content=list(texts), task_type=task_type)
+        embeddings = response['embedding']
+        if len(embeddings) != len(texts):
+            raise EmbeddingError(f"{len(texts)} metin gönderildi, {len(embeddings)} vektör döndü")
+        return embeddings
+
+
+class HashEmbedder(Embedder):
+    """
+    Ağ bağlantısı gerektirmeyen, deterministik yerel embedder.
+
+    Kelimeleri sabit boyutlu bir vektöre hash'ler (feature hashing) ve
+    L2 normalize eder. Anlamsal kalite hedeflemez; pipeline'ın verimini
+    çevrimdışı ölçmek ve API anahtarı olmadan indeks kurmak için kullanılır.
+
+    Args:
+        dimension (int): Vektör boyutu.
+        latency (float): Her parti için simüle edilen ağ gecikmesi (saniye).
+    """
+
+    model_name = 'local/hash-embedder'
+
+    def __init__(self, dimension=EMBEDDING_DIMENSION, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+
+    def _embed_one(self, text):
+        vector = np.zeros(self.dimension, dtype='float32')
+        for token in re.findall(r'\w+', text.lower()):
+            digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimension] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        if self.latency:
+            time.sleep(self.latency)
+        return np.stack([self._embed_one(text) for text in texts]) if texts else np.zeros((0, self.dimension), dtype='float32')
+
+
+_query_embedders = {}
+
+
+def embedder_for_model(model_name):
+    """
+    Manifest'teki 'embedding_model' adına karşılık gelen embedder'ı döndürür.
+
+    Sorgu vektörleri indeksi oluşturan modelle üretilmelidir; bu yüzden
+    sorgu tarafı embedder'ı her zaman indeksin manifest'inden seçilir.
+
+    Args:
+        model_name (str): 'models/...' (Gemini), 'local/hash-embedder' veya 'local/<sentence-transformers modeli>'.
+    """
+    embedder = _query_embedders.get(model_name)
+    if embedder is None:
+        if model_name == HashEmbedder.model_name:
+            embedder = HashEmbedder()
+        elif model_name.startswith('local/'):
+            from local_embedding import get_local_embedder
+            embedder = get_local_embedder(model_name)
+        else:
+            embedder = GeminiEmbedder(model_name)
+        _query_embedders[model_name] = embedder
+    return embedder
+
+
+def _make_embedder(kind, local_model=None):
+    """CLI'daki --embedder seçeneğinden embedder oluşturur."""
+    if kind == 'hash':
+        return HashEmbedder()
+    if kind == 'local':
+        from local_embedding import LocalEmbedder, LOCAL_EMBEDDING_MODEL
+        return LocalEmbedder(local_model or LOCAL_EMBEDDING_MODEL)
+    return GeminiEmbedder()
+
+
+def _embed_batch_with_retry(embedder, texts, task_type, max_retries, base_delay):
+    """Tek bir partiyi üstel geri çekilme (exponential backoff) ile dener."""
+    for attempt in range(max_retries):
+        try:
+            vectors = np.asarray(embedder.embed_batch(texts, task_type=task_type), dtype='float32')
+            if vectors.shape[0] != len(texts):
+                raise EmbeddingError(f"{len(texts)} metin gönderildi, {vectors.shape[0]} vektör döndü")
+            return vectors
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise EmbeddingError(f"Parti {max_retries} denemede vektörleştirilemedi: {e}") from e
+            wait_time = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            print(f"⏳ Embedding hatası (deneme {attempt + 1}/{max_retries}): {e}. {wait_time:.1f} sn bekleniyor...")
+            time.sleep(wait_time)
+
+
+def embed_texts(texts, embedder=None, task_type="retrieval_document", batch_size=EMBED_BATCH_SIZE,
+                max_workers=EMBED_MAX_WORKERS, max_retries=EMBED_MAX_RETRIES, base_delay=EMBED_RETRY_BASE_DELAY,
+                cache=None):
+    """
+    Metinleri partiler halinde ve sınırlı paralellikle vektörleştirir.
+
+    Hiçbir satır atlanmaz: dönen matrisin i. satırı her zaman i. metnin
+    vektörüdür. Bir parti tüm denemelere rağmen başarısız olursa
+    `EmbeddingError` fırlatılır ve kısmi sonuç döndürülmez.
+
+    Args:
+        texts (list): Vektörleştirilecek metinler.
+        embedder (Embedder): Kullanılacak embedder. Verilmezse GeminiEmbedder.
+        task_type (str): Gemini görev tipi.
+        batch_size (int): Tek istekte gönderilecek metin sayısı.
+        max_workers (int): Aynı anda çalışacak parti sayısı.
+        max_retries (int): Parti başına deneme sayısı.
+        base_delay (float): Geri çekilme için başlangıç bekleme süresi (saniye).
+        cache (EmbeddingCache): Verilirse önce önbelleğe bakılır, yalnızca
+            önbellekte olmayan metinler embedder'a gönderilir.
 
-# API Anahtarını çevre değişkeninden al
-API_KEY = os.getenv("GOOGLE_API_KEY", "your_api_key_here")
-genai.configure(api_key=API_KEY)
+    Returns:
+        np.ndarray: (len(texts), dimension) boyutunda float32 matris.
+    """
+    embedder = embedder or GeminiEmbedder()
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, embedder.dimension or 0), dtype='float32')
+
+    if cache is not None:
+        cached = cache.get_many(embedder.model_name, task_type, texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        print(f"  Önbellek: {len(texts) - len(missing)} isabet, {len(missing)} yeni metin")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = embed_texts(missing_texts, embedder=embedder, task_type=task_type, batch_size=batch_size,
+                                max_workers=max_workers, max_retries=max_retries, base_delay=base_delay)
+            cache.put_many(embedder.model_name, task_type, missing_texts, fresh)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+        return np.stack(cached).astype('float32', copy=False)
+
+    batches = [(start, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+    result = None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = {
+            executor.submit(_embed_batch_with_retry, embedder, batch, task_type, max_retries, base_delay): (start, len(batch))
+            for start, batch in batches
+        }
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                start, size = futures[future]
+                vectors = future.result()
+                if result is None:
+                    result = np.empty((len(texts), vectors.shape[1]), dtype='float32')
+                result[start:start + size] = vectors
+                if done == len(batches) or done % max(1, len(batches) // 10) == 0:
+                    print(f"  {done}/{len(batches)} parti tamamlandı")
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return result
 
-def create_embeddings_and_index(chunks):
+
+def create_embeddings_and_index(chunks, embedder=None, batch_size=EMBED_BATCH_SIZE, max_workers=EMBED_MAX_WORKERS,
+                                use_cache=True, index_type=INDEX_TYPE):
     """
     Metin parçalarını vektörlere dönüştürür ve bir FAISS indeksine kaydeder.
-    
+
     Args:
         chunks (list): parse_game_manual fonksiyonundan gelen metin parçaları listesi.
-        
+            Parçalarda 'id' alanı varsa FAISS ID'si olarak kullanılır,
+            yoksa satır numarası kullanılır.
+        embedder (Embedder): Kullanılacak embedder. Verilmezse GeminiEmbedder.
+        batch_size (int): Tek istekte gönderilecek parça sayısı.
+        max_workers (int): Aynı anda çalışacak parti sayısı.
+        use_cache (bool): Kalıcı embedding önbelleğini kullan; yalnızca
+            değişen parçalar yeniden vektörleştirilir.
+        index_type (str): index_factory.INDEX_TYPES anahtarlarından biri
+            (flat_ip, ivf_flat, hnsw, sq8, ivf_sq8, ivf_pq, flat_l2).
+
     Returns:
-        faiss.IndexFlatL2: Oluşturulan FAISS indeksi.
+        tuple: (parça ID'leriyle eşlenmiş faiss.IndexIDMap2, manifest'e yazılacak indeks meta verisi)
     """
-    
-    model = 'models/text-embedding-004'
-    embeddings = []
-    
-    print("Metin parçaları vektörlere dönüştürülüyor...")
-    for chunk in chunks:
-        try:
-            response = genai.embed_content(model=model, content=chunk['content'])
-            embeddings.append(response['embedding'])
-        except Exception as e:
-            print(f"Embedding oluşturulurken hata oluştu: {e}")
-            continue
-            
-    embeddings_np = np.array(embeddings, dtype='float32')
-    
+
+    print(f"Metin parçaları vektörlere dönüştürülüyor ({len(chunks)} parça, parti boyutu {batch_size})...")
+    embeddings_np = embed_texts(
+        [chunk['content'] for chunk in chunks],
+        embedder=embedder,
+        batch_size=batch_size,
+        max_workers=max_workers,
+        cache=get_embedding_cache() if use_cache else None,
+    )
+
     # FAISS indeksi oluşturma
-    # D = Vektör boyutu (text-embedding-004 için 768)
-    # L2 mesafesi (öklid mesafesi) kullanıyoruz.
-    d = embeddings_np.shape[1]
-    index = faiss.IndexFlatL2(d)
-    index.add(embeddings_np)
-    
-    return index
-
-def create_faiss_index():
+    # text-embedding-004 vektörleri kosinüs benzerliği için tasarlandığından
+    # varsayılan tip normalize edilmiş vektörlerle iç çarpımdır (flat_ip).
+    # ID eşlemesi sayesinde artımlı güncellemede tek tek vektör silinip eklenebilir.
+    ids = np.array([chunk.get('id', i) for i, chunk in enumerate(chunks)], dtype='int64')
+    index, metadata = build_index(embeddings_np, ids, index_type)
+    print(f"🗂️ İndeks tipi: {metadata['index_type']} ({metadata['factory']}, {metadata['metric']})")
+
+    return index, metadata
+
+def _load_chunks(path):
+    if path.endswith('.jsonl'):
+        return list(iter_jsonl_chunks(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _chunks_source():
+    """processed_chunks.json ve processed_chunks.jsonl'den mevcut ve en yeni olanı döndürür."""
+    candidates = [path for path in (chunks_path, chunks_jsonl_path) if os.path.exists(path)]
+    if not candidates:
+        return chunks_path
+    return max(candidates, key=os.path.getmtime)
+
+def create_faiss_index(directory=data_dir, embedder=None, index_type=INDEX_TYPE, source=None, corpus=None):
     """
-    Mevcut processed_chunks.json'dan FAISS index oluşturur
+    Mevcut processed_chunks.json(l)'dan FAISS index oluşturur ve yeni bir sürüm olarak yayınlar
+
+    Ek korpuslar için `directory` data/shards/<ad>, `source` korpusun parça
+    dosyası ve `corpus` {'season', 'program', 'doc_type', 'default'} bilgisidir.
     """
+    embedder = embedder or GeminiEmbedder()
+    source = source or _chunks_source()
     try:
-        # JSON dosyasından chunks'ları yükle
-        with open(chunks_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        
-        print(f"📊 {len(chunks)} chunk yüklendi")
-        
+        # JSON/JSONL dosyasından kuralları yükle; kurallar cümle pencerelerine
+        # bölünür, kural tablosu ve atıf grafiği sürümle birlikte yazılır.
+        children, hierarchy = RuleHierarchy.build(_load_chunks(source))
+        chunks = assign_chunk_ids(children)
+
+        print(f"📊 {len(hierarchy.parents)} kural, {len(chunks)} parça yüklendi")
+
         # Vektörleştirme ve FAISS indeksi oluşturma
-        faiss_index = create_embeddings_and_index(chunks)
-        
-        # FAISS indeksini kaydetme
-        faiss.write_index(faiss_index, faiss_index_path)
-        
+        faiss_index, index_metadata = create_embeddings_and_index(chunks, embedder=embedder, index_type=index_type)
+
+        # İndeks ve parçaları atomik olarak yeni sürüm olarak kaydetme
+        metadata = {'embedding_model': embedder.model_name, **index_metadata}
+        if corpus:
+            metadata['corpus'] = corpus
+        manifest = write_index_version(faiss_index, chunks, directory, metadata=metadata, hierarchy=hierarchy)
+
         print("✅ FAISS indeksi başarıyla oluşturuldu!")
-        print(f"📁 Lokasyon: {faiss_index_path}")
-        
+        print(f"📁 Sürüm {manifest['version']}: {manifest['index_file']}, {manifest['chunks_file']}")
+
         return faiss_index
-        
+
     except FileNotFoundError:
-        print(f"❌ Hata: '{chunks_path}' dosyası bulunamadı.")
+        print(f"❌ Hata: '{source}' dosyası bulunamadı.")
+        return None
+    except EmbeddingError as e:
+        # Eksik satırlı bir indeks yazmaktansa hiç yazmıyoruz; aksi halde
+        # FAISS satırları processed_chunks.json ile hizasını kaybeder.
+        print(f"❌ Embedding hatası, indeks yazılmadı: {e}")
         return None
     except Exception as e:
         print(f"❌ Hata: {e}")
         return None
 
+def update_faiss_index(directory=data_dir, embedder=None, index_type=INDEX_TYPE, source=None, corpus=None):
+    """
+    processed_chunks.json(l)'daki yeni ayrıştırmayı aktif sürümle karşılaştırır ve
+    yalnızca değişen vektörleri ekler, siler veya değiştirir.
+
+    Aktif sürüm yoksa, farklı bir embedding modeliyle ya da farklı bir
+    indeks tipiyle oluşturulmuşsa tam yeniden oluşturmaya geçer. Vektör
+    silmeyi desteklemeyen indekslerde (HNSW) değişen/silinen parça varsa
+    da tam yeniden oluşturma yapılır.
+
+    Returns:
+        dict: Yazılan yeni sürümün manifest'i, hata durumunda None.
+    """
+    embedder = embedder or GeminiEmbedder()
+    source = source or _chunks_source()
+    try:
+        new_chunks, hierarchy = RuleHierarchy.build(_load_chunks(source))
+    except FileNotFoundError:
+        print(f"❌ Hata: '{source}' dosyası bulunamadı.")
+        return None
+
+    try:
+        current = load_index_version(directory, use_mmap=False)
+    except Exception as e:
+        print(f"⚠️ Aktif indeks yüklenemedi ({e}), tam yeniden oluşturma yapılıyor.")
+        return read_manifest(directory) if create_faiss_index(directory, embedder, index_type, source, corpus) is not None else None
+
+    # Tam yeniden oluşturmada da bölümün korpus bilgisi korunur.
+    corpus = corpus or current.manifest.get('corpus')
+    indexed_model = current.manifest.get('embedding_model', EMBEDDING_MODEL)
+    if indexed_model != embedder.model_name:
+        print(f"⚠️ İndeks '{indexed_model}' ile oluşturulmuş, tam yeniden oluşturma yapılıyor.")
+        return read_manifest(directory) if create_faiss_index(directory, embedder, index_type, source, corpus) is not None else None
+
+    # Eski indekslerde tip kaydı yoktur; bunlar normalize edilmemiş L2 indeksleridir.
+    indexed_type = current.manifest.get('index_type', 'flat_l2')
+    if indexed_type != resolve_index_type(index_type, len(new_chunks)):
+        print(f"⚠️ İndeks tipi '{indexed_type}', istenen '{index_type}'; tam yeniden oluşturma yapılıyor.")
+        return read_manifest(directory) if create_faiss_index(directory, embedder, index_type, source, corpus) is not None else None
+
+    # Eski (manifest'siz) sürümlerde ID satır numarasıdır.
+    old_chunks = list(current.chunks)
+    for row, chunk in enumerate(old_chunks):
+        chunk.setdefault('id', row)
+    index = to_id_mapped(current.index)
+
+    diff = diff_chunks(old_chunks, new_chunks)
+    changed = diff['replaced'] + diff['added']
+    next_id = current.manifest.get('next_id', max((c['id'] for c in old_chunks), default=-1) + 1)
+    for chunk in diff['added']:
+        chunk['id'] = next_id
+        next_id += 1
+
+    print(f"📊 Korunan: {len(diff['kept'])}, değişen: {len(diff['replaced'])}, "
+          f"eklenen: {len(diff['added'])}, silinen: {len(diff['removed_ids'])}")
+
+    stale_ids = diff['removed_ids'] + [chunk['id'] for chunk in diff['replaced']]
+    if stale_ids and not supports_remove(current.manifest):
+        print(f"⚠️ '{indexed_type}' indeksinden vektör silinemiyor, tam yeniden oluşturma yapılıyor.")
+        return read_manifest(directory) if create_faiss_index(directory, embedder, index_type, source, corpus) is not None else None
+
+    try:
+        vectors = embed_texts([chunk['content'] for chunk in changed], embedder=embedder,
+                              cache=get_embedding_cache())
+    except EmbeddingError as e:
+        print(f"❌ Embedding hatası, indeks güncellenmedi: {e}")
+        return None
+
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype='int64'))
+    if changed:
+        # Yeni vektörler mevcut indeksle aynı dönüşümden geçer (IVF merkezleri yeniden eğitilmez).
+        index.add_with_ids(prepare_vectors(vectors, current.manifest),
+                           np.array([chunk['id'] for chunk in changed], dtype='int64'))
+
+    index_metadata = {key: value for key, value in current.manifest.items()
+                      if key in ('index_type', 'metric', 'normalized', 'factory', 'nprobe', 'ef_search', 'corpus')}
+    if corpus:
+        index_metadata['corpus'] = corpus
+    manifest = write_index_version(index, new_chunks, directory,
+                                   metadata={'embedding_model': embedder.model_name, **index_metadata},
+                                   hierarchy=hierarchy)
+    print(f"✅ İndeks sürüm {manifest['version']} olarak güncellendi ({index.ntotal} vektör).")
+    return manifest
+
 if __name__ == "__main__":
-    create_faiss_index()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="FAISS indeksini oluşturur veya günceller.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Yalnızca değişen parçaları yeniden vektörleştir")
+    parser.add_argument("--index-type", default=INDEX_TYPE,
+                        help="flat_ip, ivf_flat, hnsw, sq8, ivf_sq8, ivf_pq veya flat_l2")
+    parser.add_argument("--shard", help="Ek korpus bölümü adı; indeks data/shards/<ad>/ altına yazılır")
+    parser.add_argument("--chunks", help="Parça dosyası (.json/.jsonl); varsayılan processed_chunks")
+    parser.add_argument("--season", help="Bölümün sezonu, ör. 2024-2025")
+    parser.add_argument("--program", help="Bölümün programı, ör. V5RC, VIQRC, VURC")
+    parser.add_argument("--doc-type", help="Belge tipi, ör. manual, qa, appendix")
+    parser.add_argument("--default", action="store_true", help="İpucu olmayan sorgularda da ara")
+    parser.add_argument("--embedder", choices=["gemini", "local", "hash"],
+                        help="Vektörleri üretecek model (varsayılan: mevcut indeksin modeli, yoksa gemini); "
+                             "sorgular da aynı modelle vektörleştirilir")
+    parser.add_argument("--local-model", help="--embedder local için sentence-transformers modeli")
+    args = parser.parse_args()
+
+    directory = data_dir
+    corpus = None
+    if args.shard:
+        from sharded_store import shards_dir
+        directory = os.path.join(shards_dir, args.shard)
+        os.makedirs(directory, exist_ok=True)
+        corpus = {'season': args.season or '', 'program': args.program or '',
+                  'doc_type': args.doc_type or 'manual', 'default': args.default}
+
+    if args.embedder:
+        embedder = _make_embedder(args.embedder, args.local_model)
+    else:
+        manifest = read_manifest(directory) or {}
+        embedder = embedder_for_model(manifest.get('embedding_model', EMBEDDING_MODEL))
+
+    if args.incremental:
+        update_faiss_index(directory, embedder, index_type=args.index_type, source=args.chunks, corpus=corpus)
+    else:
+        create_faiss_index(directory, embedder, index_type=args.index_type, source=args.chunks, corpus=corpus)
@@ -0,0 +1,169 @@
+import sqlite3
+import hashlib
+import threading
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Proje ana dizininden çalıştırıldığını varsayalım.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+embedding_cache_path = os.path.join(script_dir, "..", "data", "embedding_cache.sqlite")
+
+# SQLite'ın tek sorguda kabul ettiği parametre sayısının altında kalıyoruz.
+_SQLITE_CHUNK = 500
+
+
+def text_hash(text):
+    """Metnin içerik adresi olarak kullanılan SHA-256 özetini döndürür."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    (model, task_type, metin hash'i) anahtarlı kalıcı embedding önbelleği.
+
+    Vektörler SQLite'ta float32 BLOB olarak saklanır; önünde süreç içi bir
+    LRU katmanı vardır. Hem indeks oluşturma hem de sorgu yolu aynı önbelleği
+    okur, böylece değişmeyen parçalar ve tekrar eden sorular API'ye gitmez.
+
+    Args:
+        path (str): SQLite dosya yolu.
+        memory_size (int): Bellekte tutulacak en fazla vektör sayısı.
+    """
+
+    def __init__(self, path=embedding_cache_path, memory_size=4096):
+        self.path = path
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, task_type TEXT NOT NULL, text_hash TEXT NOT NULL, "
+            "dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, task_type, text_hash)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model, task_type, texts):
+        """
+        Metinlerin önbellekteki vektörlerini döndürür.
+
+        Args:
+            model (str): Embedding model adı.
+            task_type (str): Gemini görev tipi.
+            texts (list): Aranacak metinler.
+
+        Returns:
+            list: Her metin için np.ndarray ya da önbellekte yoksa None.
+        """
+        hashes = [text_hash(text) for text in texts]
+        results = [None] * len(texts)
+        missing = {}
+
+        with self._lock:
+            for i, h in enumerate(hashes):
+                key = (model, task_type, h)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(h, []).append(i)
+
+            missing_hashes = list(missing)
+            for start in range(0, len(missing_hashes), _SQLITE_CHUNK):
+                part = missing_hashes[start:start + _SQLITE_CHUNK]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND task_type = ? AND text_hash IN ({placeholders})",
+                    [model, task_type, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    vector = np.frombuffer(blob, dtype='float32')
+                    self._remember((model, task_type, h), vector)
+                    for i in missing.pop(h):
+                        results[i] = vector
+                        self.disk_hits += 1
+
+            self.misses += sum(len(indices) for indices in missing.values())
+
+        return results
+
+    def put_many(self, model, task_type, texts, vectors):
+        """Metinlerin vektörlerini hem belleğe hem diske yazar."""
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype='float32')
+                h = text_hash(text)
+                self._remember((model, task_type, h), vector)
+                rows.append((model, task_type, h, vector.shape[0], vector.tobytes()))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, dim, vector) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def get(self, model, task_type, text):
+        """Tek bir metnin vektörünü döndürür, yoksa None."""
+        return self.get_many(model, task_type, [text])[0]
+
+    def put(self, model, task_type, text, vector):
+        """Tek bir metnin vektörünü önbelleğe yazar."""
+        self.put_many(model, task_type, [text], [vector])
+
+    def stats(self):
+        """İsabet/ıskalama sayaçlarını döndürür."""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memory),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_failed = False
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(path=None):
+    """
+    Süreç genelinde paylaşılan önbelleği döndürür.
+
+    Önbellek açılamazsa (salt okunur disk vb.) None döner; çağıranlar bu
+    durumda doğrudan API'ye gider.
+    """
+    global _default_cache, _default_cache_failed
+    if path is not None:
+        return EmbeddingCache(path)
+    with _default_cache_lock:
+        if _default_cache is None and not _default_cache_failed:
+            try:
+                _default_cache = EmbeddingCache()
+            except (sqlite3.Error, OSError) as e:
+                _default_cache_failed = True
+                print(f"⚠️ Embedding önbelleği açılamadı, önbelleksiz devam ediliyor: {e}")
+        return _default_cache
@@ -0,0 +1,224 @@
+import re
+import time
+import types
+import random
+import asyncio
+import threading
+
+from embedding import HashEmbedder, EMBEDDING_DIMENSION
+
+# Üretilen cevaplarda kullanılan kelimeler; prompt'taki kural ID'leri de eklenir.
+_ANSWER_WORDS = (
+    "robot kural sınır boyut ağırlık genişleme maç ceza izin verilen parça inç "
+    "the robot must rule limit size expansion match penalty allowed part inches"
+).split()
+_RULE_PATTERN = re.compile(r'<[A-Z]{1,3}\d+[a-z]?>')
+
+
+class StubApiError(Exception):
+    """Stand-in'in hata oranına göre fırlattığı API hatası."""
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+
+class _Response:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class _AsyncStream:
+    """generate_content_async(stream=True) cevabı: parçaları token gecikmesiyle döndürür."""
+
+    def __init__(self, stub, parts, usage_metadata=None):
+        self._stub = stub
+        self._parts = parts
+        self._usage_metadata = usage_metadata
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for position, part in enumerate(self._parts):
+            if self._stub.token_latency:
+                await asyncio.sleep(self._stub.token_latency)
+            # Gemini kullanım bilgisini akışın son parçasında gönderir.
+            last = position == len(self._parts) - 1
+            yield _Response(part, self._usage_metadata if last else None)
+
+
+class StubCachedContent:
+    """caching.CachedContent'in yerel karşılığı: önek metnini ve süresini tutar."""
+
+    def __init__(self, model, system_instruction, ttl, display_name=None):
+        self.name = f"cachedContents/stub-{id(self):x}"
+        self.model = model
+        self.display_name = display_name
+        self.system_instruction = system_instruction or ""
+        self.expire_time = time.time() + (ttl.total_seconds() if ttl is not None else 3600)
+
+    def delete(self):
+        self.expire_time = 0.0
+
+
+class _CachedContentFactory:
+    def __init__(self, stub):
+        self._stub = stub
+
+    def create(self, model, system_instruction=None, contents=None, ttl=None, display_name=None, **kwargs):
+        self._stub._count('cache_create')
+        return StubCachedContent(model, system_instruction, ttl, display_name)
+
+
+class _ModelFactory:
+    """StubGenai.GenerativeModel: çağrılabilir, ayrıca from_cached_content sunar."""
+
+    def __init__(self, stub):
+        self._stub = stub
+
+    def __call__(self, model_name, system_instruction=None, **kwargs):
+        return StubGenerativeModel(self._stub, model_name, system_instruction=system_instruction)
+
+    def from_cached_content(self, cached_content, **kwargs):
+        return StubGenerativeModel(self._stub, cached_content.model, cached_content=cached_content)
+
+
+class StubGenerativeModel:
+    """
+    genai.GenerativeModel'in yerel karşılığı.
+
+    system_instruction her istekte girdiye eklenir; önbellekli içerikten
+    kurulan modelde önek 'cached' token sayılır ve ilk token gecikmesine
+    (prefill_latency) yalnızca önbellekte olmayan kısım eklenir.
+    """
+
+    def __init__(self, stub, model_name, system_instruction=None, cached_content=None):
+        self._stub = stub
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.cached_content = cached_content
+
+    def _prepare(self, prompt, method):
+        cached = self.cached_content
+        if cached is not None and time.time() >= cached.expire_time:
+            raise StubApiError(f"{method}: cached content bulunamadı ({cached.name})")
+        prefix = cached.system_instruction if cached is not None else self.system_instruction
+        full_prompt = prefix + prompt
+        cached_tokens = len(prefix) // 4 if cached is not None else 0
+        usage_tokens = len(full_prompt) // 4
+        delay = self._stub._latency(self._stub.generate_latency) + \
+            self._stub.prefill_latency * (usage_tokens - cached_tokens) / 1000
+        return full_prompt, usage_tokens, cached_tokens, delay
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self._stub._count('generate')
+        full_prompt, usage_tokens, cached_tokens, delay = self._prepare(prompt, 'generate_content')
+        time.sleep(delay)
+        self._stub._maybe_fail('generate_content')
+        parts = self._stub._answer_parts(full_prompt)
+        if stream:
+            return self._sync_stream(parts)
+        return _Response("".join(parts), _UsageMetadata(usage_tokens, len(parts), cached_tokens))
+
+    def _sync_stream(self, parts):
+        for part in parts:
+            if self._stub.token_latency:
+                time.sleep(self._stub.token_latency)
+            yield _Response(part)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self._stub._count('generate')
+        full_prompt, usage_tokens, cached_tokens, delay = self._prepare(prompt, 'generate_content_async')
+        await asyncio.sleep(delay)
+        self._stub._maybe_fail('generate_content_async')
+        parts = self._stub._answer_parts(full_prompt)
+        if stream:
+            return _AsyncStream(self._stub, parts, _UsageMetadata(usage_tokens, len(parts), cached_tokens))
+        return _Response("".join(parts), _UsageMetadata(usage_tokens, len(parts), cached_tokens))
+
+
+class StubGenai:
+    """
+    google.generativeai modülünün çevrimdışı karşılığı (benchmark ve yük testleri için).
+
+    `embed_content` HashEmbedder vektörleri döndürür; `GenerativeModel`
+    prompt'taki kural ID'lerini içeren sahte bir cevabı token token üretir.
+    Gecikmeler ±%50 oynar; `error_rate` olasılıkla StubApiError fırlatılır.
+    `caching.CachedContent.create` ve `GenerativeModel.from_cached_content`
+    önek önbelleğini taklit eder. `startup.set_genai(StubGenai(...))` ile
+    devreye alınır.
+
+    Args:
+        embed_latency (float): embed_content çağrısı başına gecikme (saniye).
+        generate_latency (float): İlk token'a kadar geçen süre (saniye).
+        token_latency (float): Akışta token başına gecikme (saniye).
+        tokens (int): Cevap başına token sayısı.
+        error_rate (float): Çağrıların hata ile biteceği oran (0-1).
+        seed (int): Rastgelelik tohumu.
+        prefill_latency (float): Önbellekte olmayan her 1000 girdi token'ı için ilk token'a eklenen gecikme (saniye).
+    """
+
+    def __init__(self, embed_latency=0.05, generate_latency=0.4, token_latency=0.01, tokens=80,
+                 error_rate=0.0, seed=0, dimension=EMBEDDING_DIMENSION, prefill_latency=0.0):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.prefill_latency = prefill_latency
+        self.calls = {'embed': 0, 'generate': 0, 'errors': 0, 'cache_create': 0}
+        self.types = types.SimpleNamespace(GenerationConfig=lambda **config: config)
+        self.caching = types.SimpleNamespace(CachedContent=_CachedContentFactory(self))
+        self.GenerativeModel = _ModelFactory(self)
+        self._embedder = HashEmbedder(dimension=dimension)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        pass
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def _latency(self, base):
+        if not base:
+            return 0.0
+        with self._lock:
+            return base * self._rng.uniform(0.5, 1.5)
+
+    def _maybe_fail(self, method):
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.calls['errors'] += 1
+        if failed:
+            raise StubApiError(f"{method}: simüle edilmiş API hatası")
+
+    def _answer_parts(self, prompt):
+        rule_ids = list(dict.fromkeys(_RULE_PATTERN.findall(prompt)))[:3]
+        with self._lock:
+            words = [self._rng.choice(_ANSWER_WORDS) for _ in range(max(1, self.tokens - len(rule_ids)))]
+        return [word + " " for word in rule_ids + words]
+
+    def _embed(self, content):
+        if isinstance(content, str):
+            return self._embedder._embed_one(content).tolist()
+        return [self._embedder._embed_one(text).tolist() for text in content]
+
+    def embed_content(self, model, content, task_type=None, **kwargs):
+        self._count('embed')
+        time.sleep(self._latency(self.embed_latency))
+        self._maybe_fail('embed_content')
+        return {'embedding': self._embed(content)}
+
+    async def embed_content_async(self, model, content, task_type=None, **kwargs):
+        self._count('embed')
+        await asyncio.sleep(self._latency(self.embed_latency))
+        self._maybe_fail('embed_content_async')
+        return {'embedding': self._embed(content)}
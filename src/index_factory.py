@@ -0,0 +1,145 @@
+import os
+
+import faiss
+import numpy as np
+
+# Varsayılan indeks tipi ve parametreleri; ortam değişkenleriyle değiştirilebilir.
+INDEX_TYPE = os.getenv("VEX_INDEX_TYPE", "flat_ip")
+IVF_NLIST = int(os.getenv("VEX_IVF_NLIST", "256"))
+IVF_NPROBE = int(os.getenv("VEX_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("VEX_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("VEX_HNSW_EF_SEARCH", "64"))
+# 768 boyut / 48 alt uzay = alt uzay başına 16 boyut, vektör başına 48 bayt
+PQ_M = int(os.getenv("VEX_PQ_M", "48"))
+
+# k-means eğitimi için küme başına önerilen en az vektör sayısı (FAISS uyarı eşiği)
+MIN_POINTS_PER_CENTROID = 39
+# PQ kod kitabı başına merkez sayısı (8 bit kodlar)
+PQ_CENTROIDS = 256
+
+# İndeks tipi -> (FAISS factory tanımı, metrik). Tanımdaki {nlist}, {m} ve
+# {pq_m} eğitim verisinin boyutuna göre doldurulur.
+INDEX_TYPES = {
+    'flat_l2': ("Flat", 'l2'),  # Manifest'te tip yoksa (eski indeksler) bu kabul edilir
+    'flat_ip': ("Flat", 'ip'),
+    'sq8': ("SQ8", 'ip'),
+    'hnsw': ("HNSW{m}", 'ip'),
+    'ivf_flat': ("IVF{nlist},Flat", 'ip'),
+    'ivf_sq8': ("IVF{nlist},SQ8", 'ip'),
+    'ivf_pq': ("IVF{nlist},PQ{pq_m}", 'ip'),
+}
+# HNSW grafiğinden tek tek vektör silinemez; bu tiplerde artımlı güncelleme tam yeniden oluşturmaya düşer.
+_NO_REMOVE_TYPES = {'hnsw'}
+
+
+def _pq_subquantizers(dimension):
+    """PQ_M'e en yakın, boyutu tam bölen alt uzay sayısı."""
+    return max(m for m in range(1, min(PQ_M, dimension) + 1) if dimension % m == 0)
+
+
+def _nlist(num_vectors):
+    return max(1, min(IVF_NLIST, num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def resolve_index_type(index_type, num_vectors):
+    """
+    İstenen indeks tipini korpus boyutuna göre uygulanabilir tipe çevirir.
+
+    PQ kod kitapları en az 256 eğitim vektörü ister; daha küçük korpuslarda
+    (ve bilinmeyen tiplerde) kesin `flat_ip` aramasına düşülür.
+
+    Returns:
+        str: Kullanılacak indeks tipi.
+    """
+    if index_type not in INDEX_TYPES:
+        print(f"⚠️ Bilinmeyen indeks tipi '{index_type}', flat_ip kullanılacak")
+        return 'flat_ip'
+    if index_type == 'ivf_pq' and num_vectors < PQ_CENTROIDS:
+        print(f"⚠️ {num_vectors} vektör PQ eğitimi için az, flat_ip kullanılacak")
+        return 'flat_ip'
+    return index_type
+
+
+def index_metadata(index_type, num_vectors=0, dimension=0):
+    """
+    İndeks tipinin manifest'e yazılacak meta verisi.
+
+    Returns:
+        dict: {'index_type', 'metric', 'normalized', 'factory', ...arama parametreleri}
+    """
+    description, metric = INDEX_TYPES[index_type]
+    metadata = {
+        'index_type': index_type,
+        'metric': metric,
+        # İç çarpım metriğinde vektörler birim uzunluğa getirilir; skor kosinüs benzerliğidir.
+        'normalized': metric == 'ip',
+        'factory': description.format(nlist=_nlist(num_vectors), m=HNSW_M,
+                                      pq_m=_pq_subquantizers(dimension) if dimension else PQ_M),
+    }
+    if index_type.startswith('ivf'):
+        metadata['nprobe'] = IVF_NPROBE
+    if index_type == 'hnsw':
+        metadata['ef_search'] = HNSW_EF_SEARCH
+    return metadata
+
+
+def prepare_vectors(vectors, metadata=None):
+    """
+    Vektörleri indeksin beklediği biçime getirir: float32 ve gerekiyorsa birim uzunluk.
+
+    Hem indeksleme hem sorgu tarafında aynı dönüşüm kullanılmalıdır.
+
+    Args:
+        vectors (array-like): (n, d) vektörler.
+        metadata (dict): İndeks meta verisi (manifest). Eski indekslerde normalizasyon yoktur.
+    """
+    vectors = np.array(vectors, dtype='float32', order='C')
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    if metadata and metadata.get('normalized'):
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def supports_remove(metadata):
+    """İndeksten tek tek vektör silinebiliyorsa True."""
+    return (metadata or {}).get('index_type', 'flat_l2') not in _NO_REMOVE_TYPES
+
+
+def apply_search_params(index, metadata):
+    """Manifest'teki arama parametrelerini (nprobe, efSearch) yüklenmiş indekse uygular."""
+    if not metadata:
+        return index
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None and 'nprobe' in metadata:
+        ivf.nprobe = int(metadata['nprobe'])
+    if hasattr(inner, 'hnsw') and 'ef_search' in metadata:
+        inner.hnsw.efSearch = int(metadata['ef_search'])
+    return index
+
+
+def build_index(vectors, ids, index_type=INDEX_TYPE):
+    """
+    Vektörlerden ID eşlemeli bir FAISS indeksi oluşturur.
+
+    Args:
+        vectors (np.ndarray): (n, d) float32 vektörler (normalize edilmemiş).
+        ids (np.ndarray): Her vektörün parça ID'si.
+        index_type (str): INDEX_TYPES anahtarlarından biri.
+
+    Returns:
+        tuple: (faiss.IndexIDMap2, meta veri sözlüğü)
+    """
+    vectors = np.asarray(vectors, dtype='float32')
+    num_vectors, dimension = vectors.shape
+    index_type = resolve_index_type(index_type, num_vectors)
+    metadata = index_metadata(index_type, num_vectors, dimension)
+    vectors = prepare_vectors(vectors, metadata)
+
+    metric = faiss.METRIC_INNER_PRODUCT if metadata['metric'] == 'ip' else faiss.METRIC_L2
+    index = faiss.index_factory(dimension, "IDMap2," + metadata['factory'], metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    return apply_search_params(index, metadata), metadata
@@ -0,0 +1,595 @@
+import faiss
+import numpy as np
+import os
+import re
+import json
+import time
+import threading
+
+from embedding_cache import text_hash
+from chunk_store import PackedChunkStore, write_packed_chunks
+from lexical_index import BM25Index
+from reranker import RerankFeatures, TOPIC_SIGNATURE
+from rule_hierarchy import RuleHierarchy
+from retrieval import normalize_rule_id
+from index_factory import apply_search_params, prepare_vectors
+from search_scheduler import get_search_scheduler, configure_faiss
+
+# Proje ana dizininden çalıştırıldığını varsayalım.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(script_dir, "..", "data")
+
+MANIFEST_NAME = "index_manifest.json"
+# Manifest'ten önceki tek dosya çifti; manifest yoksa bunlar okunur.
+LEGACY_INDEX_NAME = "faiss_index.bin"
+LEGACY_CHUNKS_NAME = "processed_chunks.json"
+# Çalışan süreçler eski sürümü okurken dosyaları silmemek için
+# son birkaç sürüm diskte tutulur.
+KEEP_VERSIONS = 3
+# Manifest değişikliklerinin kontrol edilme aralığı (saniye)
+INDEX_POLL_INTERVAL = 5.0
+# Başarısız bir yüklemeden sonra aynı dosyaları yeniden denemeden önce beklenecek süre
+LOAD_RETRY_INTERVAL = 10.0
+
+_VERSIONED_FILE_PATTERN = re.compile(r'^(?:faiss_index|processed_chunks|lexical_index|rerank_features|rule_hierarchy)\.v(\d+)\.(?:bin|json|npz)$')
+
+
+def chunk_content_hash(chunk):
+    """Parçanın içerik hash'ini döndürür (fark hesaplamada kullanılır)."""
+    return text_hash(chunk['content'])
+
+
+class IndexVersion:
+    """
+    Diskten yüklenmiş bir indeks sürümü: FAISS indeksi, parça listesi ve manifest.
+
+    FAISS aramaları parça ID'si döndürür; `chunk_for_id` bu ID'yi parça
+    sözlüğüne çevirir. `chunks` paketlenmiş bir PackedChunkStore (parçalar
+    istendikçe çözülür) ya da eski JSON dosyalarından gelen bir listedir.
+    Eski (manifest'siz) indekslerde ID satır numarasıdır.
+    """
+
+    def __init__(self, index, chunks, manifest=None, lexical_path=None, rerank_path=None, hierarchy_path=None):
+        configure_faiss()
+        self.index = index
+        self.chunks = chunks
+        self.manifest = manifest or {}
+        self.version = self.manifest.get('version', 0)
+        self.loaded_at = None
+        self.load_seconds = None
+        self._lexical_path = lexical_path
+        self._lexical_index = None
+        self._rerank_path = rerank_path
+        self._rerank_features = None
+        self._hierarchy_path = hierarchy_path
+        self._hierarchy = None
+        self._lexical_lock = threading.Lock()
+        self._rule_rows = None
+        if isinstance(chunks, PackedChunkStore):
+            self._row_for_id = chunks.row_for_id
+        else:
+            id_to_row = {chunk.get('id', row): row for row, chunk in enumerate(chunks)}
+            self._row_for_id = id_to_row.get
+
+    def row_for_id(self, chunk_id):
+        """FAISS'in döndürdüğü ID'nin parça satırını döndürür, yoksa None."""
+        return self._row_for_id(int(chunk_id))
+
+    def chunk_for_id(self, chunk_id):
+        """FAISS'in döndürdüğü ID'ye ait parçayı döndürür, yoksa None."""
+        row = self.row_for_id(chunk_id)
+        return None if row is None else self.chunks[row]
+
+    def search(self, query_embedding, k):
+        """
+        Sorgu vektörüne en yakın parçaları arar.
+
+        Sorgu, indekslenen vektörlerle aynı dönüşümden geçirilir (iç çarpım
+        indekslerinde normalizasyon). Skorlar metrikten bağımsız olarak
+        "büyük olan daha iyi" yönündedir: iç çarpımda benzerlik, L2'de
+        negatif mesafe. Partileme açıksa (VEX_SEARCH_BATCHING) aynı anda
+        gelen sorgularla birlikte tek bir FAISS aramasında çalışır.
+
+        Returns:
+            list: (satır, skor) çiftleri, skora göre azalan.
+        """
+        scheduler = get_search_scheduler()
+        if scheduler is not None:
+            return scheduler.search(self, query_embedding, k)
+        return self.search_many([query_embedding], k)[0]
+
+    def search_many(self, query_embeddings, k):
+        """
+        Birden fazla sorgu vektörünü tek bir FAISS çağrısında arar.
+
+        Returns:
+            list: Her sorgu için search ile aynı biçimde (satır, skor) listesi.
+        """
+        vectors = prepare_vectors(query_embeddings, self.manifest)
+        distances, ids = self.index.search(vectors, k)
+        similarity = self.manifest.get('metric', 'l2') == 'ip'
+        results = []
+        for query_distances, query_ids in zip(distances, ids):
+            hits = []
+            for distance, chunk_id in zip(query_distances, query_ids):
+                # k toplamdan büyükse FAISS -1 döndürür.
+                row = self.row_for_id(chunk_id) if chunk_id >= 0 else None
+                if row is not None:
+                    hits.append((row, float(distance) if similarity else -float(distance)))
+            results.append(hits)
+        return results
+
+    def rows_for_rule(self, rule_id):
+        """
+        Kural ID'sine ('R25', '<SG3>', 'sg3') ait parça satırlarını döndürür.
+
+        Tablo ilk kullanımda parçalar bir kere taranarak oluşturulur; sonraki
+        aramalar tek bir sözlük okumasıdır.
+
+        Returns:
+            list: Satır numaraları, kılavuzdaki sırayla; kural yoksa boş liste.
+        """
+        if self._rule_rows is None:
+            with self._lexical_lock:
+                if self._rule_rows is None:
+                    rule_rows = {}
+                    for row, chunk in enumerate(self.chunks):
+                        rule_rows.setdefault(normalize_rule_id(chunk.get('rule_id', '')), []).append(row)
+                    rule_rows.pop('', None)
+                    self._rule_rows = rule_rows
+        return self._rule_rows.get(normalize_rule_id(rule_id), [])
+
+    @property
+    def lexical_index(self):
+        """
+        Bu sürümün BM25 indeksi; ilk kullanımda yüklenir.
+
+        Sürümle birlikte yazılmış dosya yoksa (eski sürümler) parçalardan
+        bellekte oluşturulur.
+        """
+        if self._lexical_index is None:
+            with self._lexical_lock:
+                if self._lexical_index is None:
+                    if self._lexical_path and os.path.exists(self._lexical_path):
+                        self._lexical_index = BM25Index.load(self._lexical_path)
+                    else:
+                        self._lexical_index = BM25Index.build(self.chunks)
+        return self._lexical_index
+
+    @property
+    def rerank_features(self):
+        """
+        Bu sürümün yeniden sıralama özellikleri; ilk kullanımda yüklenir.
+
+        Dosya yoksa (eski sürümler) veya konu tanımları değişmişse
+        parçalardan bellekte hesaplanır.
+        """
+        if self._rerank_features is None:
+            with self._lexical_lock:
+                if self._rerank_features is None:
+                    features = None
+                    if self._rerank_path and os.path.exists(self._rerank_path):
+                        features = RerankFeatures.load(self._rerank_path)
+                        if features.signature != TOPIC_SIGNATURE or len(features) != len(self.chunks):
+                            features = None
+                    self._rerank_features = features or RerankFeatures.build(self.chunks)
+        return self._rerank_features
+
+    @property
+    def hierarchy(self):
+        """
+        Kural tablosu ve atıf grafiği (RuleHierarchy); ilk kullanımda yüklenir.
+
+        Hiyerarşisiz yazılmış eski sürümlerde None: parçalar kuralların kendisidir.
+        """
+        if self._hierarchy is None and self._hierarchy_path and os.path.exists(self._hierarchy_path):
+            with self._lexical_lock:
+                if self._hierarchy is None:
+                    self._hierarchy = RuleHierarchy.load(self._hierarchy_path)
+        return self._hierarchy
+
+    def resolve(self, row):
+        """Satırın (bölüm adı, sürüm, yerel satır) karşılığı; tek sürümde bölüm adı None'dır."""
+        return None, self, row
+
+    def rule_parents(self, rule_id):
+        """Kural ID'sinin tam kural kayıtları; hiyerarşi yoksa kuralın parçaları."""
+        hierarchy = self.hierarchy
+        if hierarchy is None:
+            return [self.chunks[row] for row in self.rows_for_rule(rule_id)]
+        return hierarchy.parents_for_rule(rule_id)
+
+    def rule_references(self, rule_id):
+        """Kuralın atıf yaptığı kural ID'leri (hiyerarşi yoksa boş)."""
+        hierarchy = self.hierarchy
+        return hierarchy.referenced_rules(rule_id) if hierarchy is not None else []
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, MANIFEST_NAME)
+
+
+def read_manifest(directory=data_dir):
+    """Aktif sürümün manifest'ini döndürür, yoksa None."""
+    try:
+        with open(_manifest_path(directory), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _atomic_write(path, write_fn):
+    """Dosyayı geçici bir ada yazar, diske zorlar ve tek adımda yerine taşır."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        write_fn(tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_json(path, data, indent=None):
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+    _atomic_write(path, write)
+
+
+def _remove_old_versions(directory, current_version):
+    for name in os.listdir(directory):
+        match = _VERSIONED_FILE_PATTERN.match(name)
+        if match and int(match.group(1)) <= current_version - KEEP_VERSIONS:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def write_index_version(index, chunks, directory=data_dir, metadata=None, hierarchy=None):
+    """
+    Yeni bir indeks sürümünü atomik olarak yayınlar.
+
+    İndeks ve parça dosyaları sürüm numaralı yeni adlara yazılır; ardından
+    manifest tek bir `os.replace` ile değiştirilir. Okuyucular manifest
+    üzerinden her zaman tutarlı bir (indeks, parçalar) çifti görür.
+
+    Args:
+        index (faiss.Index): ID'leri parça ID'leriyle eşleşen FAISS indeksi.
+        chunks (list): 'id' ve 'content_hash' alanları atanmış parça listesi.
+        directory (str): Veri dizini.
+        metadata (dict): Manifest'e eklenecek ek alanlar.
+        hierarchy (RuleHierarchy): Parçalar kuralların alt parçalarıysa kural tablosu ve atıf grafiği.
+
+    Returns:
+        dict: Yazılan manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory)
+    version = (previous['version'] if previous else 0) + 1
+
+    index_file = f"faiss_index.v{version}.bin"
+    chunks_file = f"processed_chunks.v{version}.bin"
+    lexical_file = f"lexical_index.v{version}.npz"
+    rerank_file = f"rerank_features.v{version}.npz"
+    _atomic_write(os.path.join(directory, index_file), lambda path: faiss.write_index(index, path))
+    _atomic_write(os.path.join(directory, chunks_file), lambda path: write_packed_chunks(path, chunks))
+    lexical_index = BM25Index.build(chunks)
+    _atomic_write(os.path.join(directory, lexical_file), lexical_index.save)
+    _atomic_write(os.path.join(directory, rerank_file), RerankFeatures.build(chunks).save)
+    hierarchy_file = None
+    if hierarchy is not None:
+        hierarchy_file = f"rule_hierarchy.v{version}.json"
+        _atomic_write(os.path.join(directory, hierarchy_file), hierarchy.save)
+
+    next_id = max((chunk['id'] for chunk in chunks), default=-1) + 1
+    if previous:
+        next_id = max(next_id, previous.get('next_id', 0))
+
+    manifest = dict(metadata or {})
+    manifest.update({
+        'version': version,
+        'index_file': index_file,
+        'chunks_file': chunks_file,
+        'chunks_format': 'packed',
+        'lexical_file': lexical_file,
+        'rerank_file': rerank_file,
+        'hierarchy_file': hierarchy_file,
+        'num_chunks': len(chunks),
+        'next_id': next_id,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    })
+    _write_json(_manifest_path(directory), manifest, indent=2)
+    _remove_old_versions(directory, version)
+    return manifest
+
+
+def _read_index(path, use_mmap):
+    """
+    FAISS indeksini okur; mümkünse dosyayı kopyalamadan belleğe eşler.
+
+    mmap ile açılan indeks salt okunurdur ve süreçler arasında sayfa
+    önbelleğini paylaşır. FAISS sürümü bu indeks tipi için mmap
+    desteklemiyorsa normal okumaya düşülür ve bu bir kere loglanır.
+    """
+    if use_mmap:
+        if not hasattr(faiss, 'IO_FLAG_MMAP_IFC'):
+            # Eski FAISS sürümleri düz indeksleri IO_FLAG_MMAP ile de belleğe kopyalar.
+            _warn_mmap_once(f"FAISS {faiss.__version__} IO_FLAG_MMAP_IFC desteklemiyor")
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            _warn_mmap_once(f"{os.path.basename(path)} belleğe eşlenemedi ({e})")
+    return faiss.read_index(path)
+
+
+_mmap_warnings = set()
+
+
+def _warn_mmap_once(reason):
+    if reason not in _mmap_warnings:
+        _mmap_warnings.add(reason)
+        print(f"⚠️ {reason}; indeks belleğe kopyalanarak okunuyor.")
+
+
+def load_index_version(directory=data_dir, use_mmap=True):
+    """
+    Manifest'in gösterdiği indeks sürümünü yükler.
+
+    Manifest yoksa eski `faiss_index.bin` / `processed_chunks.json` çifti okunur.
+
+    Args:
+        directory (str): Veri dizini.
+        use_mmap (bool): İndeksi ve parçaları belleğe eşleyerek aç. Artımlı
+            güncelleme gibi indeksi değiştirecek çağıranlar False vermelidir.
+
+    Returns:
+        IndexVersion: Yüklenen sürüm.
+    """
+    manifest = read_manifest(directory)
+    lexical_path = None
+    rerank_path = None
+    hierarchy_path = None
+    if manifest:
+        index_path = os.path.join(directory, manifest['index_file'])
+        chunks_file_path = os.path.join(directory, manifest['chunks_file'])
+        if manifest.get('lexical_file'):
+            lexical_path = os.path.join(directory, manifest['lexical_file'])
+        if manifest.get('rerank_file'):
+            rerank_path = os.path.join(directory, manifest['rerank_file'])
+        if manifest.get('hierarchy_file'):
+            hierarchy_path = os.path.join(directory, manifest['hierarchy_file'])
+    else:
+        index_path = os.path.join(directory, LEGACY_INDEX_NAME)
+        chunks_file_path = os.path.join(directory, LEGACY_CHUNKS_NAME)
+
+    index = apply_search_params(_read_index(index_path, use_mmap), manifest)
+    if manifest and manifest.get('chunks_format') == 'packed':
+        chunks = PackedChunkStore(chunks_file_path)
+    else:
+        with open(chunks_file_path, 'r', encoding='utf-8') as f:
+            chunks = json.load(f)
+    return IndexVersion(index, chunks, manifest, lexical_path=lexical_path, rerank_path=rerank_path,
+                        hierarchy_path=hierarchy_path)
+
+
+def assign_chunk_ids(chunks, start_id=0):
+    """Parçalara sıralı ID ve içerik hash'i atar (tam yeniden oluşturma için)."""
+    for offset, chunk in enumerate(chunks):
+        chunk['id'] = start_id + offset
+        chunk['content_hash'] = chunk_content_hash(chunk)
+    return chunks
+
+
+def diff_chunks(old_chunks, new_chunks):
+    """
+    Yeni ayrıştırılmış parçaları mevcut sürümle rule_id ve içerik hash'ine göre karşılaştırır.
+
+    Aynı (rule_id, hash) çiftine sahip parçalar korunur ve eski ID'lerini
+    alır. Aynı rule_id'nin içeriği değişmişse eski ID yeni içerikle yeniden
+    kullanılır (değiştirme). Geri kalanlar eklenir ya da silinir.
+
+    Args:
+        old_chunks (list): 'id' alanı olan mevcut parçalar.
+        new_chunks (list): Yeni ayrıştırılmış parçalar.
+
+    Returns:
+        dict: 'kept', 'added', 'replaced' (yeni parça listeleri; kept ve
+              replaced parçalara eski ID atanmıştır) ve 'removed_ids'.
+    """
+    pool = {}
+    for chunk in old_chunks:
+        key = (chunk['rule_id'], chunk.get('content_hash') or chunk_content_hash(chunk))
+        pool.setdefault(key, []).append(chunk)
+
+    kept, unmatched = [], []
+    for chunk in new_chunks:
+        chunk['content_hash'] = chunk_content_hash(chunk)
+        candidates = pool.get((chunk['rule_id'], chunk['content_hash']))
+        if candidates:
+            chunk['id'] = candidates.pop(0)['id']
+            kept.append(chunk)
+        else:
+            unmatched.append(chunk)
+
+    # Eşleşmeyen eski parçaları rule_id'ye göre grupla; aynı kuralın yeni
+    # içeriği eski ID'yi devralır.
+    leftover_by_rule = {}
+    for chunks in pool.values():
+        for chunk in chunks:
+            leftover_by_rule.setdefault(chunk['rule_id'], []).append(chunk)
+
+    added, replaced = [], []
+    for chunk in unmatched:
+        candidates = leftover_by_rule.get(chunk['rule_id'])
+        if candidates:
+            chunk['id'] = candidates.pop(0)['id']
+            replaced.append(chunk)
+        else:
+            chunk.pop('id', None)
+            added.append(chunk)
+
+    removed_ids = [chunk['id'] for chunks in leftover_by_rule.values() for chunk in chunks]
+    return {'kept': kept, 'added': added, 'replaced': replaced, 'removed_ids': removed_ids}
+
+
+def to_id_mapped(index, ids=None):
+    """
+    Düz bir FAISS indeksini ID eşlemeli (IndexIDMap2) hale getirir.
+
+    Zaten ID eşlemeliyse olduğu gibi döner. Eski indekslerde ID'ler satır
+    numaralarıdır. Vektörler kaynak indeksin boş bir kopyasına eklenir;
+    metrik (L2/iç çarpım) ve indeks tipi korunur.
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    base = faiss.clone_index(index)
+    base.reset()
+    mapped = faiss.IndexIDMap2(base)
+    if ids is None:
+        ids = np.arange(index.ntotal, dtype='int64')
+    mapped.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+    return mapped
+
+
+class VersionedIndexStore:
+    """
+    Aktif indeks sürümünü tutan ve manifest değiştikçe yeniden yükleyen depo.
+
+    Yeni sürüm arka plan iş parçacığında yüklenir ve hazır olduğunda tek bir
+    referans atamasıyla devreye alınır. Okuyucular kilit almaz: her istek
+    `current()` ile aldığı sürümü sonuna kadar kullanır, böylece devam eden
+    sorgular eski sürümde tamamlanırken yeni istekler yeni sürümü görür.
+    Başarısız yüklemeler önbelleğe alınmaz; dosyalar değişince ya da
+    `LOAD_RETRY_INTERVAL` dolunca yeniden denenir.
+
+    Args:
+        directory (str): Veri dizini.
+        poll_interval (float): Manifest kontrol aralığı (saniye).
+        auto_watch (bool): İlk başarılı yüklemeden sonra izleyiciyi başlat.
+    """
+
+    def __init__(self, directory=data_dir, poll_interval=INDEX_POLL_INTERVAL, auto_watch=True):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.auto_watch = auto_watch
+        self.last_error = None
+        self._current = None
+        self._signature = None
+        self._failed_signature = None
+        self._failed_at = 0.0
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _files_signature(self):
+        """Manifest'in (yoksa eski dosya çiftinin) değişiklik imzası."""
+        names = [MANIFEST_NAME] if os.path.exists(_manifest_path(self.directory)) else [LEGACY_INDEX_NAME, LEGACY_CHUNKS_NAME]
+        signature = []
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+                signature.append((name, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((name, None, None))
+        return tuple(signature)
+
+    def current(self):
+        """
+        Aktif sürümü döndürür; henüz yüklenmemişse eşzamanlı olarak yükler.
+
+        Returns:
+            IndexVersion: Aktif sürüm, hiç yüklenemediyse None.
+        """
+        snapshot = self._current
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._current
+        if snapshot is not None and self.auto_watch:
+            self.start_watching()
+        return snapshot
+
+    def refresh(self, force=False):
+        """
+        Dosyalar değiştiyse yeni sürümü yükler ve devreye alır.
+
+        Returns:
+            bool: Yeni bir sürüm devreye alındıysa True.
+        """
+        signature = self._files_signature()
+        if not force and signature == self._signature and self._current is not None:
+            return False
+        if (not force and signature == self._failed_signature
+                and time.monotonic() - self._failed_at < LOAD_RETRY_INTERVAL):
+            return False
+
+        with self._load_lock:
+            # Kilidi beklerken başka bir iş parçacığı aynı sürümü yüklemiş olabilir.
+            if not force and signature == self._signature and self._current is not None:
+                return False
+
+            start = time.perf_counter()
+            try:
+                snapshot = load_index_version(self.directory)
+            except Exception as e:
+                self.last_error = str(e)
+                self._failed_signature = signature
+                self._failed_at = time.monotonic()
+                print(f"Hata: Veritabanı dosyaları yüklenemedi. Hata: {e}")
+                return False
+
+            snapshot.load_seconds = time.perf_counter() - start
+            snapshot.loaded_at = time.time()
+            previous = self._current
+            # Tek referans ataması: okuyucular ya eski ya yeni sürümü görür.
+            self._current = snapshot
+            self._signature = signature
+            self.last_error = None
+            print(f"FAISS indeksi ve metin parçaları yüklendi: sürüm {snapshot.version} "
+                  f"({len(snapshot.chunks)} parça, {snapshot.load_seconds:.2f} sn)"
+                  + (f", önceki sürüm {previous.version}" if previous is not None else ""))
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ İndeks izleyici hatası: {e}")
+
+    def start_watching(self):
+        """Manifest'i izleyen arka plan iş parçacığını başlatır (idempotent)."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        with self._load_lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="index-store-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+    def status(self):
+        """Aktif sürüm, yüklenme zamanı ve son hata bilgisini döndürür."""
+        snapshot = self._current
+        if snapshot is None:
+            return {'version': None, 'loaded_at': None, 'load_seconds': None,
+                    'num_chunks': 0, 'last_error': self.last_error}
+        return {
+            'version': snapshot.version,
+            'created_at': snapshot.manifest.get('created_at'),
+            'loaded_at': snapshot.loaded_at,
+            'load_seconds': snapshot.load_seconds,
+            'num_chunks': len(snapshot.chunks),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,64 @@
+import re
+from functools import lru_cache
+
+
+class KeywordMatcher:
+    """
+    Bir anahtar kelime kümesini tek bir derlenmiş desenle arayan eşleştirici.
+
+    Desen, en uzundan en kısaya sıralanmış kelimelerin ileri bakışlı
+    (lookahead) bir alternasyonudur; metin tek geçişte taranır ve her
+    konumda başlayan en uzun kelime bulunur. Bir kelimenin içinde geçen
+    daha kısa kelimeler (ör. 'sınırı' içindeki 'sınır') önceden hesaplanmış
+    kapsama tablosundan eklenir. Sonuç, her kelime için `kelime in metin`
+    kontrolüyle birebir aynıdır.
+
+    Args:
+        keywords (list): Aranacak kelimeler; sonuçlar bu sırayla döner.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        unique = sorted({keyword for keyword in self.keywords if keyword}, key=len, reverse=True)
+        if unique:
+            self._pattern = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in unique) + '))')
+        else:
+            self._pattern = None
+        self._implied = {
+            keyword: [other for other in unique if other != keyword and other in keyword]
+            for keyword in unique
+        }
+
+    def find(self, text):
+        """Metinde geçen kelimelerin kümesini döndürür."""
+        if self._pattern is None:
+            return set()
+        found = {match.group(1) for match in self._pattern.finditer(text)}
+        for keyword in list(found):
+            found.update(self._implied[keyword])
+        return found
+
+    def match(self, *texts):
+        """
+        Metinlerden herhangi birinde geçen kelimeleri, kurucuya verilen sırayla döndürür.
+
+        Args:
+            *texts (str): Taranacak metinler (ör. içerik ve rule_id).
+
+        Returns:
+            list: Eşleşen kelimeler.
+        """
+        # Ayraç hiçbir kelimede geçmediği için metinler arası sahte eşleşme oluşmaz.
+        found = self.find('\x00'.join(texts))
+        return [keyword for keyword in self.keywords if keyword in found]
+
+
+@lru_cache(maxsize=256)
+def get_keyword_matcher(keywords):
+    """
+    Kelime kümesi için derlenmiş eşleştiriciyi döndürür; aynı küme için yeniden derlenmez.
+
+    Args:
+        keywords (tuple): Aranacak kelimeler (hashlenebilir olması için tuple).
+    """
+    return KeywordMatcher(keywords)
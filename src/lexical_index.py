@@ -0,0 +1,151 @@
+import re
+import math
+
+import numpy as np
+
+# Türkçe karakterleri ASCII karşılıklarına katlar: "sınır", "sinir" ve
+# "SINIR" aynı terime düşer; İngilizce ve Türkçe yazımlar birbirini bulur.
+_TURKISH_FOLD = str.maketrans({
+    'ı': 'i', 'ş': 's', 'ğ': 'g', 'ü': 'u', 'ö': 'o', 'ç': 'c',
+    'â': 'a', 'î': 'i', 'û': 'u',
+})
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def normalize_text(text):
+    """
+    Metni Türkçe kurallarına uygun şekilde küçültür ve aksanları katlar.
+
+    Python'un `lower()` fonksiyonu 'İ' harfini 'i̇' (noktalı birleşik
+    karakter) yapar; bu yüzden büyük 'İ' ve 'I' önce elle çevrilir.
+    """
+    return text.replace('İ', 'i').replace('I', 'i').lower().translate(_TURKISH_FOLD)
+
+
+def tokenize(text):
+    """Metni normalize edilmiş terimlere ayırır; tek harfli terimler (sayılar hariç) atılır."""
+    return [token for token in _TOKEN_PATTERN.findall(normalize_text(text)) if len(token) > 1 or token.isdigit()]
+
+
+class BM25Index:
+    """
+    Parça içeriği ve rule_id üzerinde BM25 puanlamalı ters indeks.
+
+    Her terim için (satır numaraları, terim frekansları) dizileri tutulur;
+    bir sorgu yalnızca sorgu terimlerinin posting listelerine dokunur ve
+    tüm belgeler için puanlar tek bir NumPy dizisinde toplanır. Satır
+    numaraları parça deposundaki satırlardır.
+
+    Args:
+        postings (dict): terim -> (satırlar int32[], frekanslar float32[]).
+        doc_lengths (np.ndarray): Her satırın terim sayısı.
+    """
+
+    def __init__(self, postings, doc_lengths, k1=BM25_K1, b=BM25_B):
+        self.postings = postings
+        self.doc_lengths = np.asarray(doc_lengths, dtype='float32')
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(self.doc_lengths)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+        # Belge uzunluğu normalizasyonu her sorguda aynıdır, bir kere hesaplanır.
+        if self.num_docs:
+            self._length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        else:
+            self._length_norm = np.zeros(0, dtype='float32')
+
+    @classmethod
+    def build(cls, chunks):
+        """
+        Parça listesinden indeks oluşturur.
+
+        Args:
+            chunks (iterable): {'content', 'rule_id'} alanlı parçalar, satır sırasıyla.
+        """
+        term_rows = {}
+        doc_lengths = []
+        for row, chunk in enumerate(chunks):
+            tokens = tokenize(chunk['content']) + tokenize(chunk.get('rule_id', ''))
+            doc_lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term_rows.setdefault(token, ([], []))
+                term_rows[token][0].append(row)
+                term_rows[token][1].append(count)
+
+        postings = {
+            term: (np.array(rows, dtype='int32'), np.array(tfs, dtype='float32'))
+            for term, (rows, tfs) in term_rows.items()
+        }
+        return cls(postings, doc_lengths)
+
+    def idf(self, term):
+        posting = self.postings.get(term)
+        df = 0 if posting is None else len(posting[0])
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def score_all(self, query):
+        """
+        Sorgu için tüm satırların BM25 puanlarını döndürür.
+
+        Returns:
+            np.ndarray: num_docs uzunluğunda float32 puan dizisi.
+        """
+        scores = np.zeros(self.num_docs, dtype='float32')
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            scores[rows] += self.idf(term) * tfs * (self.k1 + 1) / (tfs + self._length_norm[rows])
+        return scores
+
+    def score_rows(self, query, rows):
+        """Verilen satırların BM25 puanları (rows sırasıyla)."""
+        return self.score_all(query)[np.asarray(rows, dtype='int64')]
+
+    def search(self, query, k=5):
+        """
+        En yüksek BM25 puanlı satırları döndürür.
+
+        Returns:
+            list: (satır, puan) çiftleri, puana göre azalan; puanı 0 olanlar hariç.
+        """
+        scores = self.score_all(query)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+    def save(self, path):
+        """İndeksi sıkıştırılmamış .npz olarak yazar (pickle kullanmadan)."""
+        terms = sorted(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype='int64')
+        offsets[1:] = np.cumsum([len(self.postings[term][0]) for term in terms])
+        rows = np.concatenate([self.postings[term][0] for term in terms]) if terms else np.zeros(0, dtype='int32')
+        tfs = np.concatenate([self.postings[term][1] for term in terms]) if terms else np.zeros(0, dtype='float32')
+        with open(path, 'wb') as f:
+            np.savez(f, terms=np.array(terms, dtype=str), offsets=offsets, rows=rows, tfs=tfs,
+                     doc_lengths=self.doc_lengths, params=np.array([self.k1, self.b], dtype='float64'))
+
+    @classmethod
+    def load(cls, path):
+        """save ile yazılmış indeksi yükler."""
+        with np.load(path, allow_pickle=False) as data:
+            terms = data['terms']
+            offsets = data['offsets']
+            rows = data['rows']
+            tfs = data['tfs']
+            k1, b = data['params']
+            doc_lengths = data['doc_lengths']
+        postings = {
+            str(term): (rows[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+            for i, term in enumerate(terms)
+        }
+        return cls(postings, doc_lengths, k1=float(k1), b=float(b))
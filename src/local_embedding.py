@@ -0,0 +1,134 @@
+import os
+import threading
+
+import numpy as np
+
+from embedding import Embedder
+from micro_batch import MicroBatcher
+
+# Türkçe ve İngilizce sorguları aynı uzaya yerleştiren çok dilli model.
+LOCAL_EMBEDDING_MODEL = os.getenv("VEX_LOCAL_EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+# torch, torch_int8 (dinamik nicemleme), onnx veya onnx_int8
+LOCAL_EMBEDDING_BACKEND = os.getenv("VEX_LOCAL_EMBEDDING_BACKEND", "torch")
+LOCAL_EMBEDDING_THREADS = int(os.getenv("VEX_LOCAL_EMBEDDING_THREADS", "0"))  # 0 = torch varsayılanı
+# Eşzamanlı sorguların tek ileri geçişte birleştirilmesi
+LOCAL_EMBEDDING_MAX_BATCH = int(os.getenv("VEX_LOCAL_EMBEDDING_MAX_BATCH", "32"))
+LOCAL_EMBEDDING_BATCH_WINDOW = float(os.getenv("VEX_LOCAL_EMBEDDING_BATCH_WINDOW_MS", "2")) / 1000
+# Belge partileri (indeks oluşturma) için ileri geçiş boyutu
+LOCAL_EMBEDDING_ENCODE_BATCH = 64
+
+# Manifest'teki model adları bu önekle Gemini modellerinden ayrılır.
+LOCAL_PREFIX = 'local/'
+# onnx_int8 için sentence-transformers'ın beklediği nicemlenmiş model dosyası
+ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+_BACKENDS = ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+
+
+class LocalEmbedder(Embedder):
+    """
+    sentence-transformers modelini CPU'da çalıştıran yerel embedder.
+
+    Model ilk kullanımda yüklenir (import ve ağırlık yükleme uygulama
+    açılışını yavaşlatmaz). Tekil sorgular `embed_query` ile bir
+    MicroBatcher'a gider; aynı anda gelen sorgular tek bir ileri geçişte
+    vektörleştirilir. E5 ailesi modellerde görev tipine göre "query: " /
+    "passage: " önekleri eklenir. Vektörler birim uzunluktadır.
+
+    Args:
+        model_id (str): Hugging Face model adı veya yerel dizin.
+        backend (str): torch, torch_int8, onnx veya onnx_int8.
+        threads (int): torch iş parçacığı sayısı; 0 ise değiştirilmez.
+    """
+
+    def __init__(self, model_id=LOCAL_EMBEDDING_MODEL, backend=LOCAL_EMBEDDING_BACKEND,
+                 threads=LOCAL_EMBEDDING_THREADS, max_batch=LOCAL_EMBEDDING_MAX_BATCH,
+                 batch_window=LOCAL_EMBEDDING_BATCH_WINDOW):
+        if backend not in _BACKENDS:
+            raise ValueError(f"Bilinmeyen yerel embedding altyapısı '{backend}' (seçenekler: {', '.join(_BACKENDS)})")
+        self.model_id = model_id
+        self.backend = backend
+        self.threads = threads
+        # Altyapı vektörleri çok az değiştirir; indeks ve sorgu aynı model adını paylaşır.
+        self.model_name = LOCAL_PREFIX + model_id
+        self._model = None
+        self._dimension = None
+        self._load_lock = threading.Lock()
+        self._batcher = MicroBatcher(lambda texts: self.embed_batch(texts, task_type="retrieval_query"),
+                                     max_batch=max_batch, window=batch_window, name="local-embed")
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            # Ağır bağımlılıklar yalnızca yerel altyapı seçildiğinde yüklenir.
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if self.threads:
+                torch.set_num_threads(self.threads)
+            print(f"🧠 Yerel embedding modeli yükleniyor: {self.model_id} ({self.backend})")
+            if self.backend.startswith('onnx'):
+                # optimum[onnxruntime] gerektirir
+                model_kwargs = {'file_name': ONNX_INT8_FILE} if self.backend == 'onnx_int8' else None
+                model = SentenceTransformer(self.model_id, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+            else:
+                model = SentenceTransformer(self.model_id, device='cpu')
+                if self.backend == 'torch_int8':
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+            self._dimension = model.get_sentence_embedding_dimension()
+            self._model = model
+            return model
+
+    @property
+    def dimension(self):
+        if self._dimension is None:
+            self._load()
+        return self._dimension
+
+    def _prefixed(self, texts, task_type):
+        if 'e5' not in self.model_id.lower():
+            return list(texts)
+        prefix = "query: " if task_type == "retrieval_query" else "passage: "
+        return [prefix + text for text in texts]
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        model = self._load()
+        if not texts:
+            return np.zeros((0, self._dimension), dtype='float32')
+        import torch
+        with torch.inference_mode():
+            vectors = model.encode(self._prefixed(texts, task_type), batch_size=LOCAL_EMBEDDING_ENCODE_BATCH,
+                                   normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype='float32')
+
+    def embed_query(self, text):
+        """Tek bir sorguyu mikro-parti üzerinden vektörleştirir."""
+        return self._batcher(text)
+
+    async def embed_query_async(self, text):
+        """embed_query'nin event loop'u bloklamayan karşılığı."""
+        return await self._batcher.call_async(text)
+
+    def warmup(self):
+        """Modeli yükler ve ilk ileri geçişin maliyetini açılışta öder."""
+        self.embed_batch(["warmup"], task_type="retrieval_query")
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_local_embedder(model_name):
+    """
+    Manifest'teki model adına ("local/<model>") karşılık gelen paylaşılan embedder.
+
+    Aynı model süreç boyunca bir kez yüklenir.
+    """
+    model_id = model_name[len(LOCAL_PREFIX):] if model_name.startswith(LOCAL_PREFIX) else model_name
+    with _embedders_lock:
+        embedder = _embedders.get(model_id)
+        if embedder is None:
+            embedder = _embedders[model_id] = LocalEmbedder(model_id)
+        return embedder
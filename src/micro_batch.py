@@ -0,0 +1,101 @@
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Eşzamanlı tekil istekleri tek bir toplu çağrıda birleştiren dinamik mikro-partileyici.
+
+    İlk istek geldiğinde en fazla `window` saniye ya da parti `max_batch`
+    isteğe ulaşana kadar beklenir; toplanan istekler `batch_fn`'e tek
+    seferde verilir ve sonuçlar sırasıyla isteyenlere dağıtılır. Tek başına
+    gelen istek en fazla `window` kadar gecikir; yük altında ise çağrı
+    sayısı parti boyutu kadar azalır.
+
+    Args:
+        batch_fn (callable): İstek listesi alır, aynı sırada sonuç listesi döndürür.
+        max_batch (int): Bir partideki en fazla istek sayısı.
+        window (float): Partinin dolması için beklenecek en uzun süre (saniye).
+        name (str): Arka plan iş parçacığının adı.
+    """
+
+    def __init__(self, batch_fn, max_batch=32, window=0.002, name="micro-batch"):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """
+        İsteği kuyruğa ekler.
+
+        Returns:
+            concurrent.futures.Future: Sonuç hazır olunca tamamlanır.
+        """
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """İsteği gönderir ve sonucu bekler."""
+        return self.submit(item).result()
+
+    async def call_async(self, item):
+        """İsteği gönderir ve sonucu event loop'u bloklamadan bekler."""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # İptal edilmiş istekler partiden çıkarılır.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{len(batch)} istek için {len(results)} sonuç döndü")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Parti sayısı ve ortalama parti boyutu."""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'queued': self._queue.qsize(),
+        }
@@ -0,0 +1,295 @@
+import os
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+from startup import get_genai
+from telemetry import event, approx_tokens
+from retrieval import normalize_rule_id
+
+# 1 ise prompt sabit bir önek (sistem talimatı + sık sorulan kurallar) ve
+# isteğe özel kısa bir sonek olarak ikiye ayrılır; önek model tarafında tutulur.
+PROMPT_CACHE = os.getenv("VEX_PROMPT_CACHE", "1") not in ("0", "false", "False", "")
+# Öneke tam metniyle eklenen, en sık sorulan kurallar (boşsa yalnızca sistem talimatı).
+PROMPT_CACHE_RULES = [rule.strip() for rule in os.getenv("VEX_PROMPT_CACHE_RULES", "SG1,SG2,SG3,R25").split(",")
+                      if rule.strip()]
+# 1 ise önek Gemini'nin önbelleğe alınmış içeriğine (CachedContent) yüklenir;
+# oluşturulamazsa (kütüphane desteklemiyor, önek API'nin alt sınırından kısa ...)
+# önek modelin system_instruction'ı olur.
+PROMPT_CACHE_REMOTE = os.getenv("VEX_PROMPT_CACHE_REMOTE", "1") not in ("0", "false", "False", "")
+# Gemini önbelleğinin ömrü (saniye); süre dolmadan PROMPT_CACHE_REFRESH kala yeniden oluşturulur.
+PROMPT_CACHE_TTL = int(os.getenv("VEX_PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_REFRESH = 60
+# Önbellekli içerik sabit sürümlü model adı ister ("models/gemini-1.5-flash-001").
+PROMPT_CACHE_MODEL = os.getenv("VEX_PROMPT_CACHE_MODEL", "")
+# Aynı anda tutulan önek/model sayısı (ör. farklı indeks bölümü seçimleri)
+PROMPT_CACHE_SLOTS = 4
+
+PREFIX_RULES_HEADER = "\n\nSIK SORULAN KURALLAR (KAYNAK METİNLER'in parçasıdır):\n"
+
+
+class PromptPrefix:
+    """
+    Bir indeks sürümü için değişmeyen prompt öneki.
+
+    Sistem talimatı ve sık sorulan kuralların tam metni; her istekte aynı
+    olduğundan model tarafında bir kere işlenip tekrar kullanılabilir.
+    `rule_keys` öneke giren kurallardır; istek sonekinde bu kurallar tekrar
+    gönderilmez, yalnızca adlarıyla anılır.
+
+    Args:
+        system_prompt (str): Sabit sistem talimatı.
+        rules (list): {'rule_id', 'page_number', 'content', 'shard'?} kural kayıtları.
+    """
+
+    def __init__(self, system_prompt, rules):
+        self.rules = rules
+        sources = []
+        for rule in rules:
+            source = f" ({rule['shard']})" if rule.get('shard') else ""
+            sources.append(f"--- Sayfa {rule['page_number']}, Kural {rule['rule_id']}{source}:\n{rule['content']}\n\n")
+        self.text = system_prompt + (PREFIX_RULES_HEADER + "".join(sources) if sources else "")
+        self.rule_keys = {(rule.get('shard'), normalize_rule_id(rule['rule_id'])) for rule in rules}
+        self.key = hashlib.sha1(self.text.encode('utf-8')).hexdigest()[:16]
+        self.tokens = approx_tokens(self.text)
+
+
+def build_prefix(system_prompt, store, rule_ids=PROMPT_CACHE_RULES):
+    """
+    Sistem talimatı ve indeksteki sık sorulan kurallardan öneki kurar.
+
+    İndekste bulunmayan kurallar atlanır; kurallar ve içerikleri sürüme
+    bağlı olduğundan önek de sürüm başına bir kere kurulur (bkz. GenerationModels).
+    """
+    rules = []
+    for rule_id in rule_ids:
+        rules.extend(store.rule_parents(rule_id))
+    return PromptPrefix(system_prompt, rules)
+
+
+class _Entry:
+    def __init__(self, model, mode, cached_content=None, expires_at=None):
+        self.model = model
+        self.mode = mode
+        self.cached_content = cached_content
+        self.expires_at = expires_at
+
+
+class GenerationModels:
+    """
+    Süreç boyunca yaşayan GenerativeModel nesneleri.
+
+    Önekli istekler için önek başına bir model tutulur: mümkünse önek
+    Gemini'de önbelleğe alınmış içeriktir ('cached' — önek token'ları her
+    istekte yeniden işlenmez ve indirimli faturalanır), değilse modelin
+    system_instruction'ıdır ('system'). Öneksiz istekler tek bir düz
+    modeli ('plain') paylaşır. get_genai() değişirse (ör. benchmark'ta
+    stand-in'e geçiş) modeller yeniden kurulur.
+
+    Gemini önbelleği yalnızca kural içeren önekler için denenir; yalnızca
+    sistem talimatından oluşan önek API'nin alt sınırının altındadır.
+    Başarısız bir deneme önek başına hatırlanır ve TTL dolana kadar
+    tekrarlanmaz. Oluşturma çağrısı kilit dışında yapılır; aynı önek için
+    eşzamanlı istekler tek bir çağrıyı bekler.
+
+    Args:
+        model_name (str): Üretim modeli.
+        cache_model (str): Önbellekli içerik için sürümlü model adı; boşsa "models/<model>-001".
+        remote (bool): Gemini önbelleğini dene.
+        ttl (int): Gemini önbelleğinin ömrü (saniye).
+        slots (int): Tutulan en fazla önek sayısı.
+    """
+
+    def __init__(self, model_name, cache_model=PROMPT_CACHE_MODEL, remote=PROMPT_CACHE_REMOTE,
+                 ttl=PROMPT_CACHE_TTL, slots=PROMPT_CACHE_SLOTS):
+        self.model_name = model_name
+        self.cache_model = cache_model or f"models/{model_name}-001"
+        self.remote = remote
+        self.ttl = ttl
+        self.slots = slots
+        self._genai = None
+        self._plain = None
+        self._entries = OrderedDict()
+        self._prefixes = OrderedDict()
+        # Önek anahtarı -> Gemini önbelleğinin yeniden denenebileceği zaman
+        self._failed = OrderedDict()
+        # Önek anahtarı -> süren oluşturma çağrısının bitişini bildiren Event
+        self._pending = {}
+        self._stats = {'cached': 0, 'system': 0, 'plain': 0, 'remote_created': 0, 'remote_failed': 0}
+        self._lock = threading.Lock()
+
+    def _check_genai(self):
+        genai = get_genai()
+        if genai is not self._genai:
+            self._genai = genai
+            self._plain = None
+            self._entries.clear()
+            self._failed.clear()
+        return genai
+
+    def prefix_for(self, store, system_prompt, rule_ids=PROMPT_CACHE_RULES):
+        """
+        İndeks sürümü için kullanılacak öneki döndürür (sürüm başına bir kere kurulur).
+
+        Sık sorulan kurallar yalnızca önek Gemini önbelleğindeyse öneke
+        girer; önbellek yoksa her istekte faturalanacakları için önek
+        sistem talimatından ibarettir ve kurallar gerektiğinde kaynak
+        metinlerle gelir.
+        """
+        key = (store.version, system_prompt)
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+        if prefix is None:
+            prefix = build_prefix(system_prompt, store, rule_ids)
+            with self._lock:
+                self._prefixes[key] = prefix
+                while len(self._prefixes) > self.slots:
+                    self._prefixes.popitem(last=False)
+        if not prefix.rules or self._cached_entry(prefix) is not None:
+            return prefix
+        with self._lock:
+            system_key = (None, system_prompt)
+            system_prefix = self._prefixes.get(system_key)
+            if system_prefix is None:
+                system_prefix = self._prefixes[system_key] = PromptPrefix(system_prompt, [])
+            return system_prefix
+
+    def model(self, prefix=None):
+        """
+        Önek için uzun ömürlü modeli döndürür; gerekirse oluşturur.
+
+        Gemini önbelleğinin süresi dolmak üzereyse yenisi oluşturulur; eski
+        içerik kendi süresi dolunca silinir (üzerinde süren istekler bozulmaz).
+        Oluşturma bir API çağrısı olabileceğinden asenkron çağıranlar bunu
+        bir iş parçacığında çalıştırmalıdır.
+
+        Returns:
+            tuple: (model, mod: 'cached' | 'system' | 'plain').
+        """
+        if prefix is None:
+            with self._lock:
+                genai = self._check_genai()
+                if self._plain is None:
+                    self._plain = genai.GenerativeModel(self.model_name)
+                self._stats['plain'] += 1
+                return self._plain, 'plain'
+
+        entry = self._cached_entry(prefix) if prefix.rules else None
+        with self._lock:
+            if entry is None:
+                entry = self._system_entry(self._check_genai(), prefix)
+            self._stats[entry.mode] += 1
+            return entry.model, entry.mode
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.slots:
+            self._entries.popitem(last=False)
+
+    def _system_entry(self, genai, prefix):
+        # Yerel karşılık: önek modele bağlı sistem talimatıdır; önbellek
+        # indirimi yoktur ama istek başına model ve prompt kurulmaz.
+        entry = self._entries.get(prefix.key)
+        if entry is None or entry.mode != 'system':
+            entry = _Entry(genai.GenerativeModel(self.model_name, system_instruction=prefix.text), 'system')
+            self._remember(prefix.key, entry)
+        else:
+            self._entries.move_to_end(prefix.key)
+        return entry
+
+    def _cached_entry(self, prefix):
+        """
+        Önekin Gemini önbelleğindeki modelini döndürür; gerekirse oluşturur.
+
+        Returns:
+            _Entry: 'cached' kaydı; önbellek kullanılamıyorsa None.
+        """
+        with self._lock:
+            genai = self._check_genai()
+            entry = self._entries.get(prefix.key)
+            if entry is not None and entry.mode != 'cached':
+                entry = None
+            if entry is not None and time.time() < entry.expires_at:
+                self._entries.move_to_end(prefix.key)
+                return entry
+            caching = getattr(genai, 'caching', None)
+            if (not self.remote or caching is None or not hasattr(genai.GenerativeModel, 'from_cached_content')
+                    or time.time() < self._failed.get(prefix.key, 0)):
+                return None
+            pending = self._pending.get(prefix.key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[prefix.key] = threading.Event()
+            elif entry is not None:
+                # Yenileme sürerken eski içerik hâlâ geçerli (süresinden PROMPT_CACHE_REFRESH önce yenilenir).
+                return entry
+        if not leader:
+            pending.wait()
+            with self._lock:
+                entry = self._entries.get(prefix.key)
+                return entry if entry is not None and entry.mode == 'cached' else None
+
+        entry = None
+        try:
+            entry = self._create(genai, caching, prefix)
+        finally:
+            with self._lock:
+                if genai is self._genai:
+                    if entry is not None:
+                        self._remember(prefix.key, entry)
+                        self._failed.pop(prefix.key, None)
+                    else:
+                        self._failed[prefix.key] = time.time() + self.ttl
+                        while len(self._failed) > self.slots:
+                            self._failed.popitem(last=False)
+                del self._pending[prefix.key]
+            pending.set()
+        return entry
+
+    def _create(self, genai, caching, prefix):
+        try:
+            cached_content = caching.CachedContent.create(
+                model=self.cache_model,
+                display_name=f"vex-prefix-{prefix.key}",
+                system_instruction=prefix.text,
+                ttl=datetime.timedelta(seconds=self.ttl),
+            )
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+        except Exception as e:
+            with self._lock:
+                self._stats['remote_failed'] += 1
+            event('prompt_cache', result='failed', error=type(e).__name__)
+            print(f"⚠️ Gemini önbelleği oluşturulamadı, önek {self.ttl} sn boyunca önbelleksiz gönderilecek: {e}")
+            return None
+        with self._lock:
+            self._stats['remote_created'] += 1
+        event('prompt_cache', result='created', prefix_tokens=prefix.tokens)
+        print(f"🧊 Prompt öneki Gemini önbelleğine alındı (~{prefix.tokens} token, "
+              f"{len(prefix.rules)} kural, {self.ttl} sn)")
+        return _Entry(model, 'cached', cached_content, time.time() + max(self.ttl - PROMPT_CACHE_REFRESH, 1))
+
+    def report_failure(self, prefix, error):
+        """
+        Üretim hatası önbellekli içerikten kaynaklanıyorsa (silinmiş/süresi
+        dolmuş) öneğin modelini düşürür; sonraki deneme yenisini kurar.
+        """
+        if prefix is None:
+            return
+        message = str(error).lower()
+        if type(error).__name__ not in ('NotFound', 'PermissionDenied') and 'cache' not in message:
+            return
+        with self._lock:
+            entry = self._entries.get(prefix.key)
+            if entry is not None and entry.mode == 'cached':
+                del self._entries[prefix.key]
+                event('prompt_cache', result='invalidated', error=type(error).__name__)
+
+    def stats(self):
+        """Mod başına model kullanımı ve Gemini önbelleği oluşturma sayıları."""
+        with self._lock:
+            return {**self._stats, 'prefixes': len(self._entries)}
@@ -1,10 +1,24 @@
-import google.generativeai as genai
-import faiss
 import numpy as np
 import os
 import json
-import re
-from functools import lru_cache
+import time
+import asyncio
+
+from embedding_cache import get_embedding_cache
+from startup import get_genai, run_warmup
+from embedding import embedder_for_model
+from answer_cache import AnswerCache
+from keyword_matcher import KeywordMatcher
+from index_store import VersionedIndexStore
+from sharded_store import ShardedIndexStore, route_query
+from api_guard import embed_guard, generate_guard, backoff_delay, CircuitOpenError
+from telemetry import span, event, annotate, traced, debug, debug_enabled, count, approx_tokens
+from retrieval import extract_rule_ids, normalize_rule_id, reciprocal_rank_fusion, follow_up_query, RRF_K
+from context_builder import assemble_prompt, PROMPT_TOKEN_BUDGET
+from lexical_index import tokenize
+from reranker import get_cross_encoder, score_candidates, top_k
+from rule_hierarchy import REFERENCE_EXPAND_LIMIT
+from prompt_cache import GenerationModels, PROMPT_CACHE
 
 # Türkçe-İngilizce keyword mapping
 TURKISH_ENGLISH_KEYWORDS = {
@@ -76,225 +90,520 @@ TURKISH_ENGLISH_KEYWORDS = {
     'kumanda': 'control'
 }
 
+# Sözlükteki tüm Türkçe terimler için bir kere derlenen eşleştirici
+_TRANSLATION_MATCHER = KeywordMatcher(TURKISH_ENGLISH_KEYWORDS)
+
 def translate_query_keywords(query):
     """
     Türkçe sorguyu İngilizce anahtar kelimelerle zenginleştir
     """
-    query_lower = query.lower()
-    translated_terms = []
-    
-    for turkish, english in TURKISH_ENGLISH_KEYWORDS.items():
-        if turkish in query_lower:
-            translated_terms.append(english)
+    with span('translation') as stage:
+        found = _TRANSLATION_MATCHER.find(query.lower())
+        translated_terms = [english for turkish, english in TURKISH_ENGLISH_KEYWORDS.items() if turkish in found]
+        stage.set(terms=len(translated_terms))
     
     # Orijinal sorgu + İngilizce terimler
     enhanced_query = query + " " + " ".join(translated_terms)
     return enhanced_query
 
-# Proje ana dizininden çalıştırıldığını varsayalım
-script_dir = os.path.dirname(os.path.abspath(__file__))
-chunks_path = os.path.join(script_dir, "..", "data", "processed_chunks.json")
-faiss_index_path = os.path.join(script_dir, "..", "data", "faiss_index.bin")
+EMBEDDING_MODEL = 'models/text-embedding-004'
+
+# Hibrit arama aşamalarının aday sayıları; ortam değişkenleriyle değiştirilebilir.
+RETRIEVAL_DENSE_K = int(os.getenv("VEX_RETRIEVAL_DENSE_K", "30"))  # FAISS adayları
+RETRIEVAL_LEXICAL_K = int(os.getenv("VEX_RETRIEVAL_LEXICAL_K", "30"))  # BM25 adayları
+RETRIEVAL_RRF_K = int(os.getenv("VEX_RETRIEVAL_RRF_K", str(RRF_K)))
+RETRIEVAL_FINAL_K = int(os.getenv("VEX_RETRIEVAL_FINAL_K", "5"))  # Prompt'a giren parça sayısı
+# Devam sorusunda yeni ve önceki turun parçalarından en fazla bu kadarı kullanılır.
+FOLLOW_UP_MAX_CHUNKS = RETRIEVAL_FINAL_K * 2
+
+# FAISS indeksi ve metin parçaları sürümlü depodan okunur. Manifest
+# değiştiğinde yeni sürüm arka planda yüklenip yeni isteklere verilir;
+# süreci yeniden başlatmaya gerek yoktur.
+index_store = VersionedIndexStore()
+
+def load_store():
+    """Aktif indeks sürümünü döndürür, yüklenemediyse None."""
+    return index_store.current()
+
+def get_index_status():
+    """Aktif indeks sürümünü ve yüklenme zamanını döndürür."""
+    return index_store.status()
 
-# API Anahtarını çevre değişkeninden al
-API_KEY = os.getenv("GOOGLE_API_KEY", "your_api_key_here")
-genai.configure(api_key=API_KEY)
+def get_api_status():
+    """Embedding ve üretim API'lerinin devre kesici ve eşzamanlı çağrı durumu."""
+    return {'embed': embed_guard.status(), 'generate': generate_guard.status()}
+
+# Ana indeks ve data/shards/ altındaki ek korpuslar (eski sezonlar, VEX IQ, Q&A ...)
+shard_store = ShardedIndexStore(index_store)
+
+def select_store(query, shards=None):
+    """
+    Sorgunun aranacağı indeks bölümlerini seçer.
+
+    Args:
+        query (str): Kullanıcı sorgusu; bölüm verilmezse sezon/program/belge
+            tipi ipuçlarına göre yönlendirme yapılır.
+        shards (list): Aranacak bölüm adları (opsiyonel).
+
+    Returns:
+        IndexVersion | ShardSnapshot: Seçili bölümlerin aktif sürümleri, yüklenemediyse None.
+    """
+    names = shards or route_query(query, shard_store.corpora())
+    return shard_store.snapshot(names)
+
+def get_shard_status():
+    """Her indeks bölümünün sürüm ve yüklenme bilgisini döndürür."""
+    return shard_store.status()
+
+# Sık sorulan sorular için cevap önbelleği; kayıtlar indeks sürümüne bağlıdır.
+answer_cache = AnswerCache()
+
+def get_prompt_cache_stats():
+    """Üretim modellerinin önek modu (cached/system/plain) kullanım sayaçlarını döndürür."""
+    return generation_models.stats()
+
+def get_answer_cache_stats():
+    """Cevap önbelleğinin isabet/ıskalama sayaçlarını döndürür."""
+    return answer_cache.stats()
 
-# FAISS indeksini ve metin parçalarını bir kere yükle ve önbelleğe al
-@lru_cache(maxsize=1)
 def load_data():
-    try:
-        index = faiss.read_index(faiss_index_path)
-        with open(chunks_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        print("FAISS indeksi ve metin parçaları başarıyla yüklendi.")
-        return index, chunks
-    except Exception as e:
-        print(f"Hata: Veritabanı dosyaları yüklenemedi. Hata: {e}")
+    store = load_store()
+    if store is None:
         return None, None
+    return store.index, store.chunks
+
+def index_embedding_model(store):
+    """İndeksin vektörlerini üreten model; sorgu da bu modelle vektörleştirilmelidir."""
+    return (store.manifest or {}).get('embedding_model', EMBEDDING_MODEL) if store is not None else EMBEDDING_MODEL
+
+def _is_local_model(model):
+    # Gemini modelleri 'models/...' adını taşır; diğerleri süreç içinde çalışır.
+    return not model.startswith('models/')
+
+def embed_query(text, model=EMBEDDING_MODEL):
+    """
+    Sorgu metnini vektörleştirir.
+
+    Gemini modellerinde önce kalıcı embedding önbelleğine bakılır. Yerel
+    modeller (manifest'te 'local/...') süreç içinde, eşzamanlı sorgularla
+    birlikte mikro-partiler halinde çalışır; önbelleğe gerek duymaz.
+
+    Args:
+        text (str): Vektörleştirilecek (zenginleştirilmiş) sorgu.
+        model (str): İndeksin embedding modeli (bkz. index_embedding_model).
+
+    Returns:
+        list | np.ndarray: Sorgu vektörü.
+    """
+    if _is_local_model(model):
+        with span('embedding', chars=len(text), model=model, local=True):
+            return embedder_for_model(model).embed_query(text)
+
+    with span('embedding', chars=len(text), tokens=approx_tokens(text), model=model) as stage:
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = cache.get(model, "retrieval_query", text)
+            event('embedding_cache', hit=cached is not None)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return cached
+
+        # Aynı metin için eşzamanlı istekler tek bir API çağrısını paylaşır.
+        embedding = embed_guard.call(lambda: get_genai().embed_content(
+            model=model,
+            content=text,
+            task_type="retrieval_query"
+        )['embedding'], key=(model, text))
+        stage.set(cache_hit=False)
+
+        if cache is not None:
+            cache.put(model, "retrieval_query", text, embedding)
+        return embedding
+
+async def embed_query_async(text, model=EMBEDDING_MODEL):
+    """embed_query'nin event loop'u bloklamayan karşılığı."""
+    if _is_local_model(model):
+        with span('embedding', chars=len(text), model=model, local=True):
+            return await embedder_for_model(model).embed_query_async(text)
+
+    with span('embedding', chars=len(text), tokens=approx_tokens(text), model=model) as stage:
+        cache = get_embedding_cache()
+        if cache is not None:
+            cached = cache.get(model, "retrieval_query", text)
+            event('embedding_cache', hit=cached is not None)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return cached
+
+        response = await embed_guard.call_async(lambda: get_genai().embed_content_async(
+            model=model,
+            content=text,
+            task_type="retrieval_query"
+        ), key=(model, text))
+        embedding = response['embedding']
+        stage.set(cache_hit=False)
+
+        if cache is not None:
+            cache.put(model, "retrieval_query", text, embedding)
+        return embedding
+
+def _chunk_view(stored):
+    chunk = {'content': stored['content'], 'page_number': stored['page_number'], 'rule_id': stored['rule_id']}
+    if 'shard' in stored:
+        chunk['shard'] = stored['shard']
+    return chunk
+
+def _add_referenced_rules(chunks, store, limit=REFERENCE_EXPAND_LIMIT):
+    """
+    Seçilen kuralların atıf yaptığı kuralları ("see <SG2>") atıf grafiğinden ekler.
+
+    Ek arama yapılmaz; kurallar sürümle birlikte yazılmış tablodan okunur.
+    Eklenen parçalarda 'reference_of' alanı atıf yapan kuralı gösterir.
+    """
+    included = {normalize_rule_id(chunk['rule_id']) for chunk in chunks}
+    added = []
+    for chunk in list(chunks):
+        for reference in store.rule_references(chunk['rule_id']):
+            if len(added) >= limit:
+                return chunks + added
+            if reference in included:
+                continue
+            parents = store.rule_parents(reference)
+            if parents:
+                included.add(reference)
+                added.append({**_chunk_view(parents[0]), 'reference_of': chunk['rule_id']})
+    return chunks + added
+
+def expand_to_rules(store, rows, final_k=RETRIEVAL_FINAL_K):
+    """
+    Sıralı alt parça satırlarını prompt'a girecek kural metinlerine çevirir.
+
+    Aynı kurala ait alt parçalar tek kayıtta birleşir: kısa kurallar
+    tamamen, uzun kurallar yalnızca eşleşen cümle pencereleriyle gelir
+    (RuleHierarchy.merge_children). En fazla final_k kural seçilir, ardından
+    bu kuralların atıf yaptığı kurallar eklenir. Hiyerarşisiz eski
+    sürümlerde parçalar olduğu gibi döner.
+
+    Args:
+        store (IndexVersion | ShardSnapshot): Arama yapılan sürüm.
+        rows (iterable): Alakaya göre sıralı satırlar.
+        final_k (int): En fazla kural sayısı (atıflar hariç).
+
+    Returns:
+        list: {'content', 'page_number', 'rule_id'} parçaları.
+    """
+    groups = {}
+    # Sıralamanın alt kısmındaki alt parçalar seçilmiş kuralları büyütmez; yalnızca
+    # kural sayısı final_k'ya ulaşmadıysa yeni kural getirir.
+    merge_limit = final_k * 2
+    for position, row in enumerate(rows):
+        shard, version, local_row = store.resolve(row)
+        stored = version.chunks[local_row]
+        hierarchy = version.hierarchy
+        parent = stored.get('parent') if hierarchy is not None else None
+        key = (shard, 'rule', parent) if parent is not None else (shard, 'row', local_row)
+        if key not in groups:
+            if len(groups) == final_k:
+                if position >= merge_limit:
+                    break
+                continue
+            groups[key] = (shard, hierarchy, parent, stored, [])
+        elif position >= merge_limit:
+            continue
+        groups[key][4].append(stored.get('span'))
+
+    chunks = []
+    for shard, hierarchy, parent, stored, spans in groups.values():
+        if parent is None:
+            chunk = _chunk_view(stored)
+        else:
+            record = hierarchy.parent(parent)
+            chunk = _chunk_view({**record, 'content': hierarchy.merge_children(parent, spans)})
+        if shard is not None:
+            chunk['shard'] = shard
+        chunks.append(chunk)
+    return _add_referenced_rules(chunks, store)
+
+def lookup_rule_chunks(query, store, k=RETRIEVAL_FINAL_K):
+    """
+    Sorguda geçen kural ID'lerinin (R25, SG3 ...) kurallarını doğrudan tablodan getirir.
+
+    Bir ID indekste varsa embedding ve FAISS araması hiç yapılmaz. Kuralın
+    atıf yaptığı kurallar da atıf grafiğinden eklenir.
+
+    Args:
+        query (str): Kullanıcı sorgusu.
+        store (IndexVersion): Kullanılacak indeks sürümü.
+        k (int): En fazla döndürülecek parça sayısı.
+
+    Returns:
+        list: Kuralların parçaları, sorgudaki sırayla; eşleşme yoksa boş liste.
+    """
+    with span('rule_lookup') as stage:
+        chunks = []
+        for rule_id in extract_rule_ids(query):
+            for parent in store.rule_parents(rule_id):
+                chunks.append(_chunk_view(parent))
+        chunks = _add_referenced_rules(chunks[:k], store) if chunks else []
+        stage.set(hits=len(chunks))
+    if chunks:
+        debug(f"📋 Kural ID'si doğrudan bulundu: {[chunk['rule_id'] for chunk in chunks]}")
+    return chunks
 
-def get_related_chunks(query, k=30):
+def get_related_chunks(query, k=RETRIEVAL_DENSE_K, store=None, query_embedding=None, lexical_k=RETRIEVAL_LEXICAL_K):
     """
     Kullanıcı sorgusuyla en alakalı metin parçalarını ve meta verilerini geri getirir.
-    Daha geniş bir arama havuzundan kelime tabanlı filtreleme yapar.
+
+    Sorguda indekste bulunan bir kural ID'si varsa parçalar doğrudan
+    tablodan döner. Aksi halde FAISS ve BM25 sonuçları reciprocal rank
+    fusion ile birleştirilir ve kelime tabanlı filtreleme yapılır.
     
     Args:
         query (str): Kullanıcı sorgusu.
-        k (int): Geri getirilecek en alakalı parça sayısı.
+        k (int): FAISS'ten alınacak aday sayısı.
+        store (IndexVersion): Kullanılacak indeks sürümü. Verilmezse aktif sürüm.
+        query_embedding (list): Zenginleştirilmiş sorgunun önceden hesaplanmış vektörü.
+        lexical_k (int): BM25'ten alınacak aday sayısı.
         
     Returns:
         list: En alakalı metin parçalarının {'content', 'page_number', 'rule_id'} formatında listesi.
     """
-    index, chunks = load_data()
-    if not index or not chunks:
+    store = store or select_store(query)
+    if store is None or not store.chunks:
         print("HATA: Index veya chunks yüklenemedi!")
         return []
 
-    print(f"\n=== DETAYLI DEBUG BAŞLANGICI ===")
-    print(f"Orijinal sorgu: '{query}'")
-    
-    # Türkçe sorguyu İngilizce terimlerle zenginleştir
-    enhanced_query = translate_query_keywords(query)
-    print(f"Zenginleştirilmiş sorgu: '{enhanced_query}'")
-    print(f"Toplam chunk sayısı: {len(chunks)}")
-    
+    rule_chunks = lookup_rule_chunks(query, store)
+    if rule_chunks:
+        return rule_chunks
+
+    enhanced_query = _start_query_debug(query, store)
+
     # Enhanced query ile sorguyu vektörleştirme
     try:
-        query_embedding = genai.embed_content(
-            model='models/text-embedding-004', 
-            content=enhanced_query,
-            task_type="retrieval_query"
-        )['embedding']
-        query_embedding_np = np.array([query_embedding], dtype='float32')
-        print(f"Query embedding başarıyla oluşturuldu, boyut: {len(query_embedding)}")
+        if query_embedding is None:
+            query_embedding = embed_query(enhanced_query, index_embedding_model(store))
     except Exception as e:
         print(f"HATA: Query embedding oluşturulamadı: {e}")
         # API başarısız olursa, enhanced query ile anahtar kelime araması yap
-        return keyword_only_search(enhanced_query, chunks)
+        return keyword_only_search(enhanced_query, store)
+
+    return search_chunks(query, enhanced_query, query_embedding, store, k, lexical_k)
+
+async def get_related_chunks_async(query, k=RETRIEVAL_DENSE_K, store=None, query_embedding=None,
+                                   lexical_k=RETRIEVAL_LEXICAL_K):
+    """
+    get_related_chunks'ın asenkron karşılığı: embedding çağrısı event loop'u
+    bloklamaz, FAISS araması ve filtreleme bir iş parçacığında çalışır.
+    """
+    store = store or await asyncio.to_thread(select_store, query)
+    if store is None or not store.chunks:
+        print("HATA: Index veya chunks yüklenemedi!")
+        return []
+
+    rule_chunks = lookup_rule_chunks(query, store)
+    if rule_chunks:
+        return rule_chunks
+
+    enhanced_query = _start_query_debug(query, store)
 
-    # FAISS'te en yakın komşuları arama
     try:
-        distances, indices = index.search(query_embedding_np, k)
-        print(f"FAISS arama tamamlandı, {len(indices[0])} sonuç bulundu")
-        print(f"İlk 5 distance: {distances[0][:5]}")
-        print(f"İlk 5 index: {indices[0][:5]}")
+        if query_embedding is None:
+            query_embedding = await embed_query_async(enhanced_query, index_embedding_model(store))
     except Exception as e:
-        print(f"HATA: FAISS arama başarısız: {e}")
-        return keyword_only_search(enhanced_query, chunks)
-    
-    retrieved_chunks = []
-    for i, idx in enumerate(indices[0]):
-        if idx < len(chunks):
-            chunk = {'content': chunks[idx]['content'], 'page_number': chunks[idx]['page_number'], 'rule_id': chunks[idx]['rule_id']}
-            retrieved_chunks.append(chunk)
-            if i < 5:  # İlk 5 chunk'ı debug için göster
-                print(f"Chunk {i}: Sayfa {chunk['page_number']}, Kural {chunk['rule_id']}")
-                print(f"İçerik özeti: {chunk['content'][:200]}...")
-                print("---")
-
-    # Anahtar kelimelerle ikincil filtreleme - daha kapsamlı kelime setleri
-    # Hem orijinal sorgu hem de enhanced query'yi anahtar kelime belirlemede kullan
-    combined_query = (query + " " + enhanced_query).lower()
-    keywords = []
-    
-    # Boyut/ölçü soruları için
-    if any(w in combined_query for w in ['boyut', 'size', 'ölçü', 'limit', 'sınır', 'dimension', 'ölçüler', 'büyüklük', 'dimensions']):
-        keywords.extend(['boyut', 'size', 'ölçü', 'limit', 'sınır', 'dimension', 'dimensions', 'expansion', 'genişleme', 
-                        '18', '22', 'inch', 'inç', 'mm', 'volume', 'hacim', 'cubic', 'kübik'])
-        print("🔍 Boyut sorgusu algılandı")
-        
-    # Ağırlık soruları için  
-    elif any(w in combined_query for w in ['ağırlık', 'weight', 'gram', 'kg', 'kilogram', 'kaç', 'ne kadar']):
-        keywords.extend(['ağırlık', 'weight', 'gram', 'kg', 'kilogram', 'mass', 'kütle', 'block', 'blok', 
-                        '40', 'approximately', 'yaklaşık'])
-        print("⚖️ Ağırlık sorgusu algılandı")
-        
-    # Malzeme/plastik soruları için
-    elif any(w in combined_query for w in ['plastik', 'plastic', 'polikarbonat', 'polycarbonate', 'malzeme', 'material', 'özel', 'custom', 'parça', 'part']):
-        keywords.extend(['plastic', 'plastik', 'polycarbonate', 'polikarbonat', 'material', 'malzeme', 'custom', 'özel', 
-                        'part', 'parça', 'component', 'bileşen', 'allowed', 'izin', 'limited', 'sınırlı', 'amount', 'miktar', 'R25'])
-        print("🧪 Malzeme sorgusu algılandı")
-        
-    # Kural numarası soruları için (R1, R25, SG1 vb.)
-    elif any(re.search(r'\b[RSG]+\d+\b', combined_query) for w in [combined_query]):
-        # Kural numarasını çıkar
-        rule_matches = re.findall(r'\b[RSG]+\d+\b', combined_query.upper())
-        keywords.extend(rule_matches)
-        keywords.extend(['rule', 'kural', 'regulation'])
-        print(f"📋 Kural numarası sorgusu algılandı: {rule_matches}")
-        
-    # Robot soruları için
-    elif 'robot' in combined_query:
-        keywords.extend(['robot', 'robotics', 'competition', 'yarışma'])
-        print("🤖 Robot sorgusu algılandı")
-    
-    # Hem orijinal hem enhanced query'deki kelimeleri anahtar kelimelere ekle
-    combined_words = re.findall(r'\b\w{2,}\b', combined_query)  # 2+ karakter kelimeler
-    keywords.extend(combined_words)
-    
-    # Temel anahtar kelimeler her zaman dahil
-    keywords.extend(["rule", "kural", "regulation", "kural"])
-    
-    # Duplicate'ları kaldır
-    keywords = list(set(keywords))
-    print(f"Anahtar kelimeler: {keywords}")
-
-    filtered_chunks = []
-    for chunk in retrieved_chunks:
-        content_lower = chunk['content'].lower()
-        rule_id_lower = chunk['rule_id'].lower()
-        
-        # Her anahtar kelime için ayrı ayrı kontrol et
-        matched_keywords = []
-        for keyword in keywords:
-            # Daha esnek eşleştirme
-            if (keyword in content_lower or keyword in rule_id_lower or
-                re.search(r'\b' + re.escape(keyword) + r'\b', content_lower) or
-                re.search(r'\b' + re.escape(keyword) + r'\b', rule_id_lower)):
-                matched_keywords.append(keyword)
-        
-        if matched_keywords:
-            chunk['matched_keywords'] = matched_keywords
-            filtered_chunks.append(chunk)
-            print(f"✓ EŞLEŞME: Sayfa {chunk['page_number']}, Kural {chunk['rule_id']}, Kelimeler: {matched_keywords}")
-
-    print(f"Filtreleme sonrası chunk sayısı: {len(filtered_chunks)}")
-
-    # Eğer filtreleme sonucunda parça bulunamazsa, en üstteki 5 taneyi kullan
-    if not filtered_chunks:
-        print("⚠️ Hiç eşleşme bulunamadı, ilk 5 chunk kullanılacak")
-        final_chunks_to_use = retrieved_chunks[:5]
-    else:
-        final_chunks_to_use = filtered_chunks[:5]
+        print(f"HATA: Query embedding oluşturulamadı: {e}")
+        return await asyncio.to_thread(keyword_only_search, enhanced_query, store)
+
+    return await asyncio.to_thread(search_chunks, query, enhanced_query, query_embedding, store, k, lexical_k)
+
+def _start_query_debug(query, store):
+    """Sorguyu zenginleştirir ve (VEX_LOG_LEVEL=DEBUG ise) debug başlığını yazdırır."""
+    debug(f"\n=== DETAYLI DEBUG BAŞLANGICI ===")
+    debug(f"Orijinal sorgu: '{query}'")
     
-    print(f"\n--- FINAL CHUNKS ({len(final_chunks_to_use)} adet) ---")
-    for i, chunk in enumerate(final_chunks_to_use):
-        print(f"{i+1}. Sayfa: {chunk['page_number']}, Kural: {chunk['rule_id']}")
-        if 'matched_keywords' in chunk:
-            print(f"   Eşleşen kelimeler: {chunk['matched_keywords']}")
-        print(f"   İçerik: {chunk['content'][:150]}...")
-        print("")
-    print("=== DETAYLI DEBUG SONU ===\n")
+    # Türkçe sorguyu İngilizce terimlerle zenginleştir
+    enhanced_query = translate_query_keywords(query)
+    debug(f"Zenginleştirilmiş sorgu: '{enhanced_query}'")
+    debug(f"Toplam chunk sayısı: {len(store.chunks)}")
+    return enhanced_query
+
+def search_chunks(query, enhanced_query, query_embedding, store, k=RETRIEVAL_DENSE_K,
+                  lexical_k=RETRIEVAL_LEXICAL_K, rrf_k=RETRIEVAL_RRF_K, final_k=RETRIEVAL_FINAL_K, dense_hits=None):
+    """
+    FAISS ve BM25 adaylarını birleştirir ve yeniden sıralar.
+
+    İki sıralama reciprocal rank fusion ile tek bir aday havuzunda
+    toplanır; böylece kuralın tam terimlerini içeren ama gömme uzayında
+    uzak kalan parçalar da havuza girer. Adaylar yoğun benzerlik, BM25
+    puanı, indeks sırasında hesaplanmış konu kelimesi özellikleri, kural
+    ID eşleşmesi ve (ayarlıysa) cross-encoder puanının ağırlıklı
+    toplamıyla tek bir vektörel geçişte puanlanır; en iyi final_k döner.
+
+    Args:
+        query (str): Orijinal kullanıcı sorgusu.
+        enhanced_query (str): translate_query_keywords çıktısı.
+        query_embedding (list | np.ndarray): Sorgu vektörü.
+        store (IndexVersion): Kullanılacak indeks sürümü.
+        k (int): FAISS'ten alınacak aday sayısı.
+        lexical_k (int): BM25'ten alınacak aday sayısı.
+        rrf_k (int): Reciprocal rank fusion sabiti.
+        final_k (int): Döndürülecek parça sayısı.
+        dense_hits (list): Önceden (ör. toplu aramada search_many ile) bulunmuş
+            FAISS sonuçları; verilirse FAISS araması atlanır.
+
+    Returns:
+        list: En alakalı metin parçaları.
+    """
+    debug(f"Query embedding başarıyla oluşturuldu, boyut: {len(query_embedding)}")
+
+    # FAISS'te en yakın komşuları arama (çok bölümlü depoda tüm bölümlerde paralel)
+    try:
+        if dense_hits is None:
+            with span('faiss_search', k=k) as stage:
+                dense_hits = store.search(query_embedding, k)
+                stage.set(hits=len(dense_hits))
+        debug(f"FAISS arama tamamlandı, {len(dense_hits)} sonuç bulundu")
+        debug(f"İlk 5 skor: {[round(score, 4) for _, score in dense_hits[:5]]}")
+        debug(f"İlk 5 satır: {[row for row, _ in dense_hits[:5]]}")
+    except Exception as e:
+        print(f"HATA: FAISS arama başarısız: {e}")
+        return keyword_only_search(enhanced_query, store)
+
+    with span('lexical_search', k=lexical_k) as stage:
+        lexical_rows = [row for row, _ in store.lexical_index.search(enhanced_query, lexical_k)]
+        stage.set(hits=len(lexical_rows))
+    debug(f"BM25 arama tamamlandı, {len(lexical_rows)} sonuç bulundu")
+
+    # Aday havuzu: iki sıralamanın RRF birleşimi (eşit puanlarda bu sıra korunur).
+    fused = reciprocal_rank_fusion([[row for row, _ in dense_hits], lexical_rows], k=rrf_k)
+    if not fused:
+        return []
+
+    with span('rerank', candidates=len(fused)) as stage:
+        rows = np.array([row for row, _ in fused], dtype='int64')
+        dense_by_row = dict(dense_hits)
+        dense_scores = np.array([dense_by_row.get(row, np.nan) for row in rows.tolist()], dtype='float32')
+        lexical_scores = store.lexical_index.score_rows(enhanced_query, rows)
+        topic_scores, candidate_rule_ids = store.rerank_features.take(rows)
+
+        cross_scores = None
+        cross_encoder = get_cross_encoder()
+        if cross_encoder is not None:
+            cross_scores = cross_encoder.score(query, [store.chunks[row]['content'] for row in rows.tolist()])
+
+        scores, components = score_candidates(query + " " + enhanced_query, topic_scores, candidate_rule_ids,
+                                              dense_scores, lexical_scores, extract_rule_ids(query), cross_scores)
+        # Birden fazla alt parça aynı kurala düşebilir; kurallar seçilene kadar sıralamada ilerlenir.
+        order = top_k(scores, len(scores))
+        stage.set(cross_encoder=cross_scores is not None)
+
+    if debug_enabled():
+        debug(f"\n--- EN İYİ ADAYLAR ---")
+        for i, position in enumerate(order[:final_k].tolist()):
+            chunk = store.chunks[int(rows[position])]
+            debug(f"{i+1}. Sayfa: {chunk['page_number']}, Kural: {chunk['rule_id']}, Puan: {scores[position]:.3f}")
+            debug(f"   Bileşenler: " + ", ".join(f"{name}={values[position]:.2f}" for name, values in components.items()))
+            debug(f"   İçerik: {chunk['content'][:150]}...")
+            debug("")
+
+    with span('rule_expand') as stage:
+        final_chunks_to_use = expand_to_rules(store, rows[order].tolist(), final_k)
+        stage.set(rules=len(final_chunks_to_use),
+                  references=sum(1 for chunk in final_chunks_to_use if 'reference_of' in chunk))
+
+    if debug_enabled():
+        debug(f"--- FINAL CHUNKS ({len(final_chunks_to_use)} adet): "
+              f"{[chunk['rule_id'] for chunk in final_chunks_to_use]} ---")
+        debug("=== DETAYLI DEBUG SONU ===\n")
 
     return final_chunks_to_use
 
-def keyword_only_search(query, chunks):
-    """API başarısız olduğunda sadece anahtar kelime araması yapar."""
+def keyword_only_search(query, store, k=5):
+    """
+    API başarısız olduğunda sadece anahtar kelime araması yapar.
+
+    Sürümle birlikte oluşturulmuş BM25 ters indeksini kullanır; yalnızca
+    sorgu terimlerinin geçtiği parçalara dokunur ve nadir terimleri daha
+    yüksek puanlar. Bulunan alt parçalar normal aramadaki gibi kural
+    metinlerine genişletilir (bkz. expand_to_rules).
+
+    Args:
+        query (str): (Zenginleştirilmiş) kullanıcı sorgusu.
+        store (IndexVersion | ShardSnapshot): Kullanılacak indeks sürümü.
+        k (int): Döndürülecek kural sayısı.
+
+    Returns:
+        list: {'content', 'page_number', 'rule_id'} parçaları, puana göre azalan.
+    """
     print("🔄 API başarısız, anahtar kelime aramasına geçiliyor...")
     
     query_lower = query.lower()
-    keywords = []
+    expansion = []
     
     # Boyut soruları
     if any(w in query_lower for w in ['boyut', 'size', 'ölçü', 'limit', 'sınır']):
-        keywords.extend(['18', '22', 'inch', 'expansion', 'size', 'dimension', 'boyut', 'genişleme'])
+        expansion.extend(['18', '22', 'inch', 'expansion', 'size', 'dimension', 'boyut', 'genişleme'])
         
     # Ağırlık soruları
     elif any(w in query_lower for w in ['ağırlık', 'weight', 'gram']):
-        keywords.extend(['40', 'gram', 'weight', 'block', 'ağırlık'])
-        
-    # Sorgu kelimelerini ekle
-    keywords.extend(re.findall(r'\b\w{2,}\b', query_lower))
-    
-    matching_chunks = []
-    for chunk in chunks:
-        content_lower = chunk['content'].lower()
-        score = 0
-        
-        for keyword in keywords:
-            if keyword in content_lower:
-                score += 1
-                
-        if score > 0:
-            chunk_copy = chunk.copy()
-            chunk_copy['score'] = score
-            matching_chunks.append(chunk_copy)
+        expansion.extend(['40', 'gram', 'weight', 'block', 'ağırlık'])
     
-    # Score'a göre sırala
-    matching_chunks.sort(key=lambda x: x['score'], reverse=True)
+    with span('lexical_fallback', k=k) as stage:
+        # Aynı kurala düşen alt parçalar birleşeceğinden k kural için daha fazla satır alınır.
+        hits = store.lexical_index.search(query + " " + " ".join(expansion), k * 2)
+        matching_chunks = expand_to_rules(store, [row for row, _ in hits], k)
+        stage.set(hits=len(hits), rules=len(matching_chunks))
+    event('lexical_fallback')
     
-    print(f"Anahtar kelime araması: {len(matching_chunks)} chunk bulundu")
-    return matching_chunks[:5]
+    debug(f"Anahtar kelime araması: {len(matching_chunks)} kural bulundu")
+    return matching_chunks
+
+SYSTEM_PROMPT = (
+    "Sen, VEX Robotics 2025-2026 oyunu 'Push Back' konusunda uzman, yardımsever bir yapay zeka asistanısın. "
+    "Amacın, VEX takımlarına oyun kılavuzuyla ilgili sordukları sorulara hızlı ve doğru cevaplar vermektir.\n\n"
+    "Çok önemli: Cevaplarını SADECE sana sunulan 'KAYNAK METİNLER' bölümündeki bilgilere dayanarak, direkt ve doğru bir şekilde oluştur.\n"
+    "Her cevabının sonuna, cevabı aldığın kuralı ve sayfa numarasını **(Kaynak: Sayfa X, Kural Y)** formatında mutlaka ekle.\n"
+    "Eğer sorunun cevabı sana verilen kaynak metinlerde yoksa, şu formatta cevap ver:\n"
+    "'Bu bilgi 2025-2026 Push Back oyun kılavuzunda mevcut değil. Ancak şu benzer bilgiler var: [benzer kural varsa belirt]'\n\n"
+    "Özel durumlar:\n"
+    "- Robot ağırlık sınırı sorulursa: '2025-2026 Push Back oyununda robot ağırlık sınırı belirtilmemiş. Sadece boyut sınırları var.'\n"
+    "- Robot boyut/ölçü sorulursa: SG1, SG2, SG3 kurallarından cevap ver.\n"
+    "- Plastik/malzeme sorulursa: R25 kuralından tam detayları ver. 'A limited amount of custom plastic is allowed' gibi kısa cevaplar verme, mümkünse ek kuralları da belirt.\n"
+    "- Polikarbonat sorulursa: Polycarbonate panels field perimeter decorations için kullanılabilir.\n\n"
+    "Cevaplarında VEX jargonunu kullanmaktan çekinme ve her zaman yardım odaklı, arkadaş canlısı bir dil kullan."
+)
+
+def assemble_rag_prompt(query, related_chunks_with_metadata, history=None, token_budget=PROMPT_TOKEN_BUDGET,
+                        prefix=None, enhanced_query=None):
+    """
+    Gemini modeline gönderilecek prompt'u token bütçesi içinde kurar.
+
+    Tekrar eden parçalar elenir, uzun parçalar sorguyla ilgili cümlelere
+    indirilir, eski sohbet turları özetlenir (bkz. context_builder).
+
+    Args:
+        query (str): Kullanıcı sorgusu.
+        related_chunks_with_metadata (list): En alakalı metin parçalarının ve meta verilerinin listesi.
+        history (list): Sohbet geçmişi (opsiyonel).
+        token_budget (int): Prompt'un en fazla token sayısı.
+        prefix (PromptPrefix): Model tarafında tutulan önek; verilirse yalnızca
+            isteğe özel sonek kurulur ve önekteki kurallar tekrar eklenmez.
+            Sistem talimatının payı bütçeden düşülmeye devam eder, böylece
+            kaynaklara kalan yer önekli ve öneksiz prompt'ta aynıdır.
+        enhanced_query (str): Sorgunun arama sırasında hesaplanmış
+            translate_query_keywords çıktısı; verilmezse yeniden hesaplanır.
+
+    Returns:
+        tuple: (prompt, kullanım bilgisi: token, parça, kırpılan/elenen parça, geçmiş turu sayıları)
+    """
+    query_terms = tokenize(enhanced_query if enhanced_query is not None else translate_query_keywords(query))
+    if prefix is None:
+        return assemble_prompt(SYSTEM_PROMPT, query, related_chunks_with_metadata, history,
+                               query_terms=query_terms, token_budget=token_budget)
+    suffix, usage = assemble_prompt("", query, related_chunks_with_metadata, history, query_terms=query_terms,
+                                    token_budget=token_budget - approx_tokens(SYSTEM_PROMPT),
+                                    cached_rules=prefix.rule_keys)
+    return suffix.lstrip(), usage
 
 def create_rag_prompt(query, related_chunks_with_metadata, history=None):
     """
@@ -308,97 +617,428 @@ def create_rag_prompt(query, related_chunks_with_metadata, history=None):
     Returns:
         str: Gemini'ye gönderilecek prompt.
     """
-    
-    system_prompt = (
-        "Sen, VEX Robotics 2025-2026 oyunu 'Push Back' konusunda uzman, yardımsever bir yapay zeka asistanısın. "
-        "Amacın, VEX takımlarına oyun kılavuzuyla ilgili sordukları sorulara hızlı ve doğru cevaplar vermektir.\n\n"
-        "Çok önemli: Cevaplarını SADECE sana sunulan 'KAYNAK METİNLER' bölümündeki bilgilere dayanarak, direkt ve doğru bir şekilde oluştur.\n"
-        "Her cevabının sonuna, cevabı aldığın kuralı ve sayfa numarasını **(Kaynak: Sayfa X, Kural Y)** formatında mutlaka ekle.\n"
-        "Eğer sorunun cevabı sana verilen kaynak metinlerde yoksa, şu formatta cevap ver:\n"
-        "'Bu bilgi 2025-2026 Push Back oyun kılavuzunda mevcut değil. Ancak şu benzer bilgiler var: [benzer kural varsa belirt]'\n\n"
-        "Özel durumlar:\n"
-        "- Robot ağırlık sınırı sorulursa: '2025-2026 Push Back oyununda robot ağırlık sınırı belirtilmemiş. Sadece boyut sınırları var.'\n"
-        "- Robot boyut/ölçü sorulursa: SG1, SG2, SG3 kurallarından cevap ver.\n"
-        "- Plastik/malzeme sorulursa: R25 kuralından tam detayları ver. 'A limited amount of custom plastic is allowed' gibi kısa cevaplar verme, mümkünse ek kuralları da belirt.\n"
-        "- Polikarbonat sorulursa: Polycarbonate panels field perimeter decorations için kullanılabilir.\n\n"
-        "Cevaplarında VEX jargonunu kullanmaktan çekinme ve her zaman yardım odaklı, arkadaş canlısı bir dil kullan."
+    final_prompt, _ = assemble_rag_prompt(query, related_chunks_with_metadata, history)
+    return final_prompt
+
+GENERATION_MODEL = 'gemini-1.5-flash'
+GENERATION_MAX_RETRIES = 3
+
+# Üretim modelleri süreç boyunca paylaşılır; sabit önek (sistem talimatı +
+# sık sorulan kurallar) model tarafında tutulur (bkz. prompt_cache).
+generation_models = GenerationModels(GENERATION_MODEL)
+
+def _prompt_prefix(store):
+    """İndeks sürümünün sabit prompt önekini döndürür; önek kapalıysa None."""
+    if not PROMPT_CACHE:
+        return None
+    return generation_models.prefix_for(store, SYSTEM_PROMPT)
+
+def _generation_config():
+    return get_genai().types.GenerationConfig(
+        temperature=0.1,  # Daha tutarlı cevaplar için
+        max_output_tokens=1000,
     )
-    
-    # RAG ile bulunan ilgili kuralları prompt'a ekliyoruz, meta verileriyle birlikte.
-    context = "\n\nKAYNAK METİNLER:\n"
-    for chunk in related_chunks_with_metadata:
-        context += f"--- Sayfa {chunk['page_number']}, Kural {chunk['rule_id']}:\n{chunk['content']}\n\n"
-    
-    # Sohbet geçmişini ekliyoruz
-    history_str = ""
-    if history:
-        for turn in history:
-            history_str += f"\nKullanıcı: {turn['user']}\nAsistan: {turn['model']}\n"
-    
-    final_prompt = f"{system_prompt}{history_str}{context}\n\nKullanıcı: {query}\nAsistan:"
-    
+
+def _build_prompt(query, chunks, history=None, prefix=None, enhanced_query=None):
+    """
+    Prompt'u 'prompt_build' aşaması olarak kurar; kullanılan token ve parça sayılarını kaydeder.
+
+    Önek verilirse dönen metin yalnızca isteğe özel sonektir.
+    """
+    with span('prompt_build', candidates=len(chunks)) as stage:
+        final_prompt, usage = assemble_rag_prompt(query, chunks, history, prefix=prefix, enhanced_query=enhanced_query)
+        stage.set(chars=len(final_prompt), **usage)
+        if prefix is not None:
+            stage.set(prefix_tokens=prefix.tokens)
+    count("vex_prompt_chars_total", len(final_prompt))
+    count("vex_prompt_tokens_total", usage['tokens'])
+    debug(f"\n🤖 Gemini'ye gönderilen prompt: {len(final_prompt)} karakter, ~{usage['tokens']}/{usage['budget']} token, "
+          f"{usage['chunks']} parça ({usage['chunks_trimmed']} kırpıldı, {usage['chunks_deduped']} tekrar elendi)")
     return final_prompt
 
-def get_answer_from_gemini(query):
+def _record_usage(stage, response, prompt, answer, prefix=None, mode='plain'):
+    """
+    Üretim aşamasına token sayılarını ekler.
+
+    Gemini cevabındaki usage_metadata varsa gerçek sayılar, yoksa karakter
+    sayısından tahmin kullanılır. Önek modelde tutulsa da her istekte
+    girdiye sayılır; 'cached' token'lar önbellekten gelen (indirimli) kısımdır.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prefix_tokens = prefix.tokens if prefix is not None else 0
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or approx_tokens(prompt) + prefix_tokens
+    cached_tokens = getattr(usage, 'cached_content_token_count', None)
+    if cached_tokens is None:
+        cached_tokens = prefix_tokens if mode == 'cached' else 0
+    output_tokens = getattr(usage, 'candidates_token_count', None) or approx_tokens(answer)
+    stage.set(prompt_tokens=prompt_tokens, cached_tokens=cached_tokens, output_tokens=output_tokens,
+              output_chars=len(answer))
+    count("vex_generation_tokens_total", prompt_tokens, kind="prompt")
+    count("vex_generation_tokens_total", cached_tokens, kind="cached")
+    count("vex_generation_tokens_total", output_tokens, kind="output")
+
+def _merge_follow_up_chunks(chunks, previous_chunks, limit=FOLLOW_UP_MAX_CHUNKS):
+    """Devam sorusunda yeni parçaların ardına önceki turun parçalarını tekrarsız ekler."""
+    seen = {(chunk.get('shard'), chunk['rule_id'], chunk['page_number']) for chunk in chunks}
+    merged = list(chunks)
+    for chunk in previous_chunks:
+        if len(merged) >= limit:
+            break
+        key = (chunk.get('shard'), chunk['rule_id'], chunk['page_number'])
+        if key not in seen:
+            seen.add(key)
+            merged.append(chunk)
+    return merged
+
+def _session_context(query, session):
+    """
+    Oturumdan geçmişi ve devam sorusu bilgisini çıkarır.
+
+    Returns:
+        tuple: (geçmiş, arama sorgusu, önceki turun parçaları); devam sorusu
+        değilse arama sorgusu sorgunun kendisidir ve parça listesi boştur.
+    """
+    if session is None:
+        return None, query, []
+    retrieval_query = follow_up_query(query, session.last_query)
+    if retrieval_query is None:
+        return session.history(), query, []
+    event('follow_up', reused_chunks=len(session.last_chunks))
+    return session.history(), retrieval_query, session.last_chunks
+
+def generate_answer(query, chunks, store, history=None, query_embedding=None, cache_answer=True, enhanced_query=None):
+    """
+    Seçilmiş parçalardan Gemini ile cevap üretir (yeniden deneme ve yedek cevapla).
+
+    get_answer_from_gemini'nin arama sonrası kısmıdır; toplu cevaplama
+    (batch_qa) aramayı toplu yaptıktan sonra her soru için bunu çağırır.
+
+    Args:
+        query (str): Kullanıcı sorgusu.
+        chunks (list): Prompt'a girecek parçalar (boş olmamalı).
+        store (IndexVersion | ShardSnapshot): Parçaların geldiği sürüm.
+        history (list): Sohbet geçmişi (opsiyonel).
+        query_embedding (list): Anlamsal cevap önbelleği için sorgu vektörü (opsiyonel).
+        cache_answer (bool): Üretilen cevabı cevap önbelleğine ekle.
+        enhanced_query (str): Sorgunun zenginleştirilmiş hali (opsiyonel; bkz. assemble_rag_prompt).
+
+    Returns:
+        str: Üretilen cevap; API başarısız olursa yedek cevap.
+    """
+    prefix = _prompt_prefix(store)
+    final_prompt = _build_prompt(query, chunks, history, prefix, enhanced_query)
+
+    # Timeout ve retry ile API çağrısı
+    max_retries = GENERATION_MAX_RETRIES
+
+    for attempt in range(max_retries):
+        try:
+            debug(f"🔄 Gemini API çağrısı (deneme {attempt + 1}/{max_retries})...")
+
+            model, mode = generation_models.model(prefix)
+            with span('generation', attempt=attempt + 1, prefix=mode) as stage:
+                # Aynı prompt için eşzamanlı istekler tek bir üretim çağrısını paylaşır.
+                response = generate_guard.call(lambda: model.generate_content(
+                    final_prompt,
+                    generation_config=_generation_config()
+                ), key=(GENERATION_MODEL, prefix.key if prefix else None, final_prompt))
+                answer = response.text if response else ""
+                if answer:
+                    _record_usage(stage, response, final_prompt, answer, prefix, mode)
+
+            if answer:
+                debug("✅ Gemini API başarılı!")
+                if cache_answer:
+                    answer_cache.put(query, store.version, answer, query_embedding)
+                annotate(outcome='generated', attempts=attempt + 1)
+                return answer
+            else:
+                print("⚠️ Gemini boş cevap döndü")
+
+        except CircuitOpenError:
+            # API art arda hata veriyor; denemeleri harcamadan yedek cevaba geç.
+            print("🚧 Gemini devre kesicisi açık, yedek cevap veriliyor")
+            annotate(outcome='fallback', attempts=attempt, circuit_open=True)
+            return create_fallback_response(query, chunks)
+        except Exception as e:
+            print(f"❌ Gemini API hatası (deneme {attempt + 1}): {e}")
+            generation_models.report_failure(prefix, e)
+            if attempt < max_retries - 1:
+                wait_time = backoff_delay(attempt)
+                event('generation_retry', attempt=attempt + 1, wait_seconds=round(wait_time, 3))
+                print(f"⏳ {wait_time:.1f} saniye bekleniyor...")
+                time.sleep(wait_time)
+            else:
+                # Son deneme başarısız olursa, fallback cevabı ver
+                annotate(outcome='fallback', attempts=max_retries)
+                return create_fallback_response(query, chunks)
+
+    annotate(outcome='fallback', attempts=max_retries)
+    return create_fallback_response(query, chunks)
+
+def _lookup_request_rules(query, retrieval_query, store):
+    """
+    İsteğin kural ID'si aramasını bir kere yapar.
+
+    Devam sorusunda sorunun kendisinde ID yoksa önceki soruyla birleşmiş
+    arama sorgusundaki ID'lere bakılır (get_related_chunks'ın davranışı).
+    """
+    chunks = lookup_rule_chunks(query, store)
+    if not chunks and retrieval_query != query:
+        chunks = lookup_rule_chunks(retrieval_query, store)
+    return chunks
+
+@traced('answer')
+def get_answer_from_gemini(query, shards=None, session=None):
     """
     Kullanıcı sorgusuna RAG mimarisiyle cevap üretir.
     
     Args:
         query (str): Kullanıcı sorgusu.
+        shards (list): Aranacak indeks bölümleri; verilmezse sorguya göre seçilir.
+        session (Session): Sohbet oturumu (opsiyonel). Geçmiş prompt'a eklenir;
+            devam sorularında arama önceki sorgu ve parçalar üzerine kurulur.
+            Soru/cevap turunu oturuma eklemek çağıranın işidir (add_turn).
         
     Returns:
         str: Gemini modelinden gelen cevap.
     """
-    if not load_data()[0] or not load_data()[1]:
+    history, retrieval_query, previous_chunks = _session_context(query, session)
+    follow_up = retrieval_query != query
+
+    # İstek boyunca aynı sürüm kullanılır; bu sırada yeni bir sürüm devreye
+    # girse bile cevap tutarlı bir indeks/parça çiftinden üretilir.
+    store = select_store(retrieval_query, shards)
+    if store is None or not store.chunks:
+        annotate(outcome='no_store')
         return "Üzgünüm, RAG veritabanı yüklenemedi. Lütfen sistem yöneticinizle iletişime geçin."
+    annotate(index_version=store.version, query_chars=len(query), follow_up=follow_up)
+
+    # Devam sorularının cevabı önceki tura bağlıdır; önbellekten verilmez.
+    cached_answer = None if follow_up else answer_cache.lookup_exact(query, store.version)
+    if cached_answer is not None:
+        event('answer_cache', result='exact')
+        annotate(outcome='cache_exact')
+        debug("⚡ Cevap önbellekten döndü (birebir eşleşme)")
+        return cached_answer
 
     try:
-        related_chunks_with_metadata = get_related_chunks(query)
+        # Kural ID'si doğrudan bulunursa embedding çağrısına gerek kalmaz.
+        related_chunks_with_metadata = _lookup_request_rules(query, retrieval_query, store)
+        query_embedding = None
+        enhanced_query = None
+        if not related_chunks_with_metadata:
+            # Sorgu vektörü hem anlamsal önbellek hem de FAISS araması için kullanılır.
+            # Kural araması ve çeviri burada bir kere yapılır; search_chunks bunları tekrarlamaz.
+            enhanced_query = _start_query_debug(retrieval_query, store)
+            embedding_failed = False
+            try:
+                query_embedding = embed_query(enhanced_query, index_embedding_model(store))
+            except Exception as e:
+                print(f"HATA: Query embedding oluşturulamadı: {e}")
+                embedding_failed = True
+
+            cached_answer = None if follow_up else answer_cache.lookup_similar(query, query_embedding, store.version)
+            if cached_answer is not None:
+                event('answer_cache', result='semantic')
+                annotate(outcome='cache_semantic')
+                debug("⚡ Cevap önbellekten döndü (anlamsal eşleşme)")
+                return cached_answer
+            event('answer_cache', result='miss')
+
+            if embedding_failed:
+                # Korumalı çağrı (yeniden deneme/devre kesici) zaten başarısız oldu;
+                # get_related_chunks'ın aynı çağrıyı tekrarlamasına gerek yok.
+                related_chunks_with_metadata = keyword_only_search(enhanced_query, store)
+            else:
+                related_chunks_with_metadata = search_chunks(retrieval_query, enhanced_query, query_embedding, store)
+        else:
+            event('answer_cache', result='miss')
+
+        if previous_chunks:
+            related_chunks_with_metadata = _merge_follow_up_chunks(related_chunks_with_metadata, previous_chunks)
+        if session is not None and related_chunks_with_metadata:
+            session.remember_retrieval(retrieval_query, related_chunks_with_metadata)
         
         if not related_chunks_with_metadata:
+            annotate(outcome='no_chunks')
             return "Üzgünüm, sorgunuzla ilgili bilgi bulunamadı. Lütfen farklı kelimelerle tekrar deneyin."
         
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        final_prompt = create_rag_prompt(query, related_chunks_with_metadata)
-        
-        print(f"\n🤖 Gemini'ye gönderilen prompt uzunluğu: {len(final_prompt)} karakter")
-        
-        # Timeout ve retry ile API çağrısı
-        import time
-        max_retries = 3
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"🔄 Gemini API çağrısı (deneme {attempt + 1}/{max_retries})...")
-                
-                response = model.generate_content(
-                    final_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.1,  # Daha tutarlı cevaplar için
-                        max_output_tokens=1000,
-                    )
-                )
-                
-                if response and response.text:
-                    print("✅ Gemini API başarılı!")
-                    return response.text
-                else:
-                    print("⚠️ Gemini boş cevap döndü")
-                    
-            except Exception as e:
-                print(f"❌ Gemini API hatası (deneme {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # 2, 4, 6 saniye bekle
-                    print(f"⏳ {wait_time} saniye bekleniyor...")
-                    time.sleep(wait_time)
-                else:
-                    # Son deneme başarısız olursa, fallback cevabı ver
-                    return create_fallback_response(query, related_chunks_with_metadata)
+        # Devam sorusunda prompt terimleri arama sorgusundan değil, sorunun kendisinden gelir.
+        return generate_answer(query, related_chunks_with_metadata, store, history, query_embedding,
+                               cache_answer=not follow_up, enhanced_query=None if follow_up else enhanced_query)
                     
     except Exception as e:
         print(f"❌ Genel hata: {e}")
+        annotate(outcome='error')
         return f"Üzgünüm, cevap oluşturulurken bir hata oluştu: {e}"
 
+def _response_text(response):
+    """Akıştaki bir parçanın metnini döndürür; metin içermeyen parçalar için boş dize."""
+    try:
+        return response.text
+    except ValueError:
+        return ""
+
+async def _generation_stream(model, prompt):
+    """Gemini akışını parça parça döndüren üreteç (generate_guard.stream kaynağı)."""
+    response = await model.generate_content_async(
+        prompt,
+        generation_config=_generation_config(),
+        stream=True,
+    )
+    async for part in response:
+        yield part
+
+@traced('answer_stream')
+async def stream_answer_from_gemini(query, shards=None, session=None):
+    """
+    get_answer_from_gemini'nin asenkron, akışlı karşılığı.
+
+    Embedding ve üretim çağrıları event loop'u bloklamaz, tekrar denemeler
+    `asyncio.sleep` ile bekler. Gemini'nin ürettiği metin geldikçe
+    parça parça döndürülür; ilk token yaklaşık olarak arama süresi kadar
+    sonra gelir.
+
+    Args:
+        query (str): Kullanıcı sorgusu.
+        shards (list): Aranacak indeks bölümleri; verilmezse sorguya göre seçilir.
+        session (Session): Sohbet oturumu (opsiyonel); bkz. get_answer_from_gemini.
+
+    Yields:
+        str: Cevabın bir sonraki metin parçası.
+    """
+    history, retrieval_query, previous_chunks = _session_context(query, session)
+    follow_up = retrieval_query != query
+
+    store = await asyncio.to_thread(select_store, retrieval_query, shards)
+    if store is None or not store.chunks:
+        annotate(outcome='no_store')
+        yield "Üzgünüm, RAG veritabanı yüklenemedi. Lütfen sistem yöneticinizle iletişime geçin."
+        return
+    annotate(index_version=store.version, query_chars=len(query), follow_up=follow_up)
+
+    # Devam sorularının cevabı önceki tura bağlıdır; önbellekten verilmez.
+    cached_answer = None if follow_up else answer_cache.lookup_exact(query, store.version)
+    if cached_answer is not None:
+        event('answer_cache', result='exact')
+        annotate(outcome='cache_exact')
+        debug("⚡ Cevap önbellekten döndü (birebir eşleşme)")
+        yield cached_answer
+        return
+
+    try:
+        # Kural ID'si doğrudan bulunursa embedding çağrısına gerek kalmaz.
+        related_chunks_with_metadata = _lookup_request_rules(query, retrieval_query, store)
+        query_embedding = None
+        enhanced_query = None
+        if not related_chunks_with_metadata:
+            enhanced_query = _start_query_debug(retrieval_query, store)
+            embedding_failed = False
+            try:
+                query_embedding = await embed_query_async(enhanced_query, index_embedding_model(store))
+            except Exception as e:
+                print(f"HATA: Query embedding oluşturulamadı: {e}")
+                embedding_failed = True
+
+            cached_answer = None if follow_up else answer_cache.lookup_similar(query, query_embedding, store.version)
+            if cached_answer is not None:
+                event('answer_cache', result='semantic')
+                annotate(outcome='cache_semantic')
+                debug("⚡ Cevap önbellekten döndü (anlamsal eşleşme)")
+                yield cached_answer
+                return
+            event('answer_cache', result='miss')
+
+            if embedding_failed:
+                related_chunks_with_metadata = await asyncio.to_thread(keyword_only_search, enhanced_query, store)
+            else:
+                related_chunks_with_metadata = await asyncio.to_thread(
+                    search_chunks, retrieval_query, enhanced_query, query_embedding, store)
+        else:
+            event('answer_cache', result='miss')
+
+        if previous_chunks:
+            related_chunks_with_metadata = _merge_follow_up_chunks(related_chunks_with_metadata, previous_chunks)
+        if session is not None and related_chunks_with_metadata:
+            session.remember_retrieval(retrieval_query, related_chunks_with_metadata)
+    except Exception as e:
+        print(f"❌ Genel hata: {e}")
+        annotate(outcome='error')
+        yield f"Üzgünüm, cevap oluşturulurken bir hata oluştu: {e}"
+        return
+
+    if not related_chunks_with_metadata:
+        annotate(outcome='no_chunks')
+        yield "Üzgünüm, sorgunuzla ilgili bilgi bulunamadı. Lütfen farklı kelimelerle tekrar deneyin."
+        return
+
+    # Önek önbelleğini oluşturmak/yenilemek bir API çağrısıdır; event loop
+    # bloklanmasın diye önek ve model iş parçacığında çözülür.
+    prefix = await asyncio.to_thread(_prompt_prefix, store)
+    final_prompt = _build_prompt(query, related_chunks_with_metadata, history, prefix,
+                                 None if follow_up else enhanced_query)
+
+    max_retries = GENERATION_MAX_RETRIES
+    for attempt in range(max_retries):
+        emitted = []
+        try:
+            debug(f"🔄 Gemini API akışı (deneme {attempt + 1}/{max_retries})...")
+            # Akışta aşama süresi ilk parçadan son parçaya kadar ölçülür;
+            # kullanıcıya bekleme süresi (yield) de dahildir.
+            model, mode = await asyncio.to_thread(generation_models.model, prefix)
+            with span('generation', attempt=attempt + 1, stream=True, prefix=mode) as stage:
+                # Aynı prompt için eşzamanlı akışlar tek bir API akışını paylaşır.
+                last_part = None
+                async for part in generate_guard.stream(lambda: _generation_stream(model, final_prompt),
+                                                        key=(GENERATION_MODEL, prefix.key if prefix else None,
+                                                             final_prompt)):
+                    last_part = part
+                    text = _response_text(part)
+                    if text:
+                        if not emitted:
+                            stage.set(first_token_ms=round((time.perf_counter() - stage.start) * 1000, 3))
+                        emitted.append(text)
+                        yield text
+                if emitted:
+                    _record_usage(stage, last_part, final_prompt, "".join(emitted), prefix, mode)
+            if emitted:
+                debug("✅ Gemini API akışı tamamlandı!")
+                if not follow_up:
+                    answer_cache.put(query, store.version, "".join(emitted), query_embedding)
+                annotate(outcome='generated', attempts=attempt + 1)
+                return
+            print("⚠️ Gemini boş cevap döndü")
+        except CircuitOpenError:
+            print("🚧 Gemini devre kesicisi açık, yedek cevap veriliyor")
+            annotate(outcome='fallback', attempts=attempt, circuit_open=True)
+            yield create_fallback_response(query, related_chunks_with_metadata)
+            return
+        except Exception as e:
+            print(f"❌ Gemini API hatası (deneme {attempt + 1}): {e}")
+            generation_models.report_failure(prefix, e)
+            if emitted:
+                # Cevabın bir kısmı kullanıcıya ulaştı; yeniden denemek metni çiftler.
+                annotate(outcome='interrupted', attempts=attempt + 1)
+                yield "\n\n⚠️ Cevap yarıda kesildi, lütfen tekrar deneyin."
+                return
+            if attempt < max_retries - 1:
+                wait_time = backoff_delay(attempt)
+                event('generation_retry', attempt=attempt + 1, wait_seconds=round(wait_time, 3))
+                print(f"⏳ {wait_time:.1f} saniye bekleniyor...")
+                await asyncio.sleep(wait_time)
+
+    # Tüm denemeler başarısız olursa fallback cevabı ver
+    annotate(outcome='fallback', attempts=max_retries)
+    yield create_fallback_response(query, related_chunks_with_metadata)
+
+async def get_answer_from_gemini_async(query, shards=None, session=None):
+    """stream_answer_from_gemini çıktısını tek bir cevap metni olarak döndürür."""
+    parts = []
+    async for text in stream_answer_from_gemini(query, shards, session):
+        parts.append(text)
+    return "".join(parts)
+
 def create_fallback_response(query, chunks):
     """API başarısız olduğunda basit cevap oluşturur."""
     
@@ -429,6 +1069,110 @@ def create_fallback_response(query, chunks):
     # Genel fallback
     return "API bağlantı sorunu nedeniyle tam cevap oluşturulamadı. Lütfen tekrar deneyin."
 
+# Isınmadaki örnek arama; gerçek bir sorgu gibi tüm aşamalardan geçer.
+WARMUP_QUERY = os.getenv("VEX_WARMUP_QUERY", "Robot boyut sınırı nedir?")
+# 1 ise ısınmada Gemini embedding API'sine gerçek bir istek atılır (kota harcar);
+# aksi halde örnek arama rastgele bir vektörle yapılır. Yerel modeller her zaman ısınır.
+WARMUP_EMBED = os.getenv("VEX_WARMUP_EMBED", "0") == "1"
+# batch_qa.py çıktısı; verilirse ısınmada cevap önbelleğine yüklenir (turnuva öncesi SSS cevapları).
+PRECOMPUTED_ANSWERS_PATH = os.getenv("VEX_PRECOMPUTED_ANSWERS", "")
+
+def preload_answers(path=PRECOMPUTED_ANSWERS_PATH):
+    """
+    Toplu cevaplama (batch_qa) sonuçlarını cevap önbelleğine yükler.
+
+    Yalnızca üretilmiş ('generated') ve sorunun bugün yönlendirileceği
+    indeks sürümüyle hesaplanmış cevaplar alınır; kılavuz değiştiyse eski
+    cevaplar atlanır. Sorgu vektörü embedding önbelleğinde varsa kayıt
+    anlamsal eşleşmede de kullanılır.
+
+    Returns:
+        int: Yüklenen cevap sayısı.
+    """
+    if not path:
+        return 0
+    cache = get_embedding_cache()
+    loaded = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('outcome') != 'generated' or not record.get('answer'):
+                continue
+            store = select_store(record['question'])
+            if store is None or store.version != record.get('index_version'):
+                continue
+            embedding = None
+            model = index_embedding_model(store)
+            if cache is not None and not _is_local_model(model):
+                embedding = cache.get(model, "retrieval_query", translate_query_keywords(record['question']))
+            answer_cache.put(record['question'], store.version, record['answer'], embedding)
+            loaded += 1
+    print(f"📚 {loaded} önceden üretilmiş cevap önbelleğe yüklendi ({path})")
+    return loaded
+
+def warmup():
+    """
+    Sunucu sağlıklı raporlanmadan önce ilk isteğin ödeyeceği maliyetleri öder.
+
+    Adımlar: indeks sürümünü ve ek bölümleri yükleme, BM25/yeniden sıralama
+    özelliklerini ve kural tablosunu hazırlama, API istemcilerini (Gemini,
+    yerel embedder/cross-encoder) açma ve örnek bir arama çalıştırma.
+    Süreler startup.warmup_timings'e ve vex_startup_seconds metriğine yazılır.
+
+    Returns:
+        dict: Adım adı -> {'seconds', 'ok', 'error'?}.
+    """
+    def load_index():
+        if index_store.current() is None:
+            raise RuntimeError(index_store.status().get('last_error') or "indeks yüklenemedi")
+        for name in shard_store.names():
+            shard_store.snapshot([name])
+
+    def load_metadata():
+        store = load_store()
+        store.lexical_index
+        store.rerank_features
+        store.rows_for_rule('R1')
+
+    def open_clients():
+        store = load_store()
+        model = index_embedding_model(store)
+        if _is_local_model(model):
+            embedder = embedder_for_model(model)
+            if hasattr(embedder, 'warmup'):
+                embedder.warmup()
+        else:
+            get_genai()
+            get_embedding_cache()
+        # Üretim modeli ve (açıksa) Gemini önbelleğindeki önek ilk istekten önce kurulur.
+        generation_models.model(_prompt_prefix(store))
+        cross_encoder = get_cross_encoder()
+        if cross_encoder is not None:
+            cross_encoder.score(WARMUP_QUERY, [WARMUP_QUERY])
+
+    def sample_search():
+        store = load_store()
+        enhanced_query = translate_query_keywords(WARMUP_QUERY)
+        model = index_embedding_model(store)
+        if _is_local_model(model) or WARMUP_EMBED:
+            query_embedding = embed_query(enhanced_query, model)
+        else:
+            query_embedding = np.random.default_rng(0).standard_normal(store.index.d).astype('float32')
+        search_chunks(WARMUP_QUERY, enhanced_query, query_embedding, store)
+
+    steps = [
+        ('index', load_index),
+        ('metadata', load_metadata),
+        ('clients', open_clients),
+        ('search', sample_search),
+    ]
+    if PRECOMPUTED_ANSWERS_PATH:
+        steps.append(('answers', preload_answers))
+    return run_warmup(steps)
+
 def answer_question(query):
     """
     Soru cevaplama için ana fonksiyon wrapper'ı
@@ -0,0 +1,223 @@
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from keyword_matcher import KeywordMatcher
+from lexical_index import normalize_text
+from retrieval import normalize_rule_id
+
+# Aday puanı = ağırlıklı toplam. Her bileşen aday kümesi içinde [0, 1]
+# aralığına ölçeklenir; ağırlıklar bu yüzden doğrudan karşılaştırılabilir.
+RERANK_DENSE_WEIGHT = float(os.getenv("VEX_RERANK_DENSE_WEIGHT", "1.0"))
+RERANK_LEXICAL_WEIGHT = float(os.getenv("VEX_RERANK_LEXICAL_WEIGHT", "0.6"))
+RERANK_TOPIC_WEIGHT = float(os.getenv("VEX_RERANK_TOPIC_WEIGHT", "0.3"))
+RERANK_RULE_BOOST = float(os.getenv("VEX_RERANK_RULE_BOOST", "0.5"))
+# İsteğe bağlı yerel cross-encoder (ör. "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1");
+# boşsa kullanılmaz. sentence-transformers gerektirir.
+RERANK_CROSS_ENCODER = os.getenv("VEX_RERANK_CROSS_ENCODER", "")
+RERANK_CROSS_WEIGHT = float(os.getenv("VEX_RERANK_CROSS_WEIGHT", "1.0"))
+
+# Bir konunun bu kadar kelimesini içeren parça o konu için tam puan alır.
+TOPIC_SATURATION = 3
+
+# Sorgu konuları: (ad, sorguda konuyu belirleyen kelimeler, parçada aranan kelimeler).
+# Parça tarafı indeks oluşturulurken bir kere hesaplanır.
+QUERY_TOPICS = (
+    ('size',
+     ('boyut', 'size', 'ölçü', 'limit', 'sınır', 'dimension', 'ölçüler', 'büyüklük', 'dimensions'),
+     ('boyut', 'size', 'ölçü', 'limit', 'sınır', 'dimension', 'dimensions', 'expansion', 'genişleme',
+      '18', '22', 'inch', 'inç', 'mm', 'volume', 'hacim', 'cubic', 'kübik')),
+    ('weight',
+     ('ağırlık', 'weight', 'gram', 'kg', 'kilogram', 'kaç', 'ne kadar'),
+     ('ağırlık', 'weight', 'gram', 'kg', 'kilogram', 'mass', 'kütle', 'block', 'blok',
+      '40', 'approximately', 'yaklaşık')),
+    ('material',
+     ('plastik', 'plastic', 'polikarbonat', 'polycarbonate', 'malzeme', 'material', 'özel', 'custom', 'parça', 'part'),
+     ('plastic', 'plastik', 'polycarbonate', 'polikarbonat', 'material', 'malzeme', 'custom', 'özel',
+      'part', 'parça', 'component', 'bileşen', 'allowed', 'izin', 'limited', 'sınırlı', 'amount', 'miktar', 'r25')),
+    ('robot',
+     ('robot',),
+     ('robot', 'robotics', 'competition', 'yarışma')),
+)
+TOPIC_NAMES = tuple(name for name, _, _ in QUERY_TOPICS)
+
+
+def _normalized_keywords(keywords):
+    return tuple(dict.fromkeys(normalize_text(keyword) for keyword in keywords))
+
+
+_TOPIC_TRIGGERS = [_normalized_keywords(triggers) for _, triggers, _ in QUERY_TOPICS]
+_TOPIC_MATCHERS = [KeywordMatcher(_normalized_keywords(keywords)) for _, _, keywords in QUERY_TOPICS]
+# Konu tanımları değişirse diskteki özellikler geçersiz sayılır ve yeniden hesaplanır.
+TOPIC_SIGNATURE = hashlib.sha1(repr(QUERY_TOPICS).encode('utf-8')).hexdigest()[:16]
+
+
+def query_topic_vector(text):
+    """
+    Sorgunun hangi konulara ait olduğunu gösteren 0/1 vektörü.
+
+    Returns:
+        np.ndarray: len(QUERY_TOPICS) uzunluğunda float32 dizi.
+    """
+    text = normalize_text(text)
+    return np.array([any(trigger in text for trigger in triggers) for triggers in _TOPIC_TRIGGERS],
+                    dtype='float32')
+
+
+class RerankFeatures:
+    """
+    Yeniden sıralamada kullanılan, sorgudan bağımsız parça özellikleri.
+
+    Her satır için konu kelimesi puanları (satır x konu matrisi) ve
+    normalize edilmiş rule_id tutulur. İndeks sürümüyle birlikte bir
+    kere hesaplanıp .npz olarak yazılır; sorgu sırasında adayların
+    satırları tek bir dizi indekslemesiyle okunur.
+
+    Args:
+        topic_scores (np.ndarray): (satır, konu) float32 matrisi, [0, 1].
+        rule_ids (np.ndarray): Satırların normalize kural ID'leri (str).
+        signature (str): Özelliklerin hesaplandığı konu tanımlarının özeti.
+    """
+
+    def __init__(self, topic_scores, rule_ids, signature=TOPIC_SIGNATURE):
+        self.topic_scores = np.asarray(topic_scores, dtype='float32')
+        self.rule_ids = np.asarray(rule_ids, dtype=str)
+        self.signature = signature
+
+    def __len__(self):
+        return len(self.rule_ids)
+
+    @classmethod
+    def build(cls, chunks):
+        """
+        Parça listesinden özellikleri hesaplar.
+
+        Args:
+            chunks (iterable): {'content', 'rule_id'} alanlı parçalar, satır sırasıyla.
+        """
+        topic_rows = []
+        rule_ids = []
+        for chunk in chunks:
+            rule_id = chunk.get('rule_id', '')
+            text = normalize_text(chunk['content']) + '\x00' + normalize_text(rule_id)
+            topic_rows.append([min(len(matcher.find(text)), TOPIC_SATURATION) for matcher in _TOPIC_MATCHERS])
+            rule_ids.append(normalize_rule_id(rule_id))
+        topic_scores = np.array(topic_rows, dtype='float32').reshape(-1, len(QUERY_TOPICS)) / TOPIC_SATURATION
+        return cls(topic_scores, np.array(rule_ids, dtype=str))
+
+    def take(self, rows):
+        """
+        Verilen satırların özellikleri.
+
+        Returns:
+            tuple: (konu puanları (len(rows), konu), kural ID'leri).
+        """
+        return self.topic_scores[rows], self.rule_ids[rows]
+
+    def save(self, path):
+        """Özellikleri sıkıştırılmamış .npz olarak yazar (pickle kullanmadan)."""
+        with open(path, 'wb') as f:
+            np.savez(f, topic_scores=self.topic_scores, rule_ids=self.rule_ids,
+                     signature=np.array(self.signature))
+
+    @classmethod
+    def load(cls, path):
+        """save ile yazılmış özellikleri yükler."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['topic_scores'], data['rule_ids'], signature=str(data['signature']))
+
+
+class CrossEncoderScorer:
+    """
+    (sorgu, parça) çiftlerini tek partide puanlayan yerel cross-encoder.
+
+    Model ilk kullanımda yüklenir. Çıktılar sigmoid ile [0, 1] aralığına çevrilir.
+
+    Args:
+        model_id (str): Hugging Face model adı veya yerel dizin.
+    """
+
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                print(f"🧠 Cross-encoder yükleniyor: {self.model_id}")
+                self._model = CrossEncoder(self.model_id, device='cpu')
+            return self._model
+
+    def score(self, query, contents):
+        if not contents:
+            return np.zeros(0, dtype='float32')
+        logits = self._load().predict([(query, content) for content in contents], show_progress_bar=False)
+        return (1.0 / (1.0 + np.exp(-np.asarray(logits, dtype='float32')))).astype('float32')
+
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    """VEX_RERANK_CROSS_ENCODER ayarlıysa paylaşılan cross-encoder, değilse None."""
+    global _cross_encoder
+    if not RERANK_CROSS_ENCODER:
+        return None
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            _cross_encoder = CrossEncoderScorer(RERANK_CROSS_ENCODER)
+        return _cross_encoder
+
+
+def _min_max(values):
+    """Değerleri [0, 1] aralığına ölçekler; eksik (NaN) değerler 0 olur."""
+    values = np.asarray(values, dtype='float32')
+    present = ~np.isnan(values)
+    if not present.any():
+        return np.zeros(len(values), dtype='float32')
+    low = values[present].min()
+    span = values[present].max() - low
+    scaled = (values - low) / span if span > 0 else np.ones(len(values), dtype='float32')
+    return np.where(present, scaled, 0.0).astype('float32')
+
+
+def score_candidates(query_text, topic_scores, candidate_rule_ids, dense_scores, lexical_scores,
+                     query_rule_ids=(), cross_scores=None):
+    """
+    Adayların birleşik puanlarını tek bir vektörel geçişte hesaplar.
+
+    Args:
+        query_text (str): Konu tespiti için sorgu (orijinal + zenginleştirilmiş).
+        topic_scores (np.ndarray): Adayların konu puanları (RerankFeatures.take).
+        candidate_rule_ids (np.ndarray): Adayların normalize kural ID'leri.
+        dense_scores (np.ndarray): FAISS benzerlikleri; FAISS'ten gelmeyen adaylar için NaN.
+        lexical_scores (np.ndarray): BM25 puanları.
+        query_rule_ids (iterable): Sorguda geçen normalize kural ID'leri.
+        cross_scores (np.ndarray): Cross-encoder puanları, yoksa None.
+
+    Returns:
+        tuple: (toplam puanlar, bileşen adı -> puan dizisi).
+    """
+    components = {
+        'dense': _min_max(dense_scores),
+        'lexical': _min_max(lexical_scores),
+        'topic': topic_scores @ query_topic_vector(query_text),
+        'rule': np.isin(candidate_rule_ids, list(query_rule_ids)).astype('float32'),
+    }
+    total = (RERANK_DENSE_WEIGHT * components['dense'] + RERANK_LEXICAL_WEIGHT * components['lexical']
+             + RERANK_TOPIC_WEIGHT * components['topic'] + RERANK_RULE_BOOST * components['rule'])
+    if cross_scores is not None:
+        components['cross'] = np.asarray(cross_scores, dtype='float32')
+        total = total + RERANK_CROSS_WEIGHT * components['cross']
+    return total, components
+
+
+def top_k(scores, k):
+    """En yüksek k puanın konumları, azalan; eşitlikte aday sırası korunur."""
+    return np.argsort(-scores, kind='stable')[:k]
@@ -0,0 +1,102 @@
+import re
+
+# Sorgudaki kural numaraları: "R25", "sg3", "<GG17>" gibi.
+_RULE_ID_PATTERN = re.compile(r'<?\b([A-Za-z]{1,5}\d+)\b>?')
+
+# Devam sorusu belirteçleri: "peki otonomda?", "what about autonomous?".
+# Genel İngilizce kelimeler (it, this, then, and ...) tek başına belirteç değildir.
+_FOLLOW_UP_PATTERN = re.compile(
+    r'^\s*(?:peki|ya|yani|o\s+zaman|ayrıca|bunun|bunda|onun|onda|bu\s+durumda|aynı|'
+    r'what\s+about|how\s+about|what\s+if|also|same)\b',
+    re.IGNORECASE)
+# Bundan uzun ya da kendi kural ID'si veya konu kelimesi olan sorgular tek
+# başına aranabilir; devam sorusu sayılmaz ("ya otonomda?", "neden?" sayılır).
+FOLLOW_UP_MAX_WORDS = 3
+# Önceki arama sorgusundan alınan en fazla kelime; art arda devam sorularında
+# sorgu büyümez, en yeni turların kelimeleri (sorgunun başı) kalır.
+FOLLOW_UP_CONTEXT_WORDS = 16
+
+# Reciprocal rank fusion sabiti; büyük değerler alt sıraların etkisini artırır.
+RRF_K = 60
+
+
+def normalize_rule_id(rule_id):
+    """'<SG3>', 'sg3' ve 'SG3' biçimlerini 'SG3' olarak normalize eder."""
+    return rule_id.strip().strip('<>').strip().upper()
+
+
+def extract_rule_ids(query):
+    """
+    Sorguda geçen kural ID adaylarını sırasıyla ve tekrarsız döndürür.
+
+    Adayların gerçekten bir kural olup olmadığını indeksteki kural tablosu
+    belirler; "V5" gibi eşleşmeyen adaylar yok sayılır.
+    """
+    seen = []
+    for candidate in _RULE_ID_PATTERN.findall(query):
+        rule_id = normalize_rule_id(candidate)
+        if rule_id not in seen:
+            seen.append(rule_id)
+    return seen
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Birden fazla sıralamayı reciprocal rank fusion ile birleştirir.
+
+    Her sıralamadaki r. eleman 1 / (k + r) puan alır; puanlar toplanır.
+    Farklı ölçeklerdeki skorları (L2 mesafesi, BM25) normalize etmeye gerek
+    kalmadan birleştirmeyi sağlar.
+
+    Args:
+        rankings (list): Her biri en iyiden kötüye sıralı anahtar listesi.
+        k (int): RRF sabiti.
+
+    Returns:
+        list: (anahtar, birleşik puan) çiftleri, puana göre azalan.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def is_follow_up(query):
+    """
+    Sorgunun önceki soruya dayanan bir devam sorusu olup olmadığını tahmin eder.
+
+    Yalnızca kendi başına aranamayacak sorgular devam sorusudur: en fazla
+    FOLLOW_UP_MAX_WORDS kelime (baştaki "peki", "ya", "what about" gibi
+    belirteç hariç), kural ID'si ve konu kelimesi (boyut, ağırlık, malzeme
+    ...) yok. "R25?", "robot ağırlığı?" veya "Aynı takım iki robot
+    kullanabilir mi?" kendi başına aranır; "peki otonomda?" ve "neden?"
+    önceki soruya bağlanır.
+    """
+    if extract_rule_ids(query):
+        return False
+    words = query.split()
+    cue = _FOLLOW_UP_PATTERN.match(query)
+    if cue:
+        words = query[cue.end():].split()
+    if len(words) > FOLLOW_UP_MAX_WORDS:
+        return False
+    # reranker bu modülü import ettiği için konu tablosu burada yüklenir.
+    from reranker import query_topic_vector
+    return not query_topic_vector(query).any()
+
+
+def follow_up_query(query, previous_query):
+    """
+    Devam sorusunu önceki arama sorgusuyla birleştirir.
+
+    Önceki sorgudaki kural ID'leri çıkarılır; aksi halde kural tablosu
+    aynı kuralı yeniden döndürür ve arama yeni konuya genişlemez.
+
+    Returns:
+        str: Arama için kullanılacak sorgu; devam sorusu değilse None.
+    """
+    if not previous_query or not is_follow_up(query):
+        return None
+    previous_terms = " ".join(_RULE_ID_PATTERN.sub(" ", previous_query).split()[:FOLLOW_UP_CONTEXT_WORDS])
+    return f"{query} {previous_terms}".strip()
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+
+from context_builder import split_sentences
+from retrieval import normalize_rule_id
+
+# Kurallar cümle pencerelerinden oluşan alt parçalara bölünerek vektörleştirilir;
+# 0 ise her kural tek parça kalır (eski davranış).
+CHILD_CHUNKS = os.getenv("VEX_CHILD_CHUNKS", "1") not in ("0", "false", "False", "")
+# Bir alt parçanın en fazla karakter sayısı (en az bir cümle içerir). Ardışık
+# pencereler bir cümle örtüşür; bu boydan kısa kurallar bölünmez.
+CHILD_WINDOW_CHARS = int(os.getenv("VEX_CHILD_WINDOW_CHARS", "400"))
+# Eşleşen alt parçanın kuralı bundan kısaysa prompt'a kuralın tamamı girer;
+# daha uzun kurallarda yalnızca eşleşen pencereler gönderilir.
+PARENT_EXPAND_MAX_CHARS = int(os.getenv("VEX_PARENT_EXPAND_MAX_CHARS", "1200"))
+# Seçilen kuralların atıfta bulunduğu ("see <SG2>") en fazla kaç kural eklenir.
+REFERENCE_EXPAND_LIMIT = int(os.getenv("VEX_REFERENCE_EXPAND_LIMIT", "2"))
+
+# Kural metnindeki atıflar: "<SG2>", "< R25 >", "<GG17a>"
+_REFERENCE_PATTERN = re.compile(r'<\s*([A-Z]{1,5}\d+[a-z]?)\s*>')
+
+
+def sentence_windows(content, max_chars=CHILD_WINDOW_CHARS):
+    """
+    Metni ardışık cümle pencerelerine böler.
+
+    Her pencere en az bir cümle içerir ve (tek cümle daha uzun değilse)
+    `max_chars`'ı aşmaz; bir sonraki pencere öncekinin son cümlesiyle
+    başlar, böylece bir cümlenin bağlamı pencere sınırında kaybolmaz.
+
+    Returns:
+        list: (başlangıç cümlesi, bitiş cümlesi hariç) aralıkları.
+    """
+    sentences = split_sentences(content)
+    if not sentences:
+        return []
+    spans = []
+    start = 0
+    while True:
+        end = start + 1
+        length = len(sentences[start])
+        while end < len(sentences) and length + 1 + len(sentences[end]) <= max_chars:
+            length += 1 + len(sentences[end])
+            end += 1
+        spans.append((start, end))
+        if end >= len(sentences):
+            return spans
+        # Tek cümlelik pencerede örtüşme ilerlemeyi durdururdu.
+        start = end - 1 if end - start > 1 else end
+
+
+def extract_references(content, rule_id=''):
+    """Kural metninde atıf yapılan diğer kural ID'leri (sırasıyla, tekrarsız, normalize)."""
+    own = normalize_rule_id(rule_id)
+    references = []
+    for candidate in _REFERENCE_PATTERN.findall(content):
+        reference = normalize_rule_id(candidate)
+        if reference != own and reference not in references:
+            references.append(reference)
+    return references
+
+
+class RuleHierarchy:
+    """
+    Kural (ebeveyn) tablosu ve kurallar arası atıf grafiği.
+
+    İndeksteki parçalar kuralların alt parçalarıdır; her alt parçanın
+    'parent' alanı bu tablodaki kuralın sırasını, 'span' alanı kural
+    içindeki cümle aralığını gösterir. Atıf grafiği indeks oluşturulurken
+    bir kere hesaplanır; sorgu sırasında genişletme sözlük okumasıdır.
+
+    Args:
+        parents (list): {'rule_id', 'page_number', 'content'} kural kayıtları.
+        references (dict): Normalize kural ID'si -> atıf yapılan kural ID'leri.
+    """
+
+    def __init__(self, parents, references):
+        self.parents = parents
+        self.references = references
+        self._rule_parents = {}
+        for position, parent in enumerate(parents):
+            rule_id = normalize_rule_id(parent.get('rule_id', ''))
+            if rule_id:
+                self._rule_parents.setdefault(rule_id, []).append(position)
+
+    @classmethod
+    def build(cls, chunks, child_chunks=CHILD_CHUNKS, max_chars=CHILD_WINDOW_CHARS):
+        """
+        Kural parçalarından alt parçaları ve hiyerarşiyi oluşturur.
+
+        Args:
+            chunks (list): Ayrıştırılmış kurallar ({'page_number', 'rule_id', 'content', ...}).
+            child_chunks (bool): Kuralları cümle pencerelerine böl.
+            max_chars (int): Alt parça başına en fazla karakter.
+
+        Returns:
+            tuple: (vektörleştirilecek alt parçalar, RuleHierarchy).
+        """
+        parents = []
+        references = {}
+        children = []
+        for position, chunk in enumerate(chunks):
+            parent = {key: chunk[key] for key in ('rule_id', 'page_number', 'content') if key in chunk}
+            parents.append(parent)
+            rule_id = normalize_rule_id(chunk.get('rule_id', ''))
+            chunk_references = extract_references(chunk['content'], rule_id)
+            if rule_id and chunk_references:
+                merged = references.setdefault(rule_id, [])
+                merged.extend(reference for reference in chunk_references if reference not in merged)
+
+            spans = sentence_windows(chunk['content'], max_chars) if child_chunks else []
+            if len(spans) <= 1 or len(chunk['content']) <= max_chars:
+                children.append({**chunk, 'parent': position})
+                continue
+            sentences = split_sentences(chunk['content'])
+            for start, end in spans:
+                children.append({**chunk, 'content': " ".join(sentences[start:end]),
+                                 'parent': position, 'span': [start, end]})
+        return children, cls(parents, references)
+
+    def parent(self, position):
+        return self.parents[position]
+
+    def parents_for_rule(self, rule_id):
+        """Kural ID'sine ait kural kayıtları (bir kural birden fazla yerde geçebilir)."""
+        return [self.parents[position] for position in self._rule_parents.get(normalize_rule_id(rule_id), [])]
+
+    def referenced_rules(self, rule_id):
+        """Kuralın atıf yaptığı ve tabloda bulunan kurallar."""
+        return [reference for reference in self.references.get(normalize_rule_id(rule_id), [])
+                if reference in self._rule_parents]
+
+    def merge_children(self, position, spans):
+        """
+        Aynı kuralın eşleşen alt parçalarını kural sırasıyla tek metinde birleştirir.
+
+        Kural kısaysa (PARENT_EXPAND_MAX_CHARS) ya da alt parçalar kuralın
+        tamamını kapsıyorsa kuralın kendisi döner; aradaki atlanan
+        cümleler "…" ile gösterilir.
+
+        Args:
+            position (int): Kuralın tablodaki sırası.
+            spans (list): Alt parçaların [başlangıç, bitiş) cümle aralıkları; None kuralın tamamıdır.
+        """
+        content = self.parents[position]['content']
+        if len(content) <= PARENT_EXPAND_MAX_CHARS or any(span is None for span in spans):
+            return content
+        sentences = split_sentences(content)
+        selected = sorted({index for start, end in spans for index in range(start, min(end, len(sentences)))})
+        if len(selected) == len(sentences):
+            return content
+        parts = []
+        previous = None
+        for index in selected:
+            if previous is not None and index != previous + 1:
+                parts.append("…")
+            parts.append(sentences[index])
+            previous = index
+        if selected and selected[0] > 0:
+            # Kuralın ilk cümlesi (başlık/tanım) bağlam için her zaman eklenir.
+            parts = [sentences[0], "…"] + parts if selected[0] > 1 else [sentences[0]] + parts
+        return " ".join(parts)
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'parents': self.parents, 'references': self.references}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['parents'], data['references'])
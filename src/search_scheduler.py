@@ -0,0 +1,149 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from micro_batch import MicroBatcher
+
+# Eşzamanlı sorgu vektörleri bu pencere içinde (veya parti dolunca) tek bir
+# FAISS aramasında birleştirilir. 0 pencere/1 parti ile her istek ayrı aranır.
+SEARCH_BATCHING = os.getenv("VEX_SEARCH_BATCHING", "1") not in ("0", "false", "False", "")
+SEARCH_BATCH_WINDOW = float(os.getenv("VEX_SEARCH_BATCH_WINDOW_MS", "1")) / 1000
+SEARCH_MAX_BATCH = int(os.getenv("VEX_SEARCH_MAX_BATCH", "32"))
+# FAISS'in OpenMP iş parçacığı sayısı; 0 ise FAISS varsayılanı (tüm çekirdekler).
+# Çok iş parçacıklı sunucuda istekler aynı anda arama yaparken çekirdekleri
+# paylaşır; partileme açıkken aramayı tek iş parçacığı yürütür.
+FAISS_OMP_THREADS = int(os.getenv("VEX_FAISS_OMP_THREADS", "0"))
+# Düz indekslerde FAISS bu sayıdan az sorguyu BLAS'sız (sorgu sorgu) tarar;
+# sürümüne göre varsayılan eşik çok yüksek olabilir. Partileme açıkken
+# eşik düşürülür ki birleşik aramalar tek bir matris çarpımıyla yapılsın.
+FAISS_BLAS_THRESHOLD = int(os.getenv("VEX_FAISS_BLAS_THRESHOLD", "16"))
+# Bir partide farklı sürümlere (ör. indeks bölümlerine) ait gruplar bu kadar
+# iş parçacığında aynı anda aranır; FAISS arama sırasında GIL'i bırakır.
+SEARCH_GROUP_WORKERS = int(os.getenv("VEX_SEARCH_GROUP_WORKERS", "8"))
+
+
+class SearchScheduler:
+    """
+    Eşzamanlı tekil FAISS aramalarını toplu aramalara dönüştüren zamanlayıcı.
+
+    İstekler (indeks sürümü, sorgu vektörü, k) olarak bir MicroBatcher'a
+    gider. Her partide istekler sürüme göre gruplanır ve her grup için tek
+    bir `search_many` çağrısı (FAISS'in toplu BLAS yolu) yapılır; sonuçlar
+    isteyenlere kendi k değerlerine göre kırpılarak dağıtılır. Tüm sürümler
+    tek bir partileyiciyi paylaşır; sıcak yeniden yüklemede eski sürümler
+    için iş parçacığı kalmaz. Birden fazla grup içeren partilerde (bölümlere
+    paralel dağıtılan aramalar) gruplar bir havuzda aynı anda aranır.
+
+    Başka arama yokken gelen istek kuyruğa girmeden çağıranın iş
+    parçacığında aranır; düşük yükte partileme penceresi ve iş parçacığı
+    geçişi gecikmeye eklenmez.
+
+    Args:
+        max_batch (int): Bir partideki en fazla sorgu sayısı.
+        window (float): Partinin dolması için beklenecek en uzun süre (saniye).
+        max_workers (int): Grupları aynı anda arayan iş parçacığı sayısı.
+    """
+
+    def __init__(self, max_batch=SEARCH_MAX_BATCH, window=SEARCH_BATCH_WINDOW, max_workers=SEARCH_GROUP_WORKERS):
+        self._batcher = MicroBatcher(self._run_batch, max_batch=max_batch, window=window, name="faiss-search")
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="faiss-group")
+        self._lock = threading.Lock()
+        self._active = 0
+        self.direct = 0
+
+    def _search_group(self, version, vectors, k):
+        try:
+            return version.search_many(vectors, k)
+        except Exception as e:
+            # Bir sürümün hatası diğer sürümlerin isteklerini etkilemez.
+            return e
+
+    def _run_batch(self, requests):
+        groups = {}
+        for position, (version, vector, k) in enumerate(requests):
+            groups.setdefault(id(version), (version, []))[1].append(position)
+
+        calls = []
+        for version, positions in groups.values():
+            k = max(requests[position][2] for position in positions)
+            calls.append((version, [requests[position][1] for position in positions], k))
+        if len(calls) == 1:
+            outcomes = [self._search_group(*calls[0])]
+        else:
+            outcomes = [future.result() for future in [self._executor.submit(self._search_group, *call) for call in calls]]
+
+        results = [None] * len(requests)
+        for (_, positions), hits in zip(groups.values(), outcomes):
+            if isinstance(hits, Exception):
+                for position in positions:
+                    results[position] = hits
+                continue
+            for position, query_hits in zip(positions, hits):
+                results[position] = query_hits[:requests[position][2]]
+        return results
+
+    def search(self, version, query_embedding, k):
+        """
+        Sorguyu bir sonraki partiye ekler ve sonucunu bekler; başka arama
+        yoksa doğrudan arar.
+
+        Returns:
+            list: (satır, skor) çiftleri, skora göre azalan.
+        """
+        with self._lock:
+            self._active += 1
+            direct = self._active == 1
+            if direct:
+                self.direct += 1
+        try:
+            if direct:
+                return version.search_many([query_embedding], k)[0]
+            result = self._batcher((version, query_embedding, k))
+        finally:
+            with self._lock:
+                self._active -= 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stats(self):
+        """Partileyici istatistikleri ve kuyruğa girmeden aranan istek sayısı."""
+        return {**self._batcher.stats(), 'direct': self.direct}
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_search_scheduler():
+    """Süreç genelinde paylaşılan zamanlayıcı; partileme kapalıysa None."""
+    global _default_scheduler
+    if not SEARCH_BATCHING:
+        return None
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = SearchScheduler()
+        return _default_scheduler
+
+
+_faiss_configured = False
+
+
+def configure_faiss(threads=FAISS_OMP_THREADS, blas_threshold=FAISS_BLAS_THRESHOLD):
+    """
+    FAISS'in süreç geneli ayarlarını uygular: OpenMP iş parçacığı sayısı
+    (VEX_FAISS_OMP_THREADS) ve partileme açıkken BLAS eşiği.
+
+    İlk indeks sürümü kurulurken bir kere çağrılır (bkz. IndexVersion);
+    modülü import etmek süreç ayarlarını değiştirmez.
+    """
+    global _faiss_configured
+    if _faiss_configured:
+        return
+    _faiss_configured = True
+    import faiss
+
+    if threads:
+        faiss.omp_set_num_threads(threads)
+    if SEARCH_BATCHING and blas_threshold:
+        faiss.cvar.distance_compute_blas_threshold = blas_threshold
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+# Varsayılan ayarlar; ortam değişkenleriyle değiştirilebilir.
+SESSION_MAX_TURNS = int(os.getenv("VEX_SESSION_MAX_TURNS", "10"))
+SESSION_IDLE_TTL = float(os.getenv("VEX_SESSION_IDLE_TTL", "1800"))  # 30 dakika
+SESSION_MAX_SESSIONS = int(os.getenv("VEX_SESSION_MAX_SESSIONS", "1000"))
+# Boş değilse oturumlar bu SQLite dosyasında da tutulur (yeniden başlatmada korunur).
+SESSION_DB_PATH = os.getenv("VEX_SESSION_DB", "")
+
+
+class Session:
+    """
+    Tek bir sohbet oturumunun sınırlı belleği.
+
+    Son `max_turns` tur halka tamponda tutulur; en eskisi otomatik düşer.
+    Ayrıca son turda getirilen parçalar ve o turun arama sorgusu saklanır;
+    devam soruları aramayı bunların üzerine kurar.
+
+    Args:
+        session_id (str): Oturum anahtarı (Gradio session_hash).
+        max_turns (int): Tutulacak en fazla tur sayısı.
+    """
+
+    def __init__(self, session_id, max_turns=SESSION_MAX_TURNS):
+        self.session_id = session_id
+        self.turns = deque(maxlen=max_turns)
+        self.last_query = None
+        self.last_chunks = []
+        self.last_active = time.time()
+        self._store = None
+
+    def history(self):
+        """create_rag_prompt'un beklediği biçimde geçmiş: [{'user', 'model'}], eskiden yeniye."""
+        return list(self.turns)
+
+    def remember_retrieval(self, query, chunks):
+        """Bu turda kullanılan arama sorgusunu ve parçaları saklar."""
+        self.last_query = query
+        self.last_chunks = [dict(chunk) for chunk in chunks]
+        if self._store is not None:
+            self._store._save_retrieval(self)
+
+    def add_turn(self, user, model):
+        """Tamamlanan bir soru/cevap turunu ekler."""
+        turn = {'user': user, 'model': model}
+        self.turns.append(turn)
+        self.last_active = time.time()
+        if self._store is not None:
+            self._store._save_turn(self, turn)
+
+
+class SessionStore:
+    """
+    Oturum anahtarına göre Session nesneleri tutan sınırlı depo.
+
+    `SESSION_IDLE_TTL` süresince kullanılmayan oturumlar silinir; oturum
+    sayısı `SESSION_MAX_SESSIONS`'ı aşarsa en uzun süredir kullanılmayan
+    düşer. `db_path` verilirse turlar ve son parçalar SQLite'a da yazılır;
+    bellekten düşen bir oturum tekrar geldiğinde diskten yüklenir.
+
+    Args:
+        max_turns (int): Oturum başına tur sayısı.
+        idle_ttl (float): Boşta kalma süresi sınırı (saniye).
+        max_sessions (int): Bellekteki en fazla oturum sayısı.
+        db_path (str): SQLite dosya yolu; boşsa yalnızca bellek.
+    """
+
+    def __init__(self, max_turns=SESSION_MAX_TURNS, idle_ttl=SESSION_IDLE_TTL,
+                 max_sessions=SESSION_MAX_SESSIONS, db_path=SESSION_DB_PATH):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            directory = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, user TEXT NOT NULL, model TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_active REAL NOT NULL, "
+                "last_query TEXT, last_chunks TEXT)"
+            )
+            self._conn.commit()
+
+    def get(self, session_id):
+        """
+        Oturumu döndürür; yoksa (diskten yükleyerek veya boş) oluşturur.
+
+        Returns:
+            Session: Oturum nesnesi; son kullanım zamanı güncellenir.
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load(session_id) or Session(session_id, self.max_turns)
+                session._store = self
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            session.last_active = now
+            return session
+
+    def clear(self, session_id):
+        """Oturumun geçmişini ve saklanan parçalarını siler ("Sohbeti Temizle")."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._conn.commit()
+
+    def evict_idle(self):
+        """Boşta kalma süresini aşan oturumları siler; silinen sayısını döndürür."""
+        with self._lock:
+            return self._evict(time.time())
+
+    def _evict(self, now):
+        idle = [session_id for session_id, session in self._sessions.items()
+                if now - session.last_active > self.idle_ttl]
+        for session_id in idle:
+            del self._sessions[session_id]
+        if self._conn is not None:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_active < ?", (now - self.idle_ttl,))]
+            if expired:
+                self._conn.executemany("DELETE FROM session_turns WHERE session_id = ?", [(s,) for s in expired])
+                self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired])
+                self._conn.commit()
+        return len(idle)
+
+    def _load(self, session_id):
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT last_active, last_query, last_chunks FROM sessions WHERE session_id = ?",
+            (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = Session(session_id, self.max_turns)
+        session.last_active, session.last_query = row[0], row[1]
+        session.last_chunks = json.loads(row[2]) if row[2] else []
+        turns = self._conn.execute(
+            "SELECT user, model FROM session_turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.max_turns)).fetchall()
+        for user, model in reversed(turns):
+            session.turns.append({'user': user, 'model': model})
+        return session
+
+    def _save_turn(self, session, turn):
+        if self._conn is None:
+            return
+        with self._lock:
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM session_turns WHERE session_id = ?",
+                (session.session_id,)).fetchone()[0]
+            self._conn.execute("INSERT INTO session_turns (session_id, seq, user, model) VALUES (?, ?, ?, ?)",
+                               (session.session_id, seq, turn['user'], turn['model']))
+            # Halka tamponla aynı sınır: diskte de yalnızca son max_turns tur kalır.
+            self._conn.execute("DELETE FROM session_turns WHERE session_id = ? AND seq <= ?",
+                               (session.session_id, seq - self.max_turns))
+            self._upsert(session)
+            self._conn.commit()
+
+    def _save_retrieval(self, session):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._upsert(session)
+            self._conn.commit()
+
+    def _upsert(self, session):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, last_active, last_query, last_chunks) VALUES (?, ?, ?, ?)",
+            (session.session_id, session.last_active, session.last_query,
+             json.dumps(session.last_chunks, ensure_ascii=False)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'turns': sum(len(session.turns) for session in self._sessions.values()),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,358 @@
+import os
+import re
+import time
+import bisect
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from index_store import data_dir, read_manifest, VersionedIndexStore, MANIFEST_NAME, INDEX_POLL_INTERVAL
+
+# Ek korpusların (eski sezonlar, VEX IQ, resmi Q&A ...) indeks dizinleri:
+# data/shards/<ad>/ altında her biri kendi manifest'i olan sürümlü bir indeks.
+shards_dir = os.path.join(data_dir, "shards")
+
+# data/ altındaki ana indeksin adı ve korpus bilgisi (manifest'te 'corpus' yoksa)
+PRIMARY_SHARD = "push_back"
+PRIMARY_CORPUS = {'season': '2025-2026', 'program': 'V5RC', 'doc_type': 'manual', 'default': True}
+
+# Bölüm aramalarının paralel çalıştığı iş parçacığı sayısı; FAISS arama
+# sırasında GIL'i bıraktığı için bölümler gerçekten paralel aranır.
+SHARD_MAX_WORKERS = int(os.getenv("VEX_SHARD_MAX_WORKERS", "8"))
+
+# Sorgudan korpus seçimi için ipuçları
+_SEASON_PATTERN = re.compile(r'\b(20\d\d)\s*[-–/]\s*(20\d\d|\d\d)\b|\b(20\d\d)\b')
+_PROGRAM_HINTS = {
+    'VIQRC': re.compile(r'\b(?:vex\s*iq|iq|viqrc)\b', re.IGNORECASE),
+    'VURC': re.compile(r'\b(?:vex\s*u|vurc)\b', re.IGNORECASE),
+    'V5RC': re.compile(r'\b(?:v5|v5rc)\b', re.IGNORECASE),
+}
+_DOC_TYPE_HINTS = {
+    'qa': re.compile(r'\b(?:q\s*&\s*a|q&a|qna|soru[\s-]*cevap|forum)\b', re.IGNORECASE),
+    'appendix': re.compile(r'\b(?:appendix|ek\s+[a-z])\b', re.IGNORECASE),
+}
+
+
+class _ConcatChunks:
+    """Birden fazla bölümün parça listelerini tek bir satır numaralandırmasıyla gösterir."""
+
+    def __init__(self, versions, offsets):
+        self._versions = versions
+        self._offsets = offsets
+        self._count = offsets[-1] if offsets else 0
+
+    def __len__(self):
+        return self._count
+
+    def locate(self, row):
+        """Genel satır numarasını (bölüm sırası, yerel satır) çiftine çevirir."""
+        position = bisect.bisect_right(self._offsets, row) - 1
+        return position, row - self._offsets[position]
+
+    def __getitem__(self, row):
+        row = int(row)
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError("parça satırı aralık dışında")
+        position, local_row = self.locate(row)
+        name, version = self._versions[position]
+        return {**version.chunks[local_row], 'shard': name}
+
+    def __iter__(self):
+        for name, version in self._versions:
+            for chunk in version.chunks:
+                yield {**chunk, 'shard': name}
+
+
+class _ShardedLexicalIndex:
+    """Seçili bölümlerin BM25 indekslerinde arar ve sonuçları puana göre birleştirir."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def search(self, query, k=5):
+        return self._snapshot.fan_out(lambda version: version.lexical_index.search(query, k), k)
+
+    def score_rows(self, query, rows):
+        rows = np.asarray(rows, dtype='int64')
+        scores = np.zeros(len(rows), dtype='float32')
+        for version, mask, local_rows in self._snapshot.split_rows(rows):
+            scores[mask] = version.lexical_index.score_rows(query, local_rows)
+        return scores
+
+
+class _ShardedRerankFeatures:
+    """Genel satırların yeniden sıralama özelliklerini ilgili bölümlerden okur."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def take(self, rows):
+        rows = np.asarray(rows, dtype='int64')
+        topic_scores = None
+        rule_ids = np.empty(len(rows), dtype=object)
+        for version, mask, local_rows in self._snapshot.split_rows(rows):
+            local_topics, local_rule_ids = version.rerank_features.take(local_rows)
+            if topic_scores is None:
+                topic_scores = np.zeros((len(rows), local_topics.shape[1]), dtype='float32')
+            topic_scores[mask] = local_topics
+            rule_ids[mask] = local_rule_ids
+        if topic_scores is None:
+            topic_scores = np.zeros((0, 0), dtype='float32')
+        return topic_scores, rule_ids.astype(str)
+
+
+class ShardSnapshot:
+    """
+    Birden fazla indeks bölümünün (korpus) aynı anda kullanılan sürümleri.
+
+    IndexVersion ile aynı arama arayüzünü sunar; satır numaraları bölümlerin
+    art arda eklenmesiyle oluşan genel numaralardır. Aramalar seçili
+    bölümlere iş parçacığı havuzu üzerinden paralel gönderilir ve her
+    bölümün en iyi k sonucu skora göre birleştirilir. Skorların
+    karşılaştırılabilir olması için bölümler aynı indeks tipiyle
+    (varsayılan flat_ip) oluşturulmalıdır.
+
+    Args:
+        versions (list): (bölüm adı, IndexVersion) çiftleri.
+        executor (ThreadPoolExecutor): Paralel arama havuzu.
+    """
+
+    def __init__(self, versions, executor):
+        self.versions = versions
+        self._executor = executor
+        offsets = [0]
+        for _, version in versions:
+            offsets.append(offsets[-1] + len(version.chunks))
+        self._offsets = offsets
+        self.chunks = _ConcatChunks(versions, offsets)
+        # Cevap önbelleği anahtarı: bölümlerden herhangi biri güncellenince değişir.
+        self.version = "+".join(f"{name}:v{version.version}" for name, version in versions)
+        # Tek bir sorgu vektörü tüm bölümlerde aranır; bölümler aynı embedding
+        # modeliyle oluşturulmalıdır. Farklıysa ana (ilk) bölümün modeli kullanılır.
+        models = {version.manifest.get('embedding_model') for _, version in versions}
+        if len(models) > 1:
+            print(f"⚠️ Seçili bölümler farklı embedding modelleri kullanıyor: {sorted(m or '?' for m in models)}")
+        first = versions[0][1].manifest
+        self.manifest = {key: first[key] for key in ('embedding_model',) if key in first}
+        self.lexical_index = _ShardedLexicalIndex(self)
+        self.rerank_features = _ShardedRerankFeatures(self)
+
+    def split_rows(self, rows):
+        """
+        Genel satırları bölümlere ayırır.
+
+        Yields:
+            tuple: (IndexVersion, rows içindeki konum maskesi, yerel satırlar).
+        """
+        for position, (_, version) in enumerate(self.versions):
+            start, end = self._offsets[position], self._offsets[position + 1]
+            mask = (rows >= start) & (rows < end)
+            if mask.any():
+                yield version, mask, rows[mask] - start
+
+    def fan_out(self, search_fn, k):
+        """
+        search_fn'i her bölümde paralel çalıştırır ve sonuçları birleştirir.
+
+        Args:
+            search_fn (callable): IndexVersion -> [(yerel satır, skor)].
+            k (int): Döndürülecek sonuç sayısı.
+
+        Returns:
+            list: (genel satır, skor) çiftleri, skora göre azalan.
+        """
+        if len(self.versions) == 1:
+            # Tek bölümde havuza iş göndermenin maliyetine gerek yok.
+            return search_fn(self.versions[0][1])[:k]
+        futures = [self._executor.submit(search_fn, version) for _, version in self.versions]
+        hits = []
+        for position, future in enumerate(futures):
+            offset = self._offsets[position]
+            hits.extend((offset + row, score) for row, score in future.result())
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def search(self, query_embedding, k):
+        return self.fan_out(lambda version: version.search(query_embedding, k), k)
+
+    def search_many(self, query_embeddings, k):
+        """Sorgu vektörlerini her bölümde tek bir toplu FAISS çağrısıyla arar; sonuçlar sorgu başına birleştirilir."""
+        if len(self.versions) == 1:
+            return self.versions[0][1].search_many(query_embeddings, k)
+        futures = [self._executor.submit(version.search_many, query_embeddings, k) for _, version in self.versions]
+        results = [[] for _ in query_embeddings]
+        for position, future in enumerate(futures):
+            offset = self._offsets[position]
+            for hits, shard_hits in zip(results, future.result()):
+                hits.extend((offset + row, score) for row, score in shard_hits)
+        for hits in results:
+            hits.sort(key=lambda hit: hit[1], reverse=True)
+            del hits[k:]
+        return results
+
+    def resolve(self, row):
+        position, local_row = self.chunks.locate(int(row))
+        name, version = self.versions[position]
+        return name, version, local_row
+
+    def rule_parents(self, rule_id):
+        return [{**parent, 'shard': name} for name, version in self.versions for parent in version.rule_parents(rule_id)]
+
+    def rule_references(self, rule_id):
+        references = []
+        for _, version in self.versions:
+            references.extend(reference for reference in version.rule_references(rule_id) if reference not in references)
+        return references
+
+    def rows_for_rule(self, rule_id):
+        rows = []
+        for position, (_, version) in enumerate(self.versions):
+            rows.extend(self._offsets[position] + row for row in version.rows_for_rule(rule_id))
+        return rows
+
+
+def route_query(query, corpora):
+    """
+    Sorgudaki sezon, program ve belge tipi ipuçlarına göre aranacak bölümleri seçer.
+
+    "2024-2025", "VEX IQ", "Q&A" gibi ipuçları bölümlerin korpus bilgisiyle
+    eşleştirilir. İpucu yoksa ya da hiçbir bölüm eşleşmezse varsayılan
+    ('default': True) bölümler döner.
+
+    Args:
+        query (str): Kullanıcı sorgusu.
+        corpora (dict): bölüm adı -> korpus bilgisi ({'season', 'program', 'doc_type', 'default'}).
+
+    Returns:
+        list: Bölüm adları.
+    """
+    defaults = [name for name, corpus in corpora.items() if corpus.get('default')]
+    selected = list(corpora)
+    filtered = False
+
+    seasons = set()
+    for start, end, year in _SEASON_PATTERN.findall(query):
+        if start:
+            seasons.add(f"{start}-{end if len(end) == 4 else start[:2] + end}")
+        else:
+            seasons.add(year)
+    if seasons:
+        selected = [name for name in selected
+                    if any(season in corpora[name].get('season', '') for season in seasons)]
+        filtered = True
+
+    programs = [program for program, pattern in _PROGRAM_HINTS.items() if pattern.search(query)]
+    if programs:
+        selected = [name for name in selected if corpora[name].get('program', '').upper() in programs]
+        filtered = True
+
+    doc_types = [doc_type for doc_type, pattern in _DOC_TYPE_HINTS.items() if pattern.search(query)]
+    if doc_types:
+        selected = [name for name in selected if corpora[name].get('doc_type') in doc_types]
+        filtered = True
+
+    if not filtered or not selected:
+        return defaults or list(corpora)[:1]
+    return selected
+
+
+class ShardedIndexStore:
+    """
+    Ana indeks ile data/shards/ altındaki ek korpus indekslerini yöneten depo.
+
+    Her bölüm kendi VersionedIndexStore'una sahiptir ve bağımsız olarak
+    güncellenir. Yeni bölüm dizinleri ve korpus bilgileri INDEX_POLL_INTERVAL
+    aralıklarla manifest'lerden okunur; yönlendirme için indeksleri yüklemek
+    gerekmez. Yalnızca seçilen bölümler yüklenir ve aranır; tek bölümlü
+    sorgularda havuz devreye girmez.
+
+    Args:
+        primary (VersionedIndexStore): data/ altındaki ana indeks.
+        directory (str): Ek bölümlerin kök dizini.
+        max_workers (int): Paralel arama iş parçacığı sayısı.
+    """
+
+    def __init__(self, primary, directory=shards_dir, max_workers=SHARD_MAX_WORKERS, auto_watch=True):
+        self.directory = directory
+        self.auto_watch = auto_watch
+        self._stores = {PRIMARY_SHARD: primary}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+        self._lock = threading.Lock()
+        self._discovered_at = 0.0
+        self._corpora = {}
+
+    def discover(self, force=False):
+        """
+        data/shards/ altında manifest'i olan yeni bölüm dizinlerini ekler ve
+        bölümlerin korpus bilgisini manifest'lerden yeniler.
+        """
+        now = time.monotonic()
+        if not force and now - self._discovered_at < INDEX_POLL_INTERVAL:
+            return
+        with self._lock:
+            self._discovered_at = now
+            try:
+                names = sorted(os.listdir(self.directory))
+            except FileNotFoundError:
+                names = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                if name not in self._stores and os.path.exists(os.path.join(path, MANIFEST_NAME)):
+                    self._stores[name] = VersionedIndexStore(path, auto_watch=self.auto_watch)
+                    print(f"🗂️ Yeni indeks bölümü bulundu: {name}")
+
+            corpora = {}
+            for name, store in self._stores.items():
+                try:
+                    manifest = read_manifest(store.directory) or {}
+                except (OSError, ValueError):
+                    manifest = {}
+                corpus = manifest.get('corpus')
+                if corpus is None:
+                    corpus = PRIMARY_CORPUS if name == PRIMARY_SHARD else {}
+                corpora[name] = corpus
+            self._corpora = corpora
+
+    def names(self):
+        self.discover()
+        return list(self._stores)
+
+    def corpora(self):
+        """Bölüm adı -> korpus bilgisi (bölümün manifest'indeki 'corpus' alanı)."""
+        self.discover()
+        return dict(self._corpora)
+
+    def snapshot(self, names=None):
+        """
+        Seçili bölümlerin aktif sürümlerini döndürür.
+
+        Args:
+            names (list): Bölüm adları; verilmezse yalnızca ana indeks.
+
+        Returns:
+            IndexVersion | ShardSnapshot: Yalnızca ana indeks için doğrudan
+            IndexVersion, diğer seçimler için ShardSnapshot (parçalar bölüm
+            adıyla etiketlenir, sürüm anahtarı bölüm adını içerir); hiçbiri
+            yüklenemediyse None.
+        """
+        names = names or [PRIMARY_SHARD]
+        self.discover()
+        versions = []
+        for name in dict.fromkeys(names):
+            store = self._stores.get(name)
+            version = store.current() if store is not None else None
+            if version is None:
+                print(f"⚠️ İndeks bölümü kullanılamıyor: {name}")
+                continue
+            versions.append((name, version))
+        if not versions:
+            return None
+        if len(versions) == 1 and versions[0][0] == PRIMARY_SHARD:
+            return versions[0][1]
+        return ShardSnapshot(versions, self._executor)
+
+    def status(self):
+        """Her bölümün sürüm ve yüklenme bilgisi."""
+        return {name: self._stores[name].status() for name in self.names()}
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import importlib
+import threading
+
+from telemetry import metrics
+
+# API Anahtarını çevre değişkeninden al
+API_KEY = os.getenv("GOOGLE_API_KEY", "your_api_key_here")
+
+# Modül adı -> ilk import süresi (saniye); yalnızca timed_import ile yüklenenler
+import_timings = {}
+# Isınma adımı -> süre (saniye)
+warmup_timings = {}
+
+_genai = None
+_genai_lock = threading.Lock()
+_ready = threading.Event()
+_warmup_error = None
+
+
+def timed_import(name):
+    """
+    Modülü ilk kullanımda import eder ve süresini kaydeder.
+
+    Ağır bağımlılıklar (google.generativeai, sentence-transformers ...)
+    modül seviyesinde değil, gerçekten gerektiklerinde bununla yüklenir;
+    böylece `import rag_engine` hızlı kalır ve yalnızca embedding/üretim
+    yolları bu maliyeti öder.
+
+    Args:
+        name (str): Modülün tam adı.
+
+    Returns:
+        module: Yüklenen modül.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = time.perf_counter() - start
+    import_timings[name] = seconds
+    metrics.observe('vex_startup_seconds', seconds, phase=f"import:{name}")
+    return module
+
+
+def get_genai():
+    """
+    google.generativeai modülünü döndürür; ilk çağrıda import edip API anahtarıyla yapılandırır.
+
+    Süreç genelinde tek bir yapılandırma yapılır (embedding ve üretim aynı istemciyi paylaşır).
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                genai = timed_import('google.generativeai')
+                genai.configure(api_key=API_KEY)
+                _genai = genai
+    return _genai
+
+
+def set_genai(module):
+    """
+    get_genai()'nin döndüreceği modülü değiştirir (ör. benchmark'larda gemini_stub.StubGenai).
+
+    Args:
+        module: google.generativeai arayüzünü sunan nesne; None ise gerçek modül yeniden yüklenir.
+    """
+    global _genai
+    with _genai_lock:
+        _genai = module
+
+
+def run_warmup(steps):
+    """
+    Isınma adımlarını sırayla çalıştırır, sürelerini kaydeder ve süreci hazır işaretler.
+
+    Bir adımın hatası sonraki adımları durdurmaz (ör. API anahtarı yokken
+    yerel arama yine ısınır); hata raporda görünür ve süreç yine hazır
+    sayılır, çünkü istekler aynı yedek yollara düşecektir.
+
+    Args:
+        steps (list): (adım adı, çağrılabilir) çiftleri.
+
+    Returns:
+        dict: Adım adı -> {'seconds', 'ok', 'error'?}.
+    """
+    global _warmup_error
+    report = {}
+    total_start = time.perf_counter()
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+            report[name] = {'ok': True}
+        except Exception as e:
+            report[name] = {'ok': False, 'error': str(e)}
+            _warmup_error = f"{name}: {e}"
+            print(f"⚠️ Isınma adımı başarısız ({name}): {e}")
+        seconds = time.perf_counter() - start
+        report[name]['seconds'] = seconds
+        warmup_timings[name] = seconds
+        metrics.observe('vex_startup_seconds', seconds, phase=f"warmup:{name}")
+    warmup_timings['total'] = time.perf_counter() - total_start
+    _ready.set()
+    print(format_startup_report())
+    return report
+
+
+def format_startup_report():
+    """Import ve ısınma sürelerini tek satırlık özet olarak döndürür."""
+    imports = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in import_timings.items()) or "-"
+    steps = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in warmup_timings.items()) or "-"
+    return f"🚀 Açılış · import: {imports} · ısınma: {steps}"
+
+
+def is_ready():
+    """Isınma tamamlandıysa True."""
+    return _ready.is_set()
+
+
+def health():
+    """
+    /healthz için durum: ısınma bitene kadar hazır değil.
+
+    Returns:
+        tuple: (hazır mı, ayrıntılar sözlüğü).
+    """
+    ready = is_ready()
+    return ready, {
+        'status': 'ok' if ready else 'starting',
+        'imports': {name: round(seconds, 4) for name, seconds in import_timings.items()},
+        'warmup': {name: round(seconds, 4) for name, seconds in warmup_timings.items()},
+        'warmup_error': _warmup_error,
+    }
@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Günlük seviyesi: DEBUG ayrıntılı arama dökümlerini (parça önizlemeleri,
+# anahtar kelime listeleri, skorlar) açar; üretimde INFO veya üstü kullanılır.
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+LOG_LEVEL = LOG_LEVELS.get(os.getenv("VEX_LOG_LEVEL", "INFO").upper(), 20)
+# İstek izlerinin JSON satırları bu dosyaya eklenir; boşsa stdout'a yazılır.
+TRACE_LOG_PATH = os.getenv("VEX_TRACE_LOG", "")
+# Prometheus metriklerinin sunulacağı port; 0 ise sunucu başlatılmaz.
+METRICS_PORT = int(os.getenv("VEX_METRICS_PORT", "0"))
+
+# Aşama süreleri için histogram sınırları (saniye)
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def debug_enabled():
+    return LOG_LEVEL <= LOG_LEVELS['DEBUG']
+
+
+def debug(message):
+    """Ayrıntılı döküm satırı; yalnızca VEX_LOG_LEVEL=DEBUG iken yazılır."""
+    if LOG_LEVEL <= LOG_LEVELS['DEBUG']:
+        print(message)
+
+
+def approx_tokens(text):
+    """Token sayısı tahmini (API kullanım bilgisi yoksa); ~4 karakter = 1 token."""
+    return (len(text) + 3) // 4
+
+
+class MetricsRegistry:
+    """
+    Süreç içi sayaç ve histogramlar; Prometheus metin formatında dışa aktarılır.
+
+    Metrik adları ve etiketleri çağrı anında oluşturulur; ayrı bir kayıt
+    adımı gerekmez.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                histogram['buckets'][position] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """Sayaç ve histogramların kopyası (testler ve durum ekranı için)."""
+        with self._lock:
+            return {
+                'counters': {f"{name}{_format_labels(labels)}": value
+                             for (name, labels), value in self._counters.items()},
+                'histograms': {f"{name}{_format_labels(labels)}": {'sum': h['sum'], 'count': h['count']}
+                               for (name, labels), h in self._histograms.items()},
+            }
+
+    def render_prometheus(self):
+        """Tüm metrikleri Prometheus metin formatında döndürür."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(h, buckets=list(h['buckets']))) for key, h in self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{_escape_label_value(value)}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape_label_value(value):
+    """Etiket değerini Prometheus metin formatına göre kaçışlar (\\, " ve satır sonu)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = MetricsRegistry()
+
+
+class Span:
+    """Bir aşamanın süresi ve öznitelikleri (karakter/token sayısı, önbellek isabeti ...)."""
+
+    def __init__(self, name, start, attributes):
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, trace_start):
+        return {'name': self.name, 'start_ms': round((self.start - trace_start) * 1000, 3),
+                'duration_ms': round((self.duration or 0.0) * 1000, 3), **self.attributes}
+
+
+class Trace:
+    """
+    Tek bir isteğin aşama kayıtları.
+
+    İstek bitince tek bir JSON satırı olarak yazılır ve toplam süre
+    metriklere eklenir.
+    """
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.request_id = uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.attributes = attributes
+        self.spans = []
+        self.events = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name, **attributes):
+        self.events.append({'name': name, 'at_ms': round((time.perf_counter() - self.start) * 1000, 3), **attributes})
+
+    def to_dict(self):
+        return {
+            'trace': self.name,
+            'request_id': self.request_id,
+            'timestamp': self.started_at,
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            **self.attributes,
+            'spans': [span.to_dict(self.start) for span in self.spans],
+            'events': self.events,
+        }
+
+    def finish(self):
+        duration = time.perf_counter() - self.start
+        outcome = self.attributes.get('outcome', 'unknown')
+        metrics.observe("vex_request_duration_seconds", duration, trace=self.name)
+        metrics.inc("vex_requests_total", trace=self.name, outcome=outcome)
+        if LOG_LEVEL <= LOG_LEVELS['INFO']:
+            _write_trace_log(self.to_dict())
+        for listener in _trace_listeners:
+            listener(self)
+
+
+# Biten her iz için çağrılan fonksiyonlar (ör. yük testinde aşama sürelerini toplamak)
+_trace_listeners = []
+
+
+def add_trace_listener(listener):
+    """Biten her Trace ile çağrılacak fonksiyonu ekler."""
+    _trace_listeners.append(listener)
+
+
+def remove_trace_listener(listener):
+    if listener in _trace_listeners:
+        _trace_listeners.remove(listener)
+
+
+_trace_log_lock = threading.Lock()
+
+
+def _write_trace_log(record):
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    if TRACE_LOG_PATH:
+        with _trace_log_lock, open(TRACE_LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    else:
+        print(line, file=sys.stdout)
+
+
+_current_trace = contextvars.ContextVar("vex_trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Bir aşamanın süresini ölçer ve aktif isteğin izine ekler.
+
+    Aktif iz yoksa (ör. doğrudan get_related_chunks çağrısı) yalnızca
+    metriklere yazılır. Hata olursa aşama 'error' özniteliğiyle kaydedilir.
+
+    Yields:
+        Span: Aşama içinde öznitelik eklemek için (`span.set(chars=...)`).
+    """
+    current = Span(name, time.perf_counter(), attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.start
+        metrics.observe("vex_stage_duration_seconds", current.duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(current)
+
+
+def event(name, **attributes):
+    """Önbellek isabeti, yeniden deneme gibi anlık olayları sayar ve ize ekler."""
+    metrics.inc("vex_events_total", event=name, **{key: value for key, value in attributes.items()
+                                                   if isinstance(value, (str, bool))})
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event(name, **attributes)
+
+
+def annotate(**attributes):
+    """Aktif isteğin izine öznitelik ekler (ör. outcome='cache_exact')."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.set(**attributes)
+
+
+def count(name, value, **labels):
+    """Karakter/token gibi miktarları sayaca ekler."""
+    metrics.inc(name, value, **labels)
+
+
+def traced(name):
+    """
+    Fonksiyon çağrısını bir istek izi olarak kaydeden dekoratör.
+
+    Senkron fonksiyonları ve async üreteçleri destekler. Async üreteçlerde
+    iz, her adımda yalnızca o adım süresince etkinleştirilir; adımlar farklı
+    görevlerden (ör. Gradio) çağrılsa da bağlam karışmaz.
+    """
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def stream_wrapper(*args, **kwargs):
+                trace = Trace(name)
+                generator = fn(*args, **kwargs)
+                try:
+                    while True:
+                        token = _current_trace.set(trace)
+                        try:
+                            item = await generator.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            _current_trace.reset(token)
+                        yield item
+                except BaseException as e:
+                    trace.set(error=type(e).__name__)
+                    raise
+                finally:
+                    token = _current_trace.set(trace)
+                    try:
+                        await generator.aclose()
+                    finally:
+                        _current_trace.reset(token)
+                    trace.finish()
+            return stream_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = Trace(name)
+            token = _current_trace.set(trace)
+            try:
+                return fn(*args, **kwargs)
+            except BaseException as e:
+                trace.set(error=type(e).__name__)
+                raise
+            finally:
+                _current_trace.reset(token)
+                trace.finish()
+        return wrapper
+    return decorator
+
+
+_metrics_server = None
+_health_check = None
+
+
+def set_health_check(check):
+    """
+    /healthz uç noktasının durum fonksiyonunu ayarlar.
+
+    Args:
+        check (callable): (hazır mı, ayrıntılar sözlüğü) döndürür; hazır
+            değilse uç nokta 503 döner (yük dengeleyici trafiği bekletir).
+    """
+    global _health_check
+    _health_check = check
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """
+    /metrics (Prometheus) ve /healthz uç noktalarını arka plan iş parçacığında sunar.
+
+    Returns:
+        bool: Sunucu başlatıldıysa (veya zaten çalışıyorsa) True.
+    """
+    global _metrics_server
+    if _metrics_server is not None:
+        return True
+    if not port:
+        return False
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                status = 200
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                body = metrics.render_prometheus().encode('utf-8')
+            elif path == '/healthz':
+                ready, details = _health_check() if _health_check is not None else (True, {'status': 'ok'})
+                status = 200 if ready else 503
+                content_type = 'application/json'
+                body = json.dumps(details, ensure_ascii=False).encode('utf-8')
+            else:
+                self.send_error(404)
+                return
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _metrics_server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Prometheus metrikleri: http://0.0.0.0:{port}/metrics")
+    return True
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modüller src/ altında ve birbirlerini düz adlarıyla import ediyor.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
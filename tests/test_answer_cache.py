@@ -0,0 +1,73 @@
+from answer_cache import AnswerCache, normalize_query
+
+
+def test_normalize_query_turkish_case_and_punctuation():
+    assert normalize_query("Robot  AĞIRLIK sınırı nedir?") == normalize_query("robot ağırlık sınırı nedir")
+    assert normalize_query("İzin") == "izin"
+
+
+def test_exact_and_semantic_hits():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("Robot boyutu nedir?", 1, "18 inç", [1.0, 0.0])
+    assert cache.lookup_exact("robot boyutu nedir", 1) == "18 inç"
+    assert cache.lookup_exact("robot boyutu nedir", 2) is None
+    assert cache.lookup_similar("robotun boyutu ne", [0.99, 0.05], 1) == "18 inç"
+    assert cache.lookup_similar("alakasız", [0.0, 1.0], 1) is None
+
+
+def test_semantic_match_requires_same_identifiers():
+    cache = AnswerCache(similarity_threshold=0.5)
+    cache.put("R25 nedir", 1, "plastik", [1.0, 0.0])
+    assert cache.lookup_similar("R26 nedir", [1.0, 0.0], 1) is None
+
+
+def test_stats_count_exact_misses_per_question():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("a", 1, "A", [1.0, 0.0])
+    # Birebir isabet
+    cache.lookup_exact("a", 1)
+    # Birebir ıskalama + anlamsal isabet
+    cache.lookup_exact("b", 1)
+    cache.lookup_similar("b", [1.0, 0.0], 1)
+    # Birebir ıskalama, anlamsal aramaya hiç gidilmedi (ör. kural ID'si bulundu)
+    cache.lookup_exact("R25", 1)
+    stats = cache.stats()
+    assert stats['exact_misses'] == 2
+    assert stats['misses'] == 1
+    assert abs(stats['hit_rate'] - 2 / 3) < 1e-9
+
+
+def test_expired_entries_are_not_served():
+    cache = AnswerCache(ttl_seconds=-1)
+    cache.put("a", 1, "A")
+    assert cache.lookup_exact("a", 1) is None
+
+
+def test_alternating_shard_selections_do_not_evict_each_other():
+    cache = AnswerCache()
+    cache.put("a", "push_back:v3", "A")
+    cache.put("b", "push_back:v3+vrc_2024:v1", "B")
+    cache.put("c", "vrc_2024:v1", "C")
+    assert cache.lookup_exact("a", "push_back:v3") == "A"
+    assert cache.lookup_exact("b", "push_back:v3+vrc_2024:v1") == "B"
+
+
+def test_updated_component_evicts_dependent_entries():
+    cache = AnswerCache()
+    cache.put("a", "push_back:v3", "A")
+    cache.put("b", "push_back:v3+vrc_2024:v1", "B")
+    cache.put("c", "vrc_2024:v1", "C")
+    cache.put("d", "push_back:v4", "D")
+    assert cache.stats()['entries'] == 2
+    assert cache.lookup_exact("c", "vrc_2024:v1") == "C"
+    assert cache.lookup_exact("b", "push_back:v3+vrc_2024:v1") is None
+
+
+def test_plain_primary_version_evicts_mixed_entries():
+    cache = AnswerCache()
+    cache.put("a", 1, "A")
+    cache.put("b", "push_back:v1+vrc_2024:v1", "B")
+    assert cache.stats()['entries'] == 2
+    cache.put("c", 2, "C")
+    assert cache.lookup_exact("b", "push_back:v1+vrc_2024:v1") is None
+    assert cache.stats()['entries'] == 1
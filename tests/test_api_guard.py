@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from api_guard import ApiGuard, CircuitBreaker, CircuitOpenError
+
+
+def _fail():
+    raise RuntimeError("503")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.status()['state'] == 'open'
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.status()['state'] == 'closed'
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.status()['state'] == 'open'
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.status()['state'] == 'closed' and breaker.allow()
+
+
+def test_guard_rejects_calls_while_open():
+    guard = ApiGuard('test', rate=0, burst=1, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guard.call(_fail)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_guard_coalesces_concurrent_calls_with_the_same_key():
+    guard = ApiGuard('test', rate=0, burst=1)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "sonuç"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(guard.call(slow, key="k")))
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=lambda: results.append(guard.call(slow, key="k")))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["sonuç", "sonuç"]
+    assert calls == [1]
+
+
+def _collect(guard, source_fn, key):
+    async def consume():
+        return [part async for part in guard.stream(source_fn, key=key)]
+    return consume()
+
+
+def test_identical_streams_share_one_source_under_rate_limit():
+    import asyncio
+
+    # Burada rate=0 sınırsız demektir; tek token'lık kova boşaltılır, akışlar sıradaki token'ı bekler.
+    guard = ApiGuard('test', rate=20, burst=1)
+    guard.bucket.acquire()
+    calls = []
+
+    async def source():
+        calls.append(1)
+        for part in ("a", "b"):
+            await asyncio.sleep(0)
+            yield part
+
+    async def main():
+        return await asyncio.gather(_collect(guard, source, "k"), _collect(guard, source, "k"))
+
+    assert asyncio.run(main()) == [["a", "b"], ["a", "b"]]
+    assert calls == [1]
+
+
+def test_stream_open_breaker_error_reaches_every_subscriber():
+    import asyncio
+
+    guard = ApiGuard('test', rate=0, burst=1, failure_threshold=1, reset_timeout=60)
+    guard.breaker.record_failure()
+    calls = []
+
+    async def source():
+        calls.append(1)
+        yield "a"
+
+    async def main():
+        return await asyncio.gather(_collect(guard, source, "k"), _collect(guard, source, "k"),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, CircuitOpenError) for result in results)
+    assert calls == []
@@ -0,0 +1,51 @@
+import json
+
+from batch_qa import ResultWriter, _is_done, question_id, read_questions, read_results
+
+
+def test_read_questions_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "q.jsonl"
+    jsonl.write_text('{"id": "1", "question": "R25 nedir?", "expected_rules": "R25, <sg3>"}\n'
+                     '\n{"soru": "Robot boyutu?"}\n{"id": "1", "question": "tekrar"}\n{"other": 1}\n',
+                     encoding='utf-8')
+    questions = read_questions(str(jsonl))
+    assert [q['id'] for q in questions] == ["1", question_id("Robot boyutu?")]
+    assert questions[0]['expected_rules'] == ["R25", "SG3"]
+
+    csv_path = tmp_path / "q.csv"
+    csv_path.write_text("id,question\na,Plastik?\n", encoding='utf-8')
+    assert read_questions(str(csv_path)) == [{'id': 'a', 'question': 'Plastik?', 'expected_rules': []}]
+
+
+def test_is_done():
+    generated = {'index_version': 3, 'answer': 'x', 'outcome': 'generated'}
+    assert _is_done(generated, 3, retrieval_only=False)
+    assert not _is_done(generated, 4, retrieval_only=False)
+    assert not _is_done(None, 3, retrieval_only=False)
+    assert not _is_done({**generated, 'outcome': 'fallback'}, 3, retrieval_only=False)
+    retrieved = {'index_version': 3, 'chunks': []}
+    assert not _is_done(retrieved, 3, retrieval_only=False)
+    assert _is_done(retrieved, 3, retrieval_only=True)
+
+
+def test_resume_after_truncated_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text(json.dumps({'id': 'a', 'answer': 'A'}) + "\n" + '{"id": "b", "ans', encoding='utf-8')
+    assert set(read_results(str(path))) == {'a'}
+
+    writer = ResultWriter(str(path))
+    writer.write({'id': 'c', 'answer': 'C'})
+    writer.close()
+    results = read_results(str(path))
+    assert set(results) == {'a', 'c'}
+    assert results['c']['answer'] == 'C'
+
+
+def test_later_records_override_earlier_ones(tmp_path):
+    path = tmp_path / "out.jsonl"
+    writer = ResultWriter(str(path))
+    writer.write({'id': 'a', 'outcome': 'fallback'})
+    writer.write({'id': 'a', 'outcome': 'generated'})
+    writer.close()
+    assert read_results(str(path))['a']['outcome'] == 'generated'
+    assert read_results(str(tmp_path / "missing.jsonl")) == {}
@@ -0,0 +1,55 @@
+import numpy as np
+
+from embedding import HashEmbedder, embed_texts
+from embedding_cache import EmbeddingCache
+
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self, model_name):
+        super().__init__(dimension=16)
+        self.model_name = model_name
+        self.texts = []
+
+    def embed_batch(self, texts, task_type="retrieval_document"):
+        self.texts.extend(texts)
+        return super().embed_batch(texts, task_type)
+
+
+def test_cache_key_includes_model_and_task_type(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    vector = np.arange(4, dtype='float32')
+    cache.put("models/a", "retrieval_document", "metin", vector)
+
+    np.testing.assert_array_equal(cache.get("models/a", "retrieval_document", "metin"), vector)
+    assert cache.get("models/b", "retrieval_document", "metin") is None
+    assert cache.get("models/a", "retrieval_query", "metin") is None
+
+
+def test_cache_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("models/a", "retrieval_document", ["x", "y"], np.eye(2, dtype='float32'))
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    vectors = reopened.get_many("models/a", "retrieval_document", ["y", "z", "x"])
+    np.testing.assert_array_equal(vectors[0], [0, 1])
+    assert vectors[1] is None
+    np.testing.assert_array_equal(vectors[2], [1, 0])
+
+
+def test_embed_texts_only_sends_misses_and_keys_by_embedder_model(tmp_path, capsys):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    first = CountingEmbedder("local/a")
+    embed_texts(["bir", "iki"], embedder=first, cache=cache)
+
+    again = CountingEmbedder("local/a")
+    result = embed_texts(["iki", "üç", "bir"], embedder=again, cache=cache)
+    assert again.texts == ["üç"]
+    assert result.shape == (3, 16)
+    np.testing.assert_allclose(result[2], first._embed_one("bir"))
+
+    # Başka bir modelin vektörleri yeniden kullanılmaz.
+    other = CountingEmbedder("local/b")
+    embed_texts(["bir"], embedder=other, cache=cache)
+    assert other.texts == ["bir"]
@@ -0,0 +1,54 @@
+from index_store import assign_chunk_ids, diff_chunks
+
+
+def _chunk(rule_id, content):
+    return {'rule_id': rule_id, 'content': content, 'page_number': 1}
+
+
+def _old_chunks():
+    return assign_chunk_ids([_chunk('R1', 'bir'), _chunk('R2', 'iki'), _chunk('R3', 'üç')])
+
+
+def test_diff_chunks_unchanged_keeps_ids():
+    diff = diff_chunks(_old_chunks(), [_chunk('R1', 'bir'), _chunk('R2', 'iki'), _chunk('R3', 'üç')])
+    assert [chunk['id'] for chunk in diff['kept']] == [0, 1, 2]
+    assert diff['added'] == [] and diff['replaced'] == [] and diff['removed_ids'] == []
+
+
+def test_diff_chunks_changed_rule_reuses_its_id():
+    diff = diff_chunks(_old_chunks(), [_chunk('R1', 'bir'), _chunk('R2', 'iki (güncel)'), _chunk('R3', 'üç')])
+    assert [chunk['id'] for chunk in diff['kept']] == [0, 2]
+    assert [(chunk['rule_id'], chunk['id']) for chunk in diff['replaced']] == [('R2', 1)]
+    assert diff['removed_ids'] == []
+
+
+def test_diff_chunks_added_and_removed():
+    diff = diff_chunks(_old_chunks(), [_chunk('R1', 'bir'), _chunk('R4', 'dört')])
+    assert [chunk['id'] for chunk in diff['kept']] == [0]
+    assert [chunk['rule_id'] for chunk in diff['added']] == ['R4']
+    assert 'id' not in diff['added'][0]
+    assert sorted(diff['removed_ids']) == [1, 2]
+
+
+def test_diff_chunks_duplicate_content_matches_once():
+    old = assign_chunk_ids([_chunk('R1', 'aynı'), _chunk('R1', 'aynı')])
+    diff = diff_chunks(old, [_chunk('R1', 'aynı')])
+    assert [chunk['id'] for chunk in diff['kept']] == [0]
+    assert diff['removed_ids'] == [1]
+
+
+def test_to_id_mapped_keeps_metric_and_maps_ids():
+    import faiss
+    import numpy as np
+
+    from index_store import to_id_mapped
+
+    vectors = np.eye(4, dtype='float32')
+    source = faiss.IndexFlatIP(4)
+    source.add(vectors)
+    mapped = to_id_mapped(source, [10, 11, 12, 13])
+    assert isinstance(mapped, faiss.IndexIDMap2)
+    assert mapped.metric_type == faiss.METRIC_INNER_PRODUCT
+    distances, ids = mapped.search(vectors[2:3], 1)
+    assert ids[0][0] == 12 and distances[0][0] == 1.0
+    assert to_id_mapped(mapped) is mapped
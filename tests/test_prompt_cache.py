@@ -0,0 +1,51 @@
+import pytest
+
+from gemini_stub import StubGenai
+from prompt_cache import GenerationModels
+from startup import set_genai
+
+
+class Store:
+    version = 1
+
+    def rule_parents(self, rule_id):
+        return [{'rule_id': rule_id, 'page_number': 1, 'content': f"{rule_id} metni"}]
+
+
+@pytest.fixture
+def genai():
+    stub = StubGenai(embed_latency=0, generate_latency=0, token_latency=0, error_rate=0)
+    set_genai(stub)
+    yield stub
+    set_genai(None)
+
+
+def test_rules_prefix_is_cached_once(genai):
+    models = GenerationModels("gemini-test")
+    prefix = models.prefix_for(Store(), "sistem", rule_ids=["R1", "R2"])
+    assert len(prefix.rules) == 2
+    for _ in range(3):
+        assert models.model(prefix)[1] == 'cached'
+    assert genai.calls['cache_create'] == 1
+
+
+def test_failed_remote_cache_is_not_retried_per_request(genai, capsys):
+    def fail(**kwargs):
+        genai.calls['cache_create'] += 1
+        raise RuntimeError("content too small")
+
+    genai.caching.CachedContent.create = fail
+    models = GenerationModels("gemini-test")
+    for _ in range(3):
+        prefix = models.prefix_for(Store(), "sistem", rule_ids=["R1"])
+        assert prefix.rules == []
+        assert models.model(prefix)[1] == 'system'
+    assert genai.calls['cache_create'] == 1
+    assert capsys.readouterr().out.count("oluşturulamadı") == 1
+
+
+def test_system_only_prefix_never_tries_remote(genai):
+    models = GenerationModels("gemini-test")
+    prefix = models.prefix_for(Store(), "sistem", rule_ids=[])
+    assert models.model(prefix)[1] == 'system'
+    assert genai.calls['cache_create'] == 0
@@ -0,0 +1,43 @@
+import pytest
+
+import embedding_cache
+import rag_engine
+from gemini_stub import StubGenai
+from startup import set_genai
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, '_default_cache',
+                        embedding_cache.EmbeddingCache(str(tmp_path / "cache.sqlite")))
+    genai = StubGenai(embed_latency=0, error_rate=0)
+    models = []
+    embed_content = genai.embed_content
+
+    def recording_embed_content(model, content, task_type="retrieval_document"):
+        models.append(model)
+        return embed_content(model=model, content=content, task_type=task_type)
+
+    genai.embed_content = recording_embed_content
+    set_genai(genai)
+    yield models
+    set_genai(None)
+
+
+def test_embed_query_uses_the_index_model_for_api_and_cache(stub):
+    vector = rag_engine.embed_query("robot boyutu", "models/other-embedding")
+    assert stub == ["models/other-embedding"]
+    cache = embedding_cache._default_cache
+    assert cache.get("models/other-embedding", "retrieval_query", "robot boyutu") is not None
+    assert cache.get(rag_engine.EMBEDDING_MODEL, "retrieval_query", "robot boyutu") is None
+
+    # İkinci çağrı önbellekten döner; API'ye gidilmez.
+    assert list(rag_engine.embed_query("robot boyutu", "models/other-embedding")) == list(vector)
+    assert stub == ["models/other-embedding"]
+
+
+def test_embed_query_async_uses_the_index_model(stub):
+    import asyncio
+
+    asyncio.run(rag_engine.embed_query_async("plastik", "models/other-embedding"))
+    assert embedding_cache._default_cache.get("models/other-embedding", "retrieval_query", "plastik") is not None
@@ -0,0 +1,46 @@
+import numpy as np
+
+from reranker import QUERY_TOPICS, query_topic_vector, score_candidates, top_k
+
+
+def _topics(**scores):
+    names = [name for name, _, _ in QUERY_TOPICS]
+    row = np.zeros(len(names), dtype='float32')
+    for name, value in scores.items():
+        row[names.index(name)] = value
+    return row
+
+
+def test_top_k_is_stable_on_ties():
+    assert top_k(np.array([0.5, 0.9, 0.5, 0.9]), 3).tolist() == [1, 3, 0]
+
+
+def test_query_topic_vector():
+    vector = query_topic_vector("Robot ağırlık sınırı nedir?")
+    names = [name for name, _, _ in QUERY_TOPICS]
+    assert vector[names.index('weight')] == 1 and vector[names.index('material')] == 0
+
+
+def test_rule_id_match_outranks_slightly_better_dense_score():
+    topic_scores = np.stack([_topics(), _topics(), _topics()])
+    scores, components = score_candidates("R25 nedir", topic_scores, np.array(["R24", "R25", "R9"]),
+                                          dense_scores=np.array([0.9, 0.88, 0.5]),
+                                          lexical_scores=np.array([0.0, 0.0, 0.0]), query_rule_ids=["R25"])
+    assert components['rule'].tolist() == [0.0, 1.0, 0.0]
+    assert top_k(scores, 3).tolist() == [1, 0, 2]
+
+
+def test_missing_dense_score_counts_as_zero():
+    topic_scores = np.stack([_topics(), _topics(), _topics()])
+    scores, components = score_candidates("x", topic_scores, np.array(["A", "B", "C"]),
+                                          dense_scores=np.array([0.2, np.nan, 0.6]),
+                                          lexical_scores=np.array([1.0, 3.0, 2.0]))
+    assert components['dense'].tolist() == [0.0, 0.0, 1.0]
+    assert top_k(scores, 3).tolist() == [2, 1, 0]
+
+
+def test_topic_match_breaks_ties():
+    topic_scores = np.stack([_topics(), _topics(size=1.0)])
+    scores, _ = score_candidates("robot boyut sınırı", topic_scores, np.array(["A", "B"]),
+                                 dense_scores=np.array([0.5, 0.5]), lexical_scores=np.array([1.0, 1.0]))
+    assert top_k(scores, 2).tolist() == [1, 0]
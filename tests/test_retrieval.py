@@ -0,0 +1,57 @@
+from retrieval import extract_rule_ids, is_follow_up, normalize_rule_id, reciprocal_rank_fusion
+
+
+def test_normalize_rule_id():
+    assert normalize_rule_id(" <sg3> ") == "SG3"
+
+
+def test_extract_rule_ids_keeps_order_without_duplicates():
+    assert extract_rule_ids("R25 ve <SG3>, peki r25?") == ["R25", "SG3"]
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+    # İki listede de geçen adaylar, tek listede birinci olan adayın önüne geçer.
+    assert [key for key, _ in fused] == ["c", "b", "a", "d"]
+
+
+def test_rrf_scores():
+    fused = dict(reciprocal_rank_fusion([["a", "b"], ["b"]], k=1))
+    assert fused["a"] == 1 / 2
+    assert fused["b"] == 1 / 3 + 1 / 2
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert [key for key, _ in reciprocal_rank_fusion([["x"], ["y"]])] == ["x", "y"]
+
+
+def test_is_follow_up_prefix_cues():
+    assert is_follow_up("peki otonomda?")
+    assert is_follow_up("What about autonomous?")
+    assert is_follow_up("ya sürücü periyodunda?")
+
+
+def test_prefix_cues_on_self_sufficient_queries_are_not_follow_ups():
+    assert not is_follow_up("This season, what is the robot size limit?")
+    assert not is_follow_up("Aynı takım iki robot kullanabilir mi?")
+    assert not is_follow_up("Then what happens at the end of autonomous period for scoring?")
+    assert not is_follow_up("Bu durumda robot boyutu nedir ve ağırlık sınırı kaç?")
+    # Kendi kural ID'si veya konu kelimesi olan kısa sorgular da kendi başına aranır.
+    assert not is_follow_up("peki R26?")
+    assert not is_follow_up("peki genişleme sınırı?")
+    # Genel İngilizce kelimeler tek başına belirteç değildir.
+    assert not is_follow_up("It is legal to use two motors on the intake and lift?")
+
+
+def test_short_standalone_queries_are_not_follow_ups():
+    assert not is_follow_up("R25?")
+    assert not is_follow_up("robot ağırlığı?")
+    assert not is_follow_up("plastik?")
+    assert is_follow_up("neden?")
+
+
+def test_follow_up_query_drops_previous_rule_ids():
+    from retrieval import follow_up_query
+
+    assert follow_up_query("peki istisnaları?", "R25 plastik kuralı") == "peki istisnaları? plastik kuralı"
+    assert follow_up_query("Robot boyut sınırı nedir?", "R25 plastik kuralı") is None
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from search_scheduler import SearchScheduler
+
+
+class SlowVersion:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def search_many(self, vectors, k):
+        self.calls.append(len(vectors))
+        time.sleep(self.delay)
+        return [[(row, float(-row)) for row in range(k)] for _ in vectors]
+
+
+def test_idle_search_bypasses_the_queue():
+    scheduler = SearchScheduler(window=0.05)
+    version = SlowVersion()
+    assert scheduler.search(version, [0.0], 2) == [(0, 0.0), (1, -1.0)]
+    stats = scheduler.stats()
+    assert stats['direct'] == 1 and stats['batches'] == 0
+
+
+def test_concurrent_requests_are_batched_and_trimmed_to_k():
+    scheduler = SearchScheduler(window=0.05)
+    version = SlowVersion(delay=0.05)
+    results = {}
+
+    def search(k):
+        results[k] = scheduler.search(version, [0.0], k)
+
+    threads = [threading.Thread(target=search, args=(k,)) for k in (1, 2, 3, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {k: len(hits) for k, hits in results.items()} == {1: 1, 2: 2, 3: 3, 4: 4}
+    # İlk istek doğrudan aranır; onu beklerken gelenler tek partide birleşir.
+    assert sorted(version.calls) == [1, 3]
+
+
+def test_groups_of_different_versions_run_in_parallel():
+    scheduler = SearchScheduler(window=0.02)
+    versions = [SlowVersion(delay=0.2) for _ in range(4)]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=scheduler.search, args=(version, [0.0], 1)) for version in versions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Seri çalışsaydı (doğrudan arama + 3 grup) ~0.8 sn sürerdi.
+    assert time.perf_counter() - start < 0.6
@@ -0,0 +1,7 @@
+from telemetry import MetricsRegistry
+
+
+def test_prometheus_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("vex_errors_total", error='a\\b "c"\nd')
+    assert 'vex_errors_total{error="a\\\\b \\"c\\"\\nd"} 1' in registry.render_prometheus()